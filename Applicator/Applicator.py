@@ -1,7 +1,7 @@
 bl_info = {
     "name": "Applicator for Blender",
     "author": "Andrew Buttigieg, Chameleon-Workshop.com",
-    "version": (0, 7),
+    "version": (0, 8),
     "blender": (2, 83, 0),
     "location": "View3D > Toolbar > Applicator",
     "description": "Applies Apple Face Traking data to your characters",
@@ -24,23 +24,105 @@ bl_info = {
 # 0.5: Added Face Control Rig Logic
 # 0.6: Merged Mouth Controls into a single Control
 # 0.7: Minor Fixes
+# 0.8: Added keyframe-free live preview
+# 0.8: Added capture in/out timecodes, loaded through a byte offset index
+# 0.8: Added the compact capture archive format (.appcap)
+# 0.8: Added packing the capture, neutral & mapping data into the .blend
+# 0.8: Fixed rotations to use real (normalized) quaternions, added rotation order & euler output
+# 0.8: Added Matrix mapping rows (weighted ARKit channels to any number of target shape keys)
+# 0.8: Added the playback benchmark (operator & headless script)
+# 0.8: Added performer neutral profiles
+# 0.8: Added detecting the neutral from the stillest part of the capture
+# 0.8: Added the tracking repair stage (dropouts & spikes)
+# 0.8: Added exporting the applied animation as a capture (.csv or .appcap)
+# 0.8: Faster add-on startup: numpy loads on first use, registration is idempotent
+# 0.8: Added the parallel apply of long takes across background Blender workers
+# 0.8: Added the scripting API (create_face_rig, apply_capture)
+# 0.8: Added the batch face rig creation for crowds (create_face_rigs)
+# 0.8: Added the extra meshes driven by the face rig, and baking to their shape keys
+# 0.8: Added re-applying a frame range, splicing the keys in with an optional edge blend
+# 0.8: Added the background prefetch of selected files, with their status in the Data panel
+# 0.8: Added the watched ingest folder, archiving new takes into a take index
+# 0.8: Added the rig to rig animation transfer, remapped through the target's mapping
+# 0.8: Added the progressive apply, keying a coarse pass first and swapping in the full result
+# 0.8: Added the causal filters (One Euro, exponential, damped), per mapping row or for all the rows
+# 0.8: Added the response curves (gamma, control points or named LUT) to the mapping rows
+# 0.8: Added reading Live Link Face take zips & folders directly, with the take's metadata
 # 
 # © Copyright 2021 All Rights Reserved: Andrew Buttigieg (Chameleon-Workshop.com)
 #########################################################################
+import time
+import_start_time = time.perf_counter()
+
 import bpy
 import os
+import sys
 import csv
 import math
-from bpy_extras.io_utils import ImportHelper
+import io
+import json
+import zlib
+import zipfile
+import base64
+import struct
+import hashlib
+import importlib
+import tempfile
+import subprocess
+import threading
+import collections
+from bpy_extras.io_utils import ImportHelper, ExportHelper
 from bpy.props import StringProperty
 
-bpy.types.Scene.app_head_mesh_target = bpy.props.PointerProperty(type=bpy.types.Mesh)
-bpy.types.Scene.app_head_pivot_target = bpy.props.PointerProperty(type=bpy.types.Object)
-bpy.types.Scene.app_eye_l_pivot_target = bpy.props.PointerProperty(type=bpy.types.Object)
-bpy.types.Scene.app_eye_r_pivot_target = bpy.props.PointerProperty(type=bpy.types.Object)
-bpy.types.Scene.app_rig_target = bpy.props.PointerProperty(type=bpy.types.Object)
+#######################################################################
+# Startup timing
+# The import & register times, and the time taken to load numpy on first
+# use, in ms. Printed to the console when Blender runs with --debug or
+# the APPLICATOR_STARTUP_TIMING environment variable is set
+#######################################################################
+startup_timings = collections.OrderedDict()
+
+def report_startup_timings():
+    if bpy.app.debug or os.environ.get('APPLICATOR_STARTUP_TIMING', '') != '':
+        print('Applicator startup: ' + ', '.join('%s %.1f ms' % (name, ms) for name, ms in startup_timings.items()))
+
+#######################################################################
+# Loads a module on first use
+# numpy is only needed once a capture is processed, so it isn't loaded
+# when Blender starts. On first use the real module replaces the stand-in
+# in the add-on's globals
+#######################################################################
+class LazyModule:
+    def __init__(self, module_name, global_name):
+        self.module_name = module_name
+        self.global_name = global_name
+
+    def __getattr__(self, attribute_name):
+        if self.module_name not in sys.modules:
+            load_start_time = time.perf_counter()
+            importlib.import_module(self.module_name)
+            startup_timings[self.module_name + '_load'] = (time.perf_counter() - load_start_time) * 1000
+        module = sys.modules[self.module_name]
+        globals()[self.global_name] = module
+        return getattr(module, attribute_name)
+
+np = LazyModule('numpy', 'np')
+
+#the Scene properties the targets are selected in, added on register
+scene_pointer_properties = (
+    ('app_head_mesh_target', bpy.types.Mesh),
+    ('app_head_pivot_target', bpy.types.Object),
+    ('app_eye_l_pivot_target', bpy.types.Object),
+    ('app_eye_r_pivot_target', bpy.types.Object),
+    ('app_extra_meshes_target', bpy.types.Collection),
+    ('app_rig_target', bpy.types.Object),
+    ('app_transfer_source_rig', bpy.types.Object)
+)
 
 supported_fps = (60, 50, 48, 30, 25, 24)
+capture_archive_extension = '.appcap'
+take_archive_extension = '.zip'
+capture_file_extensions = ('.csv', capture_archive_extension, take_archive_extension)
 data_shapkey_names = ['eyeBlinkRight', 'eyeLookDownRight', 'eyeLookInRight', 'eyeLookOutRight', 'eyeLookUpRight', 'eyeSquintRight', 'eyeWideRight', 'eyeBlinkLeft', 'eyeLookDownLeft', 'eyeLookInLeft', 'eyeLookOutLeft', 'eyeLookUpLeft', 'eyeSquintLeft', 'eyeWideLeft', 'jawForward', 'jawRight', 'jawLeft', 'jawOpen', 'mouthClose', 'mouthFunnel', 'mouthPucker', 'mouthRight', 'mouthLeft', 'mouthSmileRight', 'mouthSmileLeft', 'mouthFrownRight', 'mouthFrownLeft', 'mouthDimpleRight', 'mouthDimpleLeft', 'mouthStretchRight', 'mouthStretchLeft', 'mouthRollLower', 'mouthRollUpper', 'mouthShrugLower', 'mouthShrugUpper', 'mouthPressRight', 'mouthPressLeft', 'mouthLowerDownRight', 'mouthLowerDownLeft', 'mouthUpperUpRight', 'mouthUpperUpLeft', 'browDownRight', 'browDownLeft', 'browInnerUp', 'browOuterUpRight', 'browOuterUpLeft', 'cheekPuff', 'cheekSquintRight', 'cheekSquintLeft', 'noseSneerRight', 'noseSneerLeft', 'tongueOut']
 data_item_names = ['HeadYaw', 'HeadPitch', 'HeadRoll', 'LeftEyeYaw', 'LeftEyePitch', 'LeftEyeRoll', 'RightEyeYaw', 'RightEyePitch', 'RightEyeRoll']
 blendShapeLabels = {
@@ -102,20 +184,150 @@ blendShapeLabels = {
 #Properties Class
 ################################################################    
 class ApplicatorProps(bpy.types.PropertyGroup):    
-    capture_file_path: bpy.props.StringProperty(name="Capture File Path")
+    capture_file_path: bpy.props.StringProperty(
+        name="Capture File Path",
+        update=lambda self, context: update_take_paths(self)
+    )
     capture_file_name: bpy.props.StringProperty(name="Capture File Name", default="(Select)")
 
-    neutral_file_path: bpy.props.StringProperty(name="Neutral File Path")
+    neutral_file_path: bpy.props.StringProperty(
+        name="Neutral File Path",
+        update=lambda self, context: update_take_paths(self)
+    )
     neutral_file_name: bpy.props.StringProperty(name="Neutral File Name", default="(Select)")
+    neutral_profile: bpy.props.EnumProperty(
+        name='Neutral Profile',
+        description='A saved performer neutral, used instead of the Neutral File',
+        items=lambda self, context: list_neutral_profile_items(self),
+        update=lambda self, context: import_neutral_profile(self, self.neutral_profile)
+    )
+    detect_neutral: bpy.props.BoolProperty(
+        name="Detect Neutral",
+        description="When no Neutral File or Neutral Profile is selected, estimate the neutral from the stillest part of the capture",
+        default=False
+    )
+    detect_neutral_frames: bpy.props.IntProperty(
+        name="Still Frames",
+        description="The number of capture frames in the still window the neutral is estimated from",
+        default=60,
+        min=3
+    )
+    profile_directory: bpy.props.StringProperty(
+        name="Profile Directory",
+        description="Shared directory the neutral profiles are saved to. Leave empty to use the Blender user config directory",
+        subtype='DIR_PATH'
+    )
 
     mapping_file_path: bpy.props.StringProperty(name="Mapping File Path")
     mapping_file_name: bpy.props.StringProperty(name="Mapping File Name", default="(Select)")
 
+    use_packed_data: bpy.props.BoolProperty(name="Use Packed Data", description="Use the data packed into the .blend file instead of reading the files", default=False)
+    watch_folder_path: bpy.props.StringProperty(
+        name="Ingest Folder",
+        description="Folder the takes arrive in. While watched, new and changed capture files are archived and indexed in the background, ready to apply",
+        subtype='DIR_PATH'
+    )
+    packed_capture_path: bpy.props.StringProperty(name="Packed Capture")
+    packed_neutral_path: bpy.props.StringProperty(name="Packed Neutral")
+    packed_mapping_path: bpy.props.StringProperty(name="Packed Mapping")
+
     start_frame: bpy.props.IntProperty(name="Start Frame", default=1)
     skip_capture_frames: bpy.props.IntProperty(name="Skip Capture Frames", default=0, min=0)
+    capture_in_timecode: bpy.props.StringProperty(name="In Timecode", description="First capture timecode to apply (HH:MM:SS:FF). Leave empty to start at the beginning of the capture")
+    capture_out_timecode: bpy.props.StringProperty(name="Out Timecode", description="Last capture timecode to apply (HH:MM:SS:FF). Leave empty to apply to the end of the capture")
     apply_shapekey_data: bpy.props.BoolProperty(name="Apply ShapeKey Data", default=True)
     apply_rotation_data: bpy.props.BoolProperty(name="Apply Rotation Data", default=True)
+    shape_key_output: bpy.props.EnumProperty(
+        name='Shape Key Output',
+        description='Where the shape key data is keyed',
+        default='RIG',
+        items = [
+            ('RIG', 'Face Rig', 'Key the face rig properties, which drive the shape keys'),
+            ('BAKE', 'Bake to Shape Keys', 'Key the shape keys of the Head Mesh and the Extra Meshes directly, in one action they all share')
+        ]
+    )
     clear_existing_keyframes: bpy.props.BoolProperty(name="Clear Existing Keyframes", default=True)
+    rotation_output: bpy.props.EnumProperty(
+        name='Rotation Output',
+        description='How the head and eye rotations are keyed on the Target Rig',
+        default='QUATERNION',
+        items = [
+            ('QUATERNION', 'Quaternion', 'Key the rotations as quaternions'),
+            ('EULER', 'Euler', 'Key the rotations as euler angles, using the rotation order'),
+            ('LEGACY', 'Legacy', 'Key the raw values in the quaternion, for face rigs created before version 0.8')
+        ]
+    )
+    rotation_order: bpy.props.EnumProperty(
+        name='Rotation Order',
+        description='The order the yaw, pitch and roll rotations are applied in',
+        default='XYZ',
+        items = [
+            ('XYZ', 'XYZ Euler', ''),
+            ('XZY', 'XZY Euler', ''),
+            ('YXZ', 'YXZ Euler', ''),
+            ('YZX', 'YZX Euler', ''),
+            ('ZXY', 'ZXY Euler', ''),
+            ('ZYX', 'ZYX Euler', '')
+        ]
+    )
+    repair_tracking: bpy.props.BoolProperty(
+        name="Repair Tracking",
+        description="Fill frozen, zeroed and out of sequence rows and single frame spikes before smoothing",
+        default=False
+    )
+    repair_fill: bpy.props.EnumProperty(
+        name='Repair Fill',
+        description='How the repaired frames are filled',
+        default='INTERPOLATE',
+        items = [
+            ('INTERPOLATE', 'Interpolate', 'Interpolate between the good frames either side'),
+            ('HOLD', 'Hold', 'Hold the last good frame')
+        ]
+    )
+    spike_threshold: bpy.props.FloatProperty(
+        name="Spike Threshold",
+        description="The per frame change a channel has to jump out (and back) by to count as a spike",
+        default=0.3,
+        min=0.0
+    )
+    reapply_frame_start: bpy.props.IntProperty(name="Start", description="First scene frame to re-apply", default=1)
+    reapply_frame_end: bpy.props.IntProperty(name="End", description="Last scene frame to re-apply", default=250)
+    reapply_blend_frames: bpy.props.IntProperty(
+        name="Blend Frames",
+        description="Frames at each edge of the range blended into the keys already there",
+        default=0,
+        min=0
+    )
+    transfer_source_mapping_path: bpy.props.StringProperty(
+        name="Source Mapping",
+        description="The mapping file the source rig was applied with. Empty uses the selected Mapping File",
+        default="",
+        subtype='FILE_PATH'
+    )
+    transfer_speed: bpy.props.FloatProperty(
+        name="Speed",
+        description="Playback speed of the transferred animation. 2 plays it twice as fast, over half the frames",
+        default=1.0,
+        min=0.01
+    )
+    transfer_strength: bpy.props.FloatProperty(
+        name="Strength",
+        description="Multiplier on the transferred shape key values",
+        default=1.0,
+        min=0.0
+    )
+    progressive_apply: bpy.props.BoolProperty(
+        name="Progressive",
+        description="Key every 4th frame of the unsmoothed capture straight away, then swap in the full result in the background",
+        default=False
+    )
+    apply_workers: bpy.props.IntProperty(
+        name="Workers",
+        description="Background Blender processes a long capture is split across when applying. 1 applies in this Blender only",
+        default=1,
+        min=1,
+        max=64
+    )
     smoothing_frames: bpy.props.EnumProperty(
         name='Smoothing Frames',
         description='Select the number of frames to use when applying the smoothing algorithm',
@@ -126,7 +338,10 @@ class ApplicatorProps(bpy.types.PropertyGroup):
             ('S5', '5 Frames', ''),
             ('S7', '7 Frames', ''),
             ('S9', '9 Frames', ''),
-            ('S11', '11 Frames', '')
+            ('S11', '11 Frames', ''),
+            ('ONE_EURO', 'One Euro (causal)', 'A low pass filter on the frames before only, its cutoff rising with the speed. Smooth when slow, little lag when fast'),
+            ('EXPONENTIAL', 'Exponential (causal)', 'A one pole low pass filter on the frames before only'),
+            ('DAMPED', 'Critically Damped (causal)', 'A critically damped spring following the frames before only')
         ]
     )
         
@@ -151,6 +366,7 @@ class ApplicatorTargetPanel(bpy.types.Panel):
         layout.prop_search(context.scene, "app_head_pivot_target", context.scene, "objects", text="Head Pivot")
         layout.prop_search(context.scene, "app_eye_l_pivot_target", context.scene, "objects", text="Left Eye Pivot")
         layout.prop_search(context.scene, "app_eye_r_pivot_target", context.scene, "objects", text="Right Eye Pivot")
+        layout.prop_search(context.scene, "app_extra_meshes_target", bpy.data, "collections", text="Extra Meshes")
         
         
         #Mapping File
@@ -161,11 +377,20 @@ class ApplicatorTargetPanel(bpy.types.Panel):
         sub.scale_x = 0.3
         sub.operator("applicator.mapping_file_browser", text="...")
         row.operator("applicator.mapping_file_clear", text="", icon="X")
+        draw_prefetch_status(layout, 'mapping', props.mapping_file_path)
         
         #button
         layout.operator("applicator.create_rig", text="Create Face Rig")
+        layout.operator("applicator.create_rigs", text="Create Face Rigs for Selected")
 
       
+#shows the file's prefetch status (if it has one) under its row
+def draw_prefetch_status(layout, kind, file_path):
+    status_text = get_prefetch_status_text(kind, file_path)
+    if status_text != None:
+        icon = 'ERROR' if status_text.startswith('Error') else ('CHECKMARK' if status_text.startswith('Ready') else 'SORTTIME')
+        layout.label(text=status_text, icon=icon)
+
 ################################################################    
 # Data Panel
 ################################################################    
@@ -189,6 +414,10 @@ class ApplicatorDataPanel(bpy.types.Panel):
         sub.scale_x = 0.3
         sub.operator("applicator.capture_file_browser", text="...")
         row.operator("applicator.capture_file_clear", text="", icon="X")
+        draw_prefetch_status(layout, 'capture', props.capture_file_path)
+        take_text = get_take_metadata_text(props.capture_file_path)
+        if take_text != None:
+            layout.label(text=take_text, icon='FILE_MOVIE')
                 
         #Neutral File
         layout.label(text="Neutral File (optional):")
@@ -198,6 +427,17 @@ class ApplicatorDataPanel(bpy.types.Panel):
         sub.scale_x = 0.3
         sub.operator("applicator.neutral_file_browser", text="...")
         row.operator("applicator.neutral_file_clear", text="", icon="X")
+        draw_prefetch_status(layout, 'neutral', props.neutral_file_path)
+
+        #Neutral Profile
+        row = layout.row()
+        row.prop(props, "neutral_profile", text="Profile")
+        row.operator("applicator.save_neutral_profile", text="", icon="ADD")
+        layout.prop(props, "profile_directory", text="Profiles")
+        row = layout.row()
+        row.prop(props, "detect_neutral")
+        if props.detect_neutral:
+            row.prop(props, "detect_neutral_frames", text="Frames")
                 
         #Mapping File
         layout.label(text="Mapping File:")
@@ -207,6 +447,29 @@ class ApplicatorDataPanel(bpy.types.Panel):
         sub.scale_x = 0.3
         sub.operator("applicator.mapping_file_browser", text="...")
         row.operator("applicator.mapping_file_clear", text="", icon="X")
+        draw_prefetch_status(layout, 'mapping', props.mapping_file_path)
+
+        #Capture archives
+        layout.operator("applicator.convert_captures", text="Convert Captures...")
+        layout.operator("applicator.export_capture", text="Export Capture...")
+
+        #Ingest folder
+        row = layout.row()
+        row.prop(props, "watch_folder_path", text="Ingest")
+        watching = is_watching()
+        row.operator("applicator.watch_folder", text="", icon='PAUSE' if watching else 'VIEWZOOM', depress=watching)
+        if watching and watch_state['status'] != '':
+            layout.label(text=watch_state['status'])
+
+        #Packed data
+        layout.label(text="Packed Data:")
+        row = layout.row()
+        if props.packed_capture_path != '':
+            row.prop(props, "use_packed_data", text="Use")
+            row.operator("applicator.pack_data", text="Refresh", icon="FILE_REFRESH")
+            row.operator("applicator.unpack_data", text="Unpack", icon="X")
+        else:
+            row.operator("applicator.pack_data", text="Pack into .blend", icon="PACKAGE")
 
 ################################################################    
 # Mapping Panel
@@ -243,14 +506,52 @@ class ApplicatorApplyPanel(bpy.types.Panel):
         layout.prop_search(context.scene, "app_rig_target", context.scene, "objects", text="Target Rig")
         layout.prop(props, "start_frame")
         layout.prop(props, "skip_capture_frames")
+        layout.prop(props, "capture_in_timecode")
+        layout.prop(props, "capture_out_timecode")
+        layout.prop(props, "repair_tracking")
+        if props.repair_tracking:
+            row = layout.row()
+            row.prop(props, "repair_fill", text="")
+            row.prop(props, "spike_threshold", text="Spike")
         layout.prop(props, "smoothing_frames")
         layout.prop(props, "apply_shapekey_data")
+        if props.apply_shapekey_data:
+            layout.prop(props, "shape_key_output")
         layout.prop(props, "apply_rotation_data")
+        if props.apply_rotation_data:
+            layout.prop(props, "rotation_output")
+            if props.rotation_output != 'LEGACY':
+                layout.prop(props, "rotation_order")
         layout.prop(props, "clear_existing_keyframes")
+        layout.prop(props, "progressive_apply")
+        if not props.progressive_apply:
+            layout.prop(props, "apply_workers")
         
         row = layout.row()
         row.scale_y = 2
         row.operator('applicator.apply', text="Apply")
+        progressive_status = get_progressive_status_text()
+        if progressive_status != None:
+            layout.label(text=progressive_status, icon='TIME')
+
+        box = layout.box()
+        row = box.row(align=True)
+        row.prop(props, "reapply_frame_start")
+        row.prop(props, "reapply_frame_end")
+        box.prop(props, "reapply_blend_frames")
+        box.operator('applicator.reapply_range', text="Re-apply Frame Range")
+
+        box = layout.box()
+        box.prop_search(context.scene, "app_transfer_source_rig", context.scene, "objects", text="Source Rig")
+        box.prop(props, "transfer_source_mapping_path")
+        row = box.row(align=True)
+        row.prop(props, "transfer_speed")
+        row.prop(props, "transfer_strength")
+        box.operator('applicator.transfer_animation', text="Transfer to Target Rig")
+
+        preview_running = is_preview_running()
+        layout.operator('applicator.preview', text="Stop Preview" if preview_running else "Preview", icon='PLAY', depress=preview_running)
+        layout.operator('applicator.benchmark', text="Benchmark Playback...", icon='TIME')
 
 ################################################################    
 # Create Face Rig
@@ -303,36 +604,6 @@ class ApplicatorCreateFaceRig(bpy.types.Operator):
                 
         return is_valid, messages
 
-    ################################################################    
-    # Gets the object's collection
-    ################################################################        
-    def get_collection_for_object(self, collection, object, type):
-        #search child collections
-        for coll in collection.children:
-            result = self.get_collection_for_object(coll, object, type)
-            if result != None:
-                return result
-            
-        #check if the object is in the collection
-        for coll_obj in collection.all_objects:
-            if coll_obj.type == type and coll_obj.name == object.name:
-                #found it
-                return collection
-            
-        #didn't find it, return None    
-        return None
-    
-    ################################################################    
-    # Gets the object form the collection
-    ################################################################        
-    def get_object(self, collection, name, type):
-        result = None
-        for coll_obj in collection.all_objects:
-            if coll_obj.type == type and coll_obj.name == name:
-                result = coll_obj
-                break
-        return result
-        
     ################################################################    
     # Delete the Applicator rig & collection
     ################################################################        
@@ -365,249 +636,6 @@ class ApplicatorCreateFaceRig(bpy.types.Operator):
             except:
                 armature_obj = None
 
-    ################################################################    
-    # Add Empties
-    ################################################################        
-    def add_empties(self, rig_collection):
-        
-        #add empty for head
-        headEmpty = self.get_object(rig_collection, 'ApplicatorHeadEmpty', 'EMPTY')
-        if headEmpty == None: #should't exist
-            headEmpty = bpy.data.objects.new("ApplicatorHeadEmpty", None )
-            headEmpty.empty_display_size = 0.2
-            headEmpty.empty_display_type = 'CUBE'
-            headEmpty.hide_viewport = True
-            rig_collection.objects.link(headEmpty)
-
-        #add empty for eyes
-        eyeEmpty = self.get_object(rig_collection, 'ApplicatorEyeEmpty', 'EMPTY')
-        if eyeEmpty == None:
-            eyeEmpty = bpy.data.objects.new('ApplicatorEyeEmpty', None )
-            eyeEmpty.empty_display_size = 0.06
-            eyeEmpty.empty_display_type = 'CONE'
-            eyeEmpty.hide_viewport = True
-            rig_collection.objects.link(eyeEmpty)
-
-        #add empty for nose
-        noseEmpty = self.get_object(rig_collection, 'ApplicatorNoseEmpty', 'EMPTY')
-        if noseEmpty == None: #should't exist
-            noseEmpty = bpy.data.objects.new('ApplicatorNoseEmpty', None )
-            noseEmpty.empty_display_size = 0.03
-            noseEmpty.empty_display_type = 'CUBE'
-            noseEmpty.hide_viewport = True
-            rig_collection.objects.link(noseEmpty)
-
-        #add empty for mouth
-        mouthEmpty = self.get_object(rig_collection, 'ApplicatorMouthEmpty', 'EMPTY')
-        if mouthEmpty == None: #should't exist
-            mouthEmpty = bpy.data.objects.new('ApplicatorMouthEmpty', None )
-            mouthEmpty.empty_display_size = 0.02
-            mouthEmpty.empty_display_type = 'CUBE'
-            mouthEmpty.hide_viewport = True
-            rig_collection.objects.link(mouthEmpty)
-            
-        #add empty for brows
-        browsEmpty = self.get_object(rig_collection, 'ApplicatorBrowsEmpty', 'EMPTY')
-        if browsEmpty == None: #should't exist
-            browsEmpty = bpy.data.objects.new('ApplicatorBrowsEmpty', None )
-            browsEmpty.empty_display_size = 0.02
-            browsEmpty.empty_display_type = 'CUBE'
-            browsEmpty.hide_viewport = True
-            rig_collection.objects.link(browsEmpty)
-        
-        return headEmpty, eyeEmpty, noseEmpty, mouthEmpty, browsEmpty
-        
-    ################################################################    
-    # Add the face rig
-    ################################################################        
-    def add_face_rig(self, rig_collection, headEmpty, eyeEmpty, noseEmpty, mouthEmpty, browsEmpty):
-        #lookup the current armatures names + object names (total hack; but it works)
-        current_armature_names = []
-        current_armature_obj_names = []
-
-        for arm in bpy.data.armatures:
-            current_armature_names.append(arm.name)
-            
-        for obj in bpy.data.objects:
-            if obj.type == 'ARMATURE':
-                current_armature_obj_names.append(obj.name)
-
-        #add a new armature and move to collection (ish)
-        bpy.ops.object.armature_add()
-        bpy.ops.object.collection_link(collection=rig_collection.name)
-
-        #find the newly created armature
-        armature = None
-        for arm in bpy.data.armatures:
-            if arm.name not in current_armature_names:
-                armature = arm
-                armature.name = 'ApplicatorFaceRig'
-                break
-
-        #find the newly created armature object
-        armature_obj = None
-        for obj in bpy.data.objects:
-            if obj.type == 'ARMATURE' and obj.name not in current_armature_obj_names:
-                armature_obj = obj
-                armature_obj.name = 'ApplicatorFaceRig'
-                break
-
-        #select the armature obejct
-        bpy.ops.object.select_all(action='DESELECT')
-        bpy.context.view_layer.objects.active = armature_obj
-
-        #go into edit mode
-        bpy.ops.object.mode_set(mode='EDIT', toggle=False)
-        edit_bones = armature.edit_bones
-        
-        #remove the default bone
-        edit_bones.remove(edit_bones[0])
-
-        #rename Bone to Head
-        head_bone = edit_bones.new('Head')
-        head_bone.head = (0, 0, 0.0)
-        head_bone.tail = (0, 1, 0.0)
-
-        #Add Eye_R Bone
-        eye_r = edit_bones.new('Eye_R')
-        eye_r.head = (-0.1, -0.2, 0.04)
-        eye_r.tail = (-0.1, 0.8, 0.04)
-        eye_r.parent = head_bone
-
-        #Add Eye_L Bone
-        eye_l = edit_bones.new('Eye_L')
-        eye_l.head = (0.1, -0.2, 0.04)
-        eye_l.tail = (0.1, 0.8, 0.04)
-        eye_l.parent = head_bone
-        
-        #Add Brows Bone
-        brows = edit_bones.new('Brows')
-        brows.head = (0.0, -0.2, 0.15)
-        brows.tail = (0.0, 0.8, 0.15)
-        brows.parent = head_bone
-
-        #Add Nose Bone
-        nose = edit_bones.new('Nose')
-        nose.head = (0.0, -0.23, -0.03)
-        nose.tail = (0.0, 0.8, -0.03)
-        nose.parent = head_bone
-
-        #Add Mouth Bone
-        mouth = edit_bones.new('Mouth')
-        mouth.head = (0.0, -0.18, -0.12)
-        mouth.tail = (0.0, 0.8, -0.12)
-        mouth.parent = head_bone
-
-        #go back to object mode
-        bpy.ops.object.mode_set(mode='OBJECT')
-
-        #assign the custom shapes
-        armature_obj.pose.bones['Head'].custom_shape = headEmpty
-        armature_obj.pose.bones['Eye_R'].custom_shape = eyeEmpty
-        armature_obj.pose.bones['Eye_L'].custom_shape = eyeEmpty
-        armature_obj.pose.bones['Brows'].custom_shape = browsEmpty
-        armature_obj.pose.bones['Brows'].scale[0] = 8
-        armature_obj.pose.bones['Nose'].custom_shape = noseEmpty
-        armature_obj.pose.bones['Mouth'].custom_shape = mouthEmpty
-        armature_obj.pose.bones['Mouth'].scale[0] = 8
-
-        #move 1 unit left, 1 unit up
-        armature_obj.location = (1.0, 0.0, 1.0)
-
-        return armature_obj, armature
-
-    ################################################################    
-    # Add Custom Properties to the target bone, and sets them as drivers to the shape key  
-    ################################################################      
-    def add_shape_key_drivers(self, armature_obj, target_mesh, bone_name, properties):
-        ##########################
-        #add the custom properties
-        ##########################
-        rna_ui = {}
-        for property in properties:
-            name = property[0]
-            min = property[1]
-            max = property[2]
-            value = property[3]
-            shape_key_name = property[4]
-            
-            #only add custom property if it has a shapekey to drive
-            if shape_key_name != None:
-                #add the property        
-                armature_obj.pose.bones[bone_name][name] = value
-                
-                #set the config the dictionary
-                rna_ui[name] = {"min":min, "max":max}
-
-        #set the property config
-        if not armature_obj.pose.bones[bone_name].get('_RNA_UI'):
-            armature_obj.pose.bones[bone_name]['_RNA_UI'] = {}
-        armature_obj.pose.bones[bone_name]['_RNA_UI'] = rna_ui
-    
-        ##########################
-        #add the drivers
-        ##########################
-        for property in properties:
-            name = property[0]
-            shape_key_name = property[4]
-
-           #only add driver if it has a shapekey to drive
-            if shape_key_name != None:
-                shape_key = target_mesh.shape_keys.key_blocks[shape_key_name]
-                shape_key.driver_remove('value') #removed if exists. no error otherwise
-                driver = shape_key.driver_add('value').driver
-                driver.type ='AVERAGE'
-                driver_var = driver.variables.new()
-                driver_var.type = 'SINGLE_PROP'
-                driver_var.targets[0].id = armature_obj
-                driver_var.targets[0].data_path = 'pose.bones["' + bone_name + '"]["' + name + '"]'
-
-    ################################################################    
-    # Adds the rotation drivers to the head and eyes  
-    ################################################################      
-    def add_rotation_drivers(self, armature_obj, target_pivot, bone_name):
-        if target_pivot != None:
-            target_pivot.driver_remove('rotation_euler')
-            driver_x = target_pivot.driver_add('rotation_euler', 0).driver
-            driver_y = target_pivot.driver_add('rotation_euler', 1).driver
-            driver_z = target_pivot.driver_add('rotation_euler', 2).driver
-
-            driver_x.type ='AVERAGE'
-            driver_y.type ='AVERAGE'
-            driver_z.type ='AVERAGE'
-            
-            driver_var_x = driver_x.variables.new()
-            driver_var_y = driver_y.variables.new()
-            driver_var_z = driver_z.variables.new()
-
-            driver_var_x.type = 'SINGLE_PROP'
-            driver_var_y.type = 'SINGLE_PROP'
-            driver_var_z.type = 'SINGLE_PROP'
-            
-            driver_var_x.targets[0].id = armature_obj
-            driver_var_y.targets[0].id = armature_obj
-            driver_var_z.targets[0].id = armature_obj
-
-            driver_var_x.targets[0].data_path = 'pose.bones["' + bone_name + '"].rotation_quaternion[1]'
-            driver_var_y.targets[0].data_path = 'pose.bones["' + bone_name + '"].rotation_quaternion[2]'
-            driver_var_z.targets[0].data_path = 'pose.bones["' + bone_name + '"].rotation_quaternion[3]'
-        
-    def get_target_shape_key(self, target_mesh, mapping_data, blend_shape_name):
-        result = None
-        target_shape_key = None
-        
-        #get the target shape key name of the mapping
-        mapping_lines = [mapping for mapping in mapping_data if mapping['Type'] == 'BlendShape' and mapping['Name'] == blend_shape_name]
-        if len(mapping_lines) > 0:
-            target_shape_key = mapping_lines[0]['Target']
-
-        #make sure the mapped shapekey exists in the target mesh
-        if target_shape_key.strip() != '':
-            if target_shape_key in target_mesh.shape_keys.key_blocks:
-                result = target_shape_key
-        
-        return result
-
     ################################################################    
     # Execute logic
     ################################################################        
@@ -634,108 +662,50 @@ class ApplicatorCreateFaceRig(bpy.types.Operator):
         if is_valid:
             #cleanup any existing rig
             self.del_existing_rig()
-            
-            #get the collection the head mesh is in
-            head_mesh_collection = self.get_collection_for_object(bpy.context.scene.collection, head_mesh, 'MESH')
-            
-            #create the rig collection
-            rig_collection = bpy.data.collections.new('ApplicatorRig')
-            head_mesh_collection.children.link(rig_collection)
-                    
-            #add the empties
-            headEmpty, eyeEmpty, noseEmpty, mouthEmpty, browsEmpty = self.add_empties(rig_collection)            
-            
-            #add the face rig
-            face_rig_object, face_rig_armature = self.add_face_rig(rig_collection, headEmpty, eyeEmpty, noseEmpty, mouthEmpty, browsEmpty)
 
-            #get the mapping data
-            mapping_data = list_csv_data(props.mapping_file_path)
-            
-            #add the propertes and drivers
-            eye_r_properties = [
-                #name, min, max, value, shapeKey
-                [blendShapeLabels['eyeBlinkRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeBlinkRight')],
-                [blendShapeLabels['eyeLookDownRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeLookDownRight')],
-                [blendShapeLabels['eyeLookInRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeLookInRight')],
-                [blendShapeLabels['eyeLookOutRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeLookOutRight')],
-                [blendShapeLabels['eyeLookUpRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeLookUpRight')],
-                [blendShapeLabels['eyeSquintRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeSquintRight')],
-                [blendShapeLabels['eyeWideRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeWideRight')]
-            ]
-            eye_l_properties = [
-                [blendShapeLabels['eyeBlinkLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeBlinkLeft')],
-                [blendShapeLabels['eyeLookDownLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeLookDownLeft')],
-                [blendShapeLabels['eyeLookInLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeLookInLeft')],
-                [blendShapeLabels['eyeLookOutLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeLookOutLeft')],
-                [blendShapeLabels['eyeLookUpLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeLookUpLeft')],
-                [blendShapeLabels['eyeSquintLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeSquintLeft')],
-                [blendShapeLabels['eyeWideLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'eyeWideLeft')]
-            ]
-            mouth_properties = [
-                [blendShapeLabels['jawForward'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'jawForward')],
-                [blendShapeLabels['jawRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'jawRight')],
-                [blendShapeLabels['jawLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'jawLeft')],
-                [blendShapeLabels['jawOpen'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'jawOpen')],
-                [blendShapeLabels['mouthClose'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthClose')],
-                [blendShapeLabels['mouthFunnel'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthFunnel')],
-                [blendShapeLabels['mouthPucker'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthPucker')],
-                [blendShapeLabels['mouthRollLower'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthRollLower')],
-                [blendShapeLabels['mouthRollUpper'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthRollUpper')],
-                [blendShapeLabels['mouthShrugLower'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthShrugLower')],
-                [blendShapeLabels['mouthShrugUpper'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthShrugUpper')],
-                [blendShapeLabels['tongueOut'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'tongueOut')],
-                [blendShapeLabels['mouthLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthLeft')],
-                [blendShapeLabels['mouthSmileLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthSmileLeft')],
-                [blendShapeLabels['mouthFrownLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthFrownLeft')],
-                [blendShapeLabels['mouthDimpleLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthDimpleLeft')],
-                [blendShapeLabels['mouthStretchLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthStretchLeft')],
-                [blendShapeLabels['mouthPressLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthPressLeft')],
-                [blendShapeLabels['mouthLowerDownLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthLowerDownLeft')],
-                [blendShapeLabels['mouthUpperUpLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthUpperUpLeft')],
-                [blendShapeLabels['mouthRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthRight')],
-                [blendShapeLabels['mouthSmileRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthSmileRight')],
-                [blendShapeLabels['mouthFrownRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthFrownRight')],
-                [blendShapeLabels['mouthDimpleRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthDimpleRight')],
-                [blendShapeLabels['mouthStretchRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthStretchRight')],
-                [blendShapeLabels['mouthPressRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthPressRight')],
-                [blendShapeLabels['mouthLowerDownRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthLowerDownRight')],
-                [blendShapeLabels['mouthUpperUpRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'mouthUpperUpRight')]
-            ]
-            brows_properties = [
-                [blendShapeLabels['browDownRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'browDownRight')],
-                [blendShapeLabels['browDownLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'browDownLeft')],
-                [blendShapeLabels['browInnerUp'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'browInnerUp')],
-                [blendShapeLabels['browOuterUpRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'browOuterUpRight')],
-                [blendShapeLabels['browOuterUpLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'browOuterUpLeft')]
-            ]
-            nose_properties = [
-                [blendShapeLabels['cheekPuff'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'cheekPuff')],
-                [blendShapeLabels['cheekSquintRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'cheekSquintRight')],
-                [blendShapeLabels['cheekSquintLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'cheekSquintLeft')],
-                [blendShapeLabels['noseSneerRight'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'noseSneerRight')],
-                [blendShapeLabels['noseSneerLeft'], 0.0, 1.0, 0.0, self.get_target_shape_key(head_mesh, mapping_data, 'noseSneerLeft')]
-            ]
-            self.add_shape_key_drivers(face_rig_object, head_mesh, 'Eye_L', eye_l_properties)
-            self.add_shape_key_drivers(face_rig_object, head_mesh, 'Eye_R', eye_r_properties)
-            self.add_shape_key_drivers(face_rig_object, head_mesh, 'Nose', nose_properties)
-            self.add_shape_key_drivers(face_rig_object, head_mesh, 'Mouth', mouth_properties)
-            self.add_shape_key_drivers(face_rig_object, head_mesh, 'Brows', brows_properties)
-
-            #add the rotation drivers
-            self.add_rotation_drivers(face_rig_object, head_pivot, 'Head')
-            self.add_rotation_drivers(face_rig_object, eye_l_pivot, 'Eye_L')
-            self.add_rotation_drivers(face_rig_object, eye_r_pivot, 'Eye_R')
+            #build the rig & drivers
+            extra_meshes = list_extra_meshes(context.scene.app_extra_meshes_target, head_mesh)
+            result = create_face_rig(head_mesh, props.mapping_file_path, head_pivot, eye_l_pivot, eye_r_pivot, extra_meshes=extra_meshes)
             
-            #set the target rig control to the newly created rig
-            context.scene.app_rig_target = face_rig_object
+            #select the new rig & set the target rig control to it
+            result['rig'].select_set(True)
+            context.view_layer.objects.active = result['rig']
+            context.scene.app_rig_target = result['rig']
             
-            show_message_box(['Face Rig Created'], 'Success')
+            show_message_box(['Face Rig Created'] + result['warnings'], 'Success')
         else:
             #Display the errors
             show_message_box(messages, "Validation error", 'CANCEL')         
         
         return {'FINISHED'}
 
+################################################################    
+# Create Face Rigs for the selected head meshes
+################################################################    
+class ApplicatorCreateFaceRigs(bpy.types.Operator): 
+    bl_idname = "applicator.create_rigs" 
+    bl_label = "Create Face Rigs for Selected" 
+    bl_description = "Create a Face Rig for each selected mesh with shape keys (no pivots)" 
+
+    def execute(self, context):
+        props = context.scene.ApplicatorProps
+        head_objects = [obj for obj in context.selected_objects if obj.type == 'MESH' and obj.data.shape_keys != None]
+
+        #make sure we are in object mode
+        if bpy.context.object != None and bpy.context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        #validate the settings
+        is_valid, messages = ApplicatorCreateFaceRig.ValidateSettings(self, head_objects[0].data if len(head_objects) > 0 else None, props)
+        
+        if is_valid:
+            result = create_face_rigs([{'head_object': head_object} for head_object in head_objects], props.mapping_file_path)
+            show_message_box(['Created ' + str(len(result['rigs'])) + ' Face Rigs'] + result['warnings'][:10], 'Success')
+        else:
+            #Display the errors
+            show_message_box(messages, "Validation error", 'CANCEL')         
+        
+        return {'FINISHED'}
       
 ################################################################    
 # Select Capture File
@@ -749,7 +719,7 @@ class ApplicatorSelectCaptureFile(bpy.types.Operator, ImportHelper):
 
     filename_ext = ".csv"
     filter_glob: bpy.props.StringProperty(
-        default='*.csv',
+        default='*.csv;*' + capture_archive_extension + ';*' + take_archive_extension,
         options={'HIDDEN'}
     )
     
@@ -758,10 +728,13 @@ class ApplicatorSelectCaptureFile(bpy.types.Operator, ImportHelper):
         return context.object is not None
 
     def execute(self, context):
-        filename = os.path.basename(self.filepath)
+        #a take folder is selected by going into it and selecting no file
+        filepath = os.path.normpath(self.filepath) if os.path.isdir(self.filepath) else self.filepath
+        filename = os.path.basename(filepath)
         props = context.scene.ApplicatorProps
-        props.capture_file_path = self.filepath
+        props.capture_file_path = filepath
         props.capture_file_name = filename
+        start_prefetch('capture', filepath, props.detect_neutral_frames if props.detect_neutral else None)
         return {'FINISHED'}
 
     def invoke(self, context, event):
@@ -780,6 +753,7 @@ class ApplicatorClearCaptureFile(bpy.types.Operator):
         props = context.scene.ApplicatorProps
         props.capture_file_path = ''
         props.capture_file_name = '(Select)'
+        cancel_prefetch('capture')
         return {'FINISHED'}
     
 ################################################################    
@@ -794,7 +768,7 @@ class ApplicatorSelectNeutralFile(bpy.types.Operator, ImportHelper):
 
     filename_ext = ".csv"
     filter_glob: bpy.props.StringProperty(
-        default='*.csv',
+        default='*.csv;*' + capture_archive_extension + ';*' + take_archive_extension,
         options={'HIDDEN'}
     )
     
@@ -803,10 +777,12 @@ class ApplicatorSelectNeutralFile(bpy.types.Operator, ImportHelper):
         return context.object is not None
 
     def execute(self, context):
-        filename = os.path.basename(self.filepath)
+        filepath = os.path.normpath(self.filepath) if os.path.isdir(self.filepath) else self.filepath
+        filename = os.path.basename(filepath)
         props = context.scene.ApplicatorProps
-        props.neutral_file_path = self.filepath
+        props.neutral_file_path = filepath
         props.neutral_file_name = filename
+        start_prefetch('neutral', filepath)
         return {'FINISHED'}
 
     def invoke(self, context, event):
@@ -825,6 +801,55 @@ class ApplicatorClearNeutralFile(bpy.types.Operator):
         props = context.scene.ApplicatorProps
         props.neutral_file_path = ''
         props.neutral_file_name = '(Select)'
+        cancel_prefetch('neutral')
+        return {'FINISHED'}
+
+################################################################    
+# Save Neutral Profile
+# Saves the neutral calculated from the Neutral File as a performer profile
+################################################################    
+class ApplicatorSaveNeutralProfile(bpy.types.Operator): 
+    bl_idname = "applicator.save_neutral_profile" 
+    bl_label = "Save Neutral Profile" 
+    bl_description = "Save the neutral calculated from the Neutral File (or detected from the capture) as a named performer profile, to the profile directory and the .blend file" 
+
+    profile_name: bpy.props.StringProperty(name="Performer")
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        props = context.scene.ApplicatorProps
+        capture_path, neutral_path, mapping_path = get_data_paths(props)
+        profile_name = bpy.path.clean_name(self.profile_name.strip())
+        messages = []
+
+        #without a neutral file, the detected neutral is saved
+        window_frames = None
+        if (neutral_path == None or neutral_path == '' or is_profile_path(neutral_path)) and props.detect_neutral:
+            neutral_path = capture_path
+            window_frames = props.detect_neutral_frames
+
+        if self.profile_name.strip() == '':
+            messages.append("- Profile name missing. Please enter the performer's name.")
+        elif is_profile_name_too_long(profile_name):
+            messages.append('- Profile name too long. Please use at most ' + str(profile_name_max_bytes) + ' characters.')
+        if neutral_path == None or neutral_path == '' or is_profile_path(neutral_path):
+            messages.append("- Neutral File missing. Please select the Neutral File (or Detect Neutral) to save as a profile.")
+        elif data_file_exists(neutral_path) == False:
+            messages.append("- Selected Neutral File does not exist. Please reselect the Neutral File.")
+
+        if len(messages) == 0:
+            try:
+                save_neutral_profile(props, create_neutral_profile(profile_name, neutral_path, window_frames))
+                props.neutral_profile = profile_name
+            except (OSError, ValueError, KeyError) as error:
+                messages.append('- Failed to save the profile: ' + str(error))
+
+        if len(messages) > 0:
+            show_message_box(messages, "Validation error", 'CANCEL')
+        else:
+            show_message_box(['Neutral profile saved: ' + profile_name], "Neutral Profile", 'INFO')
         return {'FINISHED'}
 
 ################################################################    
@@ -852,6 +877,7 @@ class ApplicatorSelectMappingFile(bpy.types.Operator, ImportHelper):
         props = context.scene.ApplicatorProps
         props.mapping_file_path = self.filepath
         props.mapping_file_name = filename
+        start_prefetch('mapping', self.filepath)
         return {'FINISHED'}
 
     def invoke(self, context, event):
@@ -870,8 +896,195 @@ class ApplicatorClearMappingFile(bpy.types.Operator):
         props = context.scene.ApplicatorProps
         props.mapping_file_path = ''
         props.mapping_file_name = '(Select)'
+        cancel_prefetch('mapping')
         return {'FINISHED'}
     
+################################################################    
+# Pack Data
+# Packs (or refreshes) the capture, neutral & mapping data into the .blend
+################################################################    
+class ApplicatorPackData(bpy.types.Operator): 
+    bl_idname = "applicator.pack_data" 
+    bl_label = "Pack Data" 
+    bl_description = "Pack the capture, neutral and mapping data into the .blend file, or refresh the packed data from the files" 
+
+    def execute(self, context):
+        props = context.scene.ApplicatorProps
+        messages = []
+
+        #the files must all be readable
+        for file_label, file_path, required in [('Capture', props.capture_file_path, True), ('Neutral', props.neutral_file_path, False), ('Mapping', props.mapping_file_path, True)]:
+            if file_path == '':
+                if required:
+                    messages.append('- ' + file_label + ' File missing. Please select the ' + file_label + ' File.')
+            elif os.path.exists(file_path) == False:
+                messages.append('- Selected ' + file_label + ' File does not exist. Please reselect the ' + file_label + ' File.')
+
+        if len(messages) == 0:
+            try:
+                pack_data_files(props)
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile) as error:
+                messages.append('- Failed to pack the data: ' + str(error))
+
+        if len(messages) > 0:
+            show_message_box(messages, "Validation error", 'CANCEL')
+        return {'FINISHED'}
+
+################################################################    
+# Unpack Data
+# Removes the packed data, so the files are used again
+################################################################    
+class ApplicatorUnpackData(bpy.types.Operator): 
+    bl_idname = "applicator.unpack_data" 
+    bl_label = "Unpack Data" 
+    bl_description = "Remove the packed data from the .blend file and use the files again" 
+
+    def execute(self, context):
+        props = context.scene.ApplicatorProps
+        props.use_packed_data = False
+        props.packed_capture_path = ''
+        props.packed_neutral_path = ''
+        props.packed_mapping_path = ''
+        remove_unused_packed_data()
+        return {'FINISHED'}
+
+################################################################    
+# Convert Captures
+# Converts the selected capture csv files to capture archives,
+# and selected capture archives back to csv files
+################################################################    
+class ApplicatorConvertCaptures(bpy.types.Operator, ImportHelper): 
+    bl_idname = "applicator.convert_captures" 
+    bl_label = "Convert"
+    bl_description = "Convert capture csv files to compact capture archives (" + capture_archive_extension + "), or archives back to csv files"
+
+    files: bpy.props.CollectionProperty(type=bpy.types.OperatorFileListElement, options={'HIDDEN', 'SKIP_SAVE'})
+    directory: bpy.props.StringProperty(subtype='DIR_PATH', options={'HIDDEN', 'SKIP_SAVE'})
+
+    filter_glob: bpy.props.StringProperty(
+        default='*.csv;*' + capture_archive_extension,
+        options={'HIDDEN'}
+    )
+
+    def execute(self, context):
+        messages = []
+        source_size = 0
+        target_size = 0
+
+        for file in self.files:
+            source_path = os.path.join(self.directory, file.name)
+            filename, extension = os.path.splitext(source_path)
+            try:
+                if extension.lower() == '.csv':
+                    target_path = filename + capture_archive_extension
+                    convert_capture_to_archive(source_path, target_path)
+                elif extension.lower() == capture_archive_extension:
+                    target_path = filename + '.csv'
+                    convert_archive_to_capture(source_path, target_path)
+                else:
+                    messages.append('- Skipped ' + file.name + ': not a .csv or ' + capture_archive_extension + ' file.')
+                    continue
+            except (OSError, ValueError) as error:
+                messages.append('- Failed to convert ' + file.name + ': ' + str(error))
+                continue
+
+            source_size += os.path.getsize(source_path)
+            target_size += os.path.getsize(target_path)
+            messages.append('- ' + file.name + ' > ' + os.path.basename(target_path))
+
+        if source_size > 0:
+            messages.append('Total size: ' + str(round(source_size / 1048576, 2)) + 'MB > ' + str(round(target_size / 1048576, 2)) + 'MB')
+        show_message_box(messages, "Convert Captures", 'INFO')
+        return {'FINISHED'}
+
+################################################################    
+# Watch Folder
+# Starts or stops watching the ingest folder
+################################################################    
+class ApplicatorWatchFolder(bpy.types.Operator): 
+    bl_idname = "applicator.watch_folder" 
+    bl_label = "Watch Folder"
+    bl_description = "Start or stop watching the ingest folder, archiving and indexing the takes that arrive in it"
+
+    def execute(self, context):
+        props = context.scene.ApplicatorProps
+        if is_watching():
+            stop_watching()
+        elif props.watch_folder_path == '' or not os.path.isdir(bpy.path.abspath(props.watch_folder_path)):
+            show_message_box(['- Ingest Folder not found. Please select the folder the takes arrive in.'], "Validation error", 'CANCEL')
+        else:
+            try:
+                start_watching(bpy.path.abspath(props.watch_folder_path), props.detect_neutral_frames)
+            except OSError as error:
+                show_message_box(['- ' + str(error)], "Validation error", 'CANCEL')
+        return {'FINISHED'}
+
+################################################################    
+# Export Capture
+# Exports the applied animation as a capture
+################################################################    
+class ApplicatorExportCapture(bpy.types.Operator, ExportHelper): 
+    bl_idname = "applicator.export_capture" 
+    bl_label = "Export Capture" 
+    bl_description = "Export the applied animation over the scene's frame range as a Live Link Face capture (.csv) or a capture archive (" + capture_archive_extension + ")" 
+
+    filename_ext = '.csv'
+
+    filter_glob: bpy.props.StringProperty(
+        default='*.csv;*' + capture_archive_extension,
+        options={'HIDDEN'}
+    )
+    export_format: bpy.props.EnumProperty(
+        name='Format',
+        items = [
+            ('CSV', 'Live Link Face (.csv)', ''),
+            ('ARCHIVE', 'Capture Archive (' + capture_archive_extension + ')', '')
+        ]
+    )
+    source: bpy.props.EnumProperty(
+        name='Source',
+        description='Where the animation is read from',
+        items = [
+            ('RIG', 'Face Rig', 'The Target Rig\'s properties and rotations'),
+            ('SHAPE_KEYS', 'Shape Keys', 'Shape keys baked on the Head Mesh (rotations from the Target Rig)')
+        ]
+    )
+    sample_rate: bpy.props.IntProperty(name="Sample Rate", description="Samples per second", default=60, min=1)
+    undo_mapping: bpy.props.BoolProperty(
+        name="Undo Mapping",
+        description="Reverse the mapping & neutral, so applying the export with the same files rebuilds the animation",
+        default=True
+    )
+
+    def check(self, context):
+        self.filename_ext = '.csv' if self.export_format == 'CSV' else capture_archive_extension
+        return ExportHelper.check(self, context)
+
+    def execute(self, context):
+        scene = context.scene
+        props = scene.ApplicatorProps
+        capture_path, neutral_path, mapping_path = get_data_paths(props)
+        messages = []
+
+        if self.source == 'RIG' and (scene.app_rig_target == None or scene.app_rig_target.type != 'ARMATURE'):
+            messages.append("- No Target Rig select. Please select the Target Rig.")
+        if self.source == 'SHAPE_KEYS' and (scene.app_head_mesh_target == None or scene.app_head_mesh_target.shape_keys == None):
+            messages.append("- No head mesh with shape keys selected. Please select the head mesh.")
+        if mapping_path == None or mapping_path == '' or data_file_exists(mapping_path) == False:
+            messages.append("- Mapping File missing. The mapping is needed to map the rig back to the capture channels.")
+
+        if len(messages) == 0:
+            try:
+                export_capture(self.filepath, build_export_capture(scene, props, self.source, self.sample_rate, self.undo_mapping))
+            except (OSError, ValueError, KeyError) as error:
+                messages.append('- Failed to export the capture: ' + str(error))
+
+        if len(messages) > 0:
+            show_message_box(messages, "Validation error", 'CANCEL')
+        else:
+            show_message_box(['Capture exported: ' + os.path.basename(self.filepath)], "Export Capture", 'INFO')
+        return {'FINISHED'}
+
 ################################################################    
 # Apply
 ################################################################    
@@ -926,68 +1139,98 @@ class ApplicatorApply(bpy.types.Operator):
             if has_eye_r == False:
                 is_valid = False 
                 messages.append("- Target Rig missing Eye_R bone.")
+
+        #Baking needs the head mesh
+        if props.apply_shapekey_data and props.shape_key_output == 'BAKE':
+            head_mesh = bpy.context.scene.app_head_mesh_target
+            if head_mesh == None or head_mesh.shape_keys == None:
+                is_valid = False
+                messages.append("- No head mesh with shape keys selected. Baking to Shape Keys needs the Head Mesh.")
+
+        #take folders synced since being selected are looked into again, and the packed data is used in place of the files
+        refresh_take_paths(props)
+        capture_path, neutral_path, mapping_path = get_data_paths(props)
                 
         #Capture File Selected?
-        if props.capture_file_path == None or props.capture_file_path == '':
+        if capture_path == None or capture_path == '':
             is_valid = False
             messages.append("- Capture File missing. Please select the Capture File.")
 
         #Capture File Exists?
-        elif os.path.exists(props.capture_file_path) == False:
+        elif data_file_exists(capture_path) == False:
             is_valid = False
             messages.append("- Selected Capture File does not exist. Please reselect the Capture File.")
 
-        #Capture File a csv?
+        #Capture File a csv/archive?
         else:
-            filename, extension = os.path.splitext(props.capture_file_path.lower())
-            if extension != ".csv":
+            filename, extension = os.path.splitext(capture_path.lower())
+            if extension not in capture_file_extensions and not is_packed_path(capture_path):
                 is_valid = False
-                messages.append('- Incorrect Capture File type. Please select a .csv file.')
+                messages.append('- Incorrect Capture File type. Please select a .csv or ' + capture_archive_extension + ' file, or a Live Link Face take (folder or ' + take_archive_extension + ').')
             #Capture file has the right columns
             else:
-                valid_cols, missing_cols = validate_csv(props.capture_file_path, data_file_columns)
+                valid_cols, missing_cols = validate_capture_file(capture_path, data_file_columns)
                 if valid_cols == False:
                     is_valid = False
                     messages.append('- Invalid Capture File format. Missing columns: ' + ', '.join(str(x) for x in missing_cols))
+
+        #In/Out Timecodes valid?
+        for timecode_label, timecode in [('In', props.capture_in_timecode), ('Out', props.capture_out_timecode)]:
+            if timecode.strip() != '':
+                try:
+                    parse_timecode(timecode)
+                except ValueError:
+                    is_valid = False
+                    messages.append('- Invalid ' + timecode_label + ' Timecode. Please use the HH:MM:SS:FF format.')
                 
         #Neutral File doesn't need to be selected
-        if props.neutral_file_path != None and props.neutral_file_path != '':
+        if neutral_path != None and neutral_path != '':
             #Neutral File Exists?
-            if os.path.exists(props.neutral_file_path) == False:
+            if data_file_exists(neutral_path) == False:
                 is_valid = False
-                messages.append("- Selected Neutral File does not exist. Please reselect the Neutral File.")
-            #Neutral File a csv?
+                if is_profile_path(neutral_path):
+                    messages.append("- Selected Neutral Profile not found. Please reselect the Neutral Profile.")
+                else:
+                    messages.append("- Selected Neutral File does not exist. Please reselect the Neutral File.")
+            #Packed Neutral or Neutral Profile (already calculated)
+            elif is_packed_path(neutral_path) or is_profile_path(neutral_path):
+                pass
+            #Neutral File a csv/archive?
             else:
-                filename, extension = os.path.splitext(props.neutral_file_path.lower())
-                if extension != ".csv":
+                filename, extension = os.path.splitext(neutral_path.lower())
+                if extension not in capture_file_extensions:
                     is_valid = False
-                    messages.append('- Incorrect Neutral File type. Please select a .csv file.')
+                    messages.append('- Incorrect Neutral File type. Please select a .csv or ' + capture_archive_extension + ' file, or a Live Link Face take (folder or ' + take_archive_extension + ').')
                 #Neutral file has the right columns
                 else:
-                    valid_cols, missing_cols = validate_csv(props.neutral_file_path, data_file_columns)
+                    valid_cols, missing_cols = validate_capture_file(neutral_path, data_file_columns)
                     if valid_cols == False:
                         is_valid = False
                         messages.append('- Invalid Neutral File format. Missing columns: ' + ', '.join(str(x) for x in missing_cols))
 
         #Mapping File Selected?
-        if props.mapping_file_path == None or props.mapping_file_path == '':
+        if mapping_path == None or mapping_path == '':
             is_valid = False
             messages.append("- Mapping File missing. Please select the Mapping File.")
 
         #Mapping File Exists?
-        elif os.path.exists(props.mapping_file_path) == False:
+        elif data_file_exists(mapping_path) == False:
             is_valid = False
             messages.append("- Selected Mapping File does not exist. Please reselect the Mapping File.")
 
+        #Packed Mapping (already compiled)
+        elif is_packed_path(mapping_path):
+            pass
+
         #Mapping File a csv?
         else:
-            filename, extension = os.path.splitext(props.mapping_file_path.lower())
+            filename, extension = os.path.splitext(mapping_path.lower())
             if extension != ".csv":
                 is_valid = False
                 messages.append('- Incorrect Mapping File type. Please select a .csv file.')
             #Mapping file has the right columns
             else:
-                valid_cols, missing_cols = validate_csv(props.mapping_file_path, mapping_file_cols)
+                valid_cols, missing_cols = validate_csv(mapping_path, mapping_file_cols)
                 if valid_cols == False:
                     is_valid = False
                     messages.append('- Invalid Mapping File format. Missing columns: ' + ', '.join(str(x) for x in missing_cols))
@@ -995,224 +1238,6 @@ class ApplicatorApply(bpy.types.Operator):
         return is_valid, messages
     
     
-    ################################################################    
-    # Apply the blendshape data to the shapekeys
-    ################################################################    
-    def apply_blendshape_data(self, target_bone, blendshape_name, multiplier, value_shift, smooth, capture_frames, face_neutral, apply_capture_frames_to, start_frame, skip_capture_frames, smooth_frames):
-        #make sure the property exists
-        blendShapeLabel = blendShapeLabels[blendshape_name]
-        propertyName = '["' + blendShapeLabel + '"]'
-        try:
-            prop = target_bone[blendShapeLabel] #this will fail if it doesn't exist
-        except:
-            #property doesnt exist, so we skip it
-            prop = None
-                
-        if prop != None:
-            current_frame_no = start_frame
-
-            #determine the number of smoothing shift frames
-            smooth_shift = 0
-            if smooth_frames == 'S3':
-                smooth_shift = 1
-            elif smooth_frames == 'S5':
-                smooth_shift = 2
-            elif smooth_frames == 'S7':
-                smooth_shift = 3
-            elif smooth_frames == 'S9':
-                smooth_shift = 4
-            elif smooth_frames == 'S11':
-                smooth_shift = 5     
-
-            #loop the capture frames and apply the morph strength
-            capture_frames_count = len(capture_frames)
-            if capture_frames_count > skip_capture_frames:
-                for y in range(skip_capture_frames, capture_frames_count):
-                    capture_frame = capture_frames[y]
-
-                    #first test if we are applying this frame??
-                    if apply_capture_frames_to[y] == True:
-                        #get the strength (smooth style)
-                        if smooth.upper() == 'Y':
-                            #smoothing applies a rolling average using the current frame, previous # frames, and next # frames                           
-                            range_count = 0
-                            range_sum = 0.0
-                            for x in range(y - smooth_shift, y + 1 + smooth_shift):
-                                if x >=0 and x < capture_frames_count:
-                                    range_frame = capture_frames[x]
-                                    range_count += 1
-                                    capture_frame = range_frame[blendshape_name]
-                                    if 'E' in capture_frame: #cater for when numbers are super low
-                                        capture_frame_value = 0.0
-                                    else:
-                                        capture_frame_value = float(capture_frame)
-                                    range_sum += capture_frame_value
-                            strength = range_sum / range_count
-                        else:
-                            capture_frame = capture_frames[y]
-                            if 'E' in capture_frame[blendshape_name]: #cater for when numbers are super low
-                                strength = 0.0
-                            else:
-                                strength = float(capture_frame[blendshape_name])
-                        
-                        #make sure the strength is within the range 0-1			
-                        if strength > 1:
-                            strength = 1
-                        elif strength < 0:
-                            strength = 0
-                        
-                        #apply the value shift
-                        strength = strength + value_shift
-                        
-                        #apply the miltiplier
-                        strength = strength * multiplier
-                            
-                        #apply the Neutralizer
-                        #(Actual - Neutral)/(1-Neutral)
-                        strength = (strength - face_neutral[blendshape_name]) / (1 - face_neutral[blendshape_name])
-                        strength = round(strength ,4)
-                
-                        #set the keyframe
-                        target_bone[blendShapeLabel] = strength
-                        target_bone.keyframe_insert(data_path=propertyName, frame = current_frame_no)
-                        
-                        #incrament the frame counter
-                        current_frame_no += 1
-    
-    ################################################################    
-    # get the strength value
-    ################################################################        
-    def get_strength(self, y, capture_frames, capture_frames_count, mapping, smooth_shift):
-        strength = 0.0
-        capture_item_name = mapping['Name']
-        target_axis = mapping['Target']
-        enabled = mapping['Enabled']
-        multiplier = float(mapping['Multiplier'])
-        value_shift = float(mapping['ValueShift'])
-        smooth = mapping['Smooth']
-        
-        if enabled.upper() == 'Y':
-            #get the strength (smooth style)
-            if smooth.upper() == 'Y':
-                #smoothing applies a rolling average using the current frame, previous # frames, and next # frames
-                range_count = 0
-                range_sum = 0.0
-                for x in range(y - smooth_shift, y + 1 + smooth_shift):
-                    if x >=0 and x < capture_frames_count:
-                        range_frame = capture_frames[x]
-                        range_count += 1
-                        capture_frame = range_frame[capture_item_name]
-                        if 'E' in capture_frame: #cater for when numbers are super low
-                            capture_frame_value = 0.0
-                        else:
-                            capture_frame_value = float(capture_frame)
-                        range_sum += capture_frame_value
-                strength = range_sum / range_count
-            else:
-                capture_frame = capture_frames[y]
-                if 'E' in capture_frame[capture_item_name]: #cater for when numbers are super low
-                    strength = 0.0
-                else:
-                    strength = float(capture_frame[capture_item_name])
-            
-            #make sure the strength is within the range 0-1			
-            if strength > 1:
-                strength = 1
-            elif strength < -1:
-                strength = -1
-            
-            #apply the value shift
-            strength = strength + value_shift
-                        
-            #apply the miltiplier
-            strength = strength * multiplier
-        
-        return strength
-                         
-    ################################################################    
-    # get the rotation
-    ################################################################        
-    def get_rotation_quaternion(self, yaw_strength, yaw_mapping, pitch_strength, pitch_mapping, roll_strength, roll_mapping):
-        w = 1.0
-        x = 0.0
-        y = 0.0
-        z = 0.0
-        
-        yaw_enabled = yaw_mapping['Enabled']
-        yaw_target = yaw_mapping['Target']
-        pitch_enabled = pitch_mapping['Enabled']
-        pitch_target = pitch_mapping['Target']
-        roll_enabled = roll_mapping['Enabled']
-        roll_target = roll_mapping['Target']
-        
-        if yaw_enabled.upper() == 'Y' and yaw_target != None:
-            if yaw_target.upper() == 'X':
-                x = yaw_strength
-            elif yaw_target.upper() == 'Y':
-                y = yaw_strength
-            elif yaw_target.upper() == 'Z':
-                z = yaw_strength
-            
-        if pitch_enabled.upper() == 'Y' and pitch_target != None:
-            if pitch_target.upper() == 'X':
-                x = pitch_strength
-            elif pitch_target.upper() == 'Y':
-                y = pitch_strength
-            elif pitch_target.upper() == 'Z':
-                z = pitch_strength
-            
-        if roll_enabled.upper() == 'Y' and roll_target != None:
-            if roll_target.upper() == 'X':
-                x = roll_strength
-            elif roll_target.upper() == 'Y':
-                y = roll_strength
-            elif roll_target.upper() == 'Z':
-                z = roll_strength
-
-        return [w, x, y, z]
-
-    ################################################################    
-    # Apply the item rotations
-    ################################################################    
-    def apply_item_data(self, 
-        target_object, yaw_mapping, pitch_mapping, roll_mapping,
-        capture_frames, apply_capture_frames_to, start_frame, skip_capture_frames, smooth_frames):
-        current_frame_no = start_frame
-
-        #loop the capture frames and apply the morph strength
-        capture_frames_count = len(capture_frames)
-        if capture_frames_count > skip_capture_frames:
-            
-            #determine the number of smoothing shift frames
-            smooth_shift = 0
-            if smooth_frames == 'S3':
-                smooth_shift = 1
-            elif smooth_frames == 'S5':
-                smooth_shift = 2
-            elif smooth_frames == 'S7':
-                smooth_shift = 3
-            elif smooth_frames == 'S9':
-                smooth_shift = 4
-            elif smooth_frames == 'S11':
-                smooth_shift = 5  
-            
-            for y in range(skip_capture_frames, capture_frames_count):
-                capture_frame = capture_frames[y]
-
-                #first test if we are applying this frame??
-                if apply_capture_frames_to[y] == True:
-                    yaw_strength = self.get_strength(y, capture_frames, capture_frames_count, yaw_mapping, smooth_shift)
-                    pitch_strength =  self.get_strength(y, capture_frames, capture_frames_count, pitch_mapping, smooth_shift)
-                    roll_strength = self.get_strength(y, capture_frames, capture_frames_count, roll_mapping, smooth_shift)
-                                            
-                    #set the rotation
-                    rotation_quaternion = self.get_rotation_quaternion(yaw_strength, yaw_mapping, pitch_strength, pitch_mapping, roll_strength, roll_mapping)
-                    target_object.rotation_quaternion = rotation_quaternion
-                    target_object.keyframe_insert(data_path='rotation_quaternion', frame=current_frame_no)
-                    
-                    #incrament the frame counter
-                    current_frame_no += 1
-    
     ################################################################    
     # Apply execution
     ################################################################    
@@ -1220,8 +1245,6 @@ class ApplicatorApply(bpy.types.Operator):
         props = context.scene.ApplicatorProps
         target_rig = context.scene.app_rig_target
         start_frame = props.start_frame
-        skip_capture_frames = props.skip_capture_frames
-        smooth_frames = props.smoothing_frames
         fps = bpy.context.scene.render.fps
         
         #make sure we are in object mode
@@ -1231,96 +1254,749 @@ class ApplicatorApply(bpy.types.Operator):
         #deselect if any selected objects
         bpy.ops.object.select_all(action='DESELECT')
 
+        #a progressive apply still running would overwrite this one
+        cancel_progressive_apply()
+
         #validate the settings
         is_valid, messages = self.ValidateSettings(target_rig, props)            
         
-        if is_valid:
-            #get the capture frames from the file
-            capture_frames = list_csv_data(props.capture_file_path)
-
-            #get face neutral frames
-            face_neutral_frames = None
-            if props.neutral_file_path != None and props.neutral_file_path != '':
-                face_neutral_frames = list_csv_data(props.neutral_file_path)
-            
-            #get the face zero values
-            face_neutral = get_face_neutral_from_frames(data_shapkey_names, face_neutral_frames)
+        if is_valid and props.progressive_apply:
+            #load & key in the background, the coarse pass first
+            try:
+                start_progressive_apply(context.scene, props, target_rig, fps)
+            except ValueError as error:
+                show_message_box(['- ' + str(error)], "Validation error", 'CANCEL')
+        elif is_valid:
+            #process the capture data
+            try:
+                if can_apply_in_parallel(props, fps):
+                    processed = get_processed_capture_in_parallel(props, fps)
+                else:
+                    processed = get_processed_capture(props, fps)
+            except ValueError as error:
+                show_message_box(['- ' + str(error)], "Validation error", 'CANCEL')
+                return {'FINISHED'}
 
-            #get the mapping data
-            mapping_data = list_csv_data(props.mapping_file_path)
+            #the ShapeKey data is keyed on the rig, or baked on the meshes
+            rig_shapekey_data = props.apply_shapekey_data and props.shape_key_output == 'RIG'
 
             #remove existing keyframes
             if props.clear_existing_keyframes == True:
-                remove_keyframes(target_rig, props.apply_shapekey_data, props.apply_rotation_data)
-
-            #see which frames we are apply the capture data to
-            #these are the frames from the file we are to apply to the scene 
-            apply_capture_frames_to = list_apply_capture_frames_to(fps, len(capture_frames))
-
-            #apply ShapeKey data
-            if props.apply_shapekey_data == True:
-                eye_r_bone = target_rig.pose.bones['Eye_R']
-                eye_l_bone = target_rig.pose.bones['Eye_L']
-                brows_bone = target_rig.pose.bones['Brows']
-                nose_bone = target_rig.pose.bones['Nose']
-                mouth_bone = target_rig.pose.bones['Mouth']
-                
-                prop_bones = [eye_r_bone, eye_l_bone, brows_bone, nose_bone, mouth_bone]
-                for prop_bone in prop_bones:
-                    blendshape_mappings = [mapping for mapping in mapping_data if mapping['Type'].upper() == 'BLENDSHAPE' and mapping['Enabled'].upper() == 'Y']
-                    for blendshape_mapping in blendshape_mappings:
-                        self.apply_blendshape_data(
-                            prop_bone,
-                            blendshape_mapping['Name'], 
-                            float(blendshape_mapping['Multiplier']), 
-                            float(blendshape_mapping['ValueShift']), 
-                            blendshape_mapping['Smooth'], 
-                            capture_frames, 
-                            face_neutral, 
-                            apply_capture_frames_to, 
-                            start_frame, 
-                            skip_capture_frames,
-                            smooth_frames)
+                remove_keyframes(target_rig, rig_shapekey_data, props.apply_rotation_data)
+
+            #apply the ShapeKey & rotation data
+            apply_processed_capture(target_rig, processed, start_frame, rig_shapekey_data, props.apply_rotation_data)
+            driven_count = 0
+            if props.apply_shapekey_data and props.shape_key_output == 'BAKE':
+                target_meshes = [context.scene.app_head_mesh_target] + list_extra_meshes(context.scene.app_extra_meshes_target, context.scene.app_head_mesh_target)
+                curve_count, driven_count = bake_processed_capture(target_meshes, processed, get_compiled_mapping(get_data_paths(props)[2]), start_frame, props.clear_existing_keyframes)
+
+            #done
+            messages = ["Processing completed. Face capture data has been applied"]
+            if driven_count > 0:
+                messages.append('- ' + str(driven_count) + ' baked shape keys are also driven (by the face rig), and the drivers override the keys')
+            messages.extend(list_repair_messages(processed['repairs']))
+            show_message_box(messages, "Processing complete", 'INFO')
+        else:
+            #Display the errors
+            show_message_box(messages, "Validation error", 'CANCEL') 
         
-            #apply rotation data
-            if props.apply_rotation_data == True:
-                head_bone = target_rig.pose.bones['Head']
-                eye_l_bone = target_rig.pose.bones['Eye_L']
-                eye_r_bone = target_rig.pose.bones['Eye_R']
-                
-                head_yaw_mappings = [mapping for mapping in mapping_data if mapping['Name'].upper() == 'HEADYAW']
-                head_pitch_mappings = [mapping for mapping in mapping_data if mapping['Name'].upper() == 'HEADPITCH']
-                head_roll_mappings = [mapping for mapping in mapping_data if mapping['Name'].upper() == 'HEADROLL']
-                left_eye_yaw_mappings = [mapping for mapping in mapping_data if mapping['Name'].upper() == 'LEFTEYEYAW']
-                left_eye_pitch_mappings = [mapping for mapping in mapping_data if mapping['Name'].upper() == 'LEFTEYEPITCH']
-                left_eye_roll_mappings = [mapping for mapping in mapping_data if mapping['Name'].upper() == 'LEFTEYEROLL']
-                right_eye_yaw_mappings = [mapping for mapping in mapping_data if mapping['Name'].upper() == 'RIGHTEYEYAW']
-                right_eye_pitch_mappings = [mapping for mapping in mapping_data if mapping['Name'].upper() == 'RIGHTEYEPITCH']
-                right_eye_roll_mappings = [mapping for mapping in mapping_data if mapping['Name'].upper() == 'RIGHTEYEROLL']
-                
-                #Head Logic
-                self.apply_item_data(
-                    head_bone, head_yaw_mappings[0], head_pitch_mappings[0], head_roll_mappings[0],
-                    capture_frames, apply_capture_frames_to, start_frame, skip_capture_frames, smooth_frames)
-
-                #LeftEye Logic
-                self.apply_item_data(
-                    eye_l_bone, left_eye_yaw_mappings[0], left_eye_pitch_mappings[0], left_eye_roll_mappings[0],
-                    capture_frames, apply_capture_frames_to, start_frame, skip_capture_frames, smooth_frames)
-
-                #RightEye Logic
-                self.apply_item_data(
-                    eye_r_bone, right_eye_yaw_mappings[0], right_eye_pitch_mappings[0], right_eye_roll_mappings[0],
-                    capture_frames, apply_capture_frames_to, start_frame, skip_capture_frames, smooth_frames)
-                        
+        return {'FINISHED'}
+
+################################################################    
+# Re-apply a frame range
+# Only the capture rows of the scene frames in the range (plus the
+# smoothing frames either side) are loaded and processed, and only the
+# keys in the range are replaced. Repair Tracking needs the whole take,
+# and the causal filters the rows from the take's start
+################################################################    
+class ApplicatorReapplyRange(bpy.types.Operator):
+    bl_idname = "applicator.reapply_range"
+    bl_label = "Re-apply Frame Range"
+    bl_description = "Re-apply the capture to the frame range only, leaving the keys outside it as they are"
+
+    def execute(self, context):
+        props = context.scene.ApplicatorProps
+        target_rig = context.scene.app_rig_target
+        fps = bpy.context.scene.render.fps
+        
+        #make sure we are in object mode
+        if bpy.context.object != None and bpy.context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        #validate the settings
+        is_valid, messages = ApplicatorApply.ValidateSettings(self, target_rig, props)
+        if props.reapply_frame_end < props.reapply_frame_start:
+            is_valid = False
+            messages.append('- The frame range End is before its Start.')
+        
+        if is_valid:
+            #process the capture rows of the frame range
+            try:
+                processed, window_start_frame = get_processed_frame_window(props, fps, props.reapply_frame_start, props.reapply_frame_end)
+            except ValueError as error:
+                show_message_box(['- ' + str(error)], "Validation error", 'CANCEL')
+                return {'FINISHED'}
+            if processed['frame_count'] == 0:
+                show_message_box(['- The frame range is outside the applied capture.'], "Validation error", 'CANCEL')
+                return {'FINISHED'}
+
+            #splice the ShapeKey & rotation data into the range
+            rig_shapekey_data = props.apply_shapekey_data and props.shape_key_output == 'RIG'
+            apply_processed_capture(target_rig, processed, window_start_frame, rig_shapekey_data, props.apply_rotation_data, props.reapply_blend_frames)
+            driven_count = 0
+            if props.apply_shapekey_data and props.shape_key_output == 'BAKE':
+                target_meshes = [context.scene.app_head_mesh_target] + list_extra_meshes(context.scene.app_extra_meshes_target, context.scene.app_head_mesh_target)
+                curve_count, driven_count = bake_processed_capture(target_meshes, processed, get_compiled_mapping(get_data_paths(props)[2]), window_start_frame, blend_frames=props.reapply_blend_frames)
+
             #done
-            show_message_box(["Processing completed. Face capture data has been applied"], "Processing complete", 'INFO')
+            messages = ['Frames ' + str(window_start_frame) + '-' + str(window_start_frame + processed['frame_count'] - 1) + ' have been re-applied']
+            if driven_count > 0:
+                messages.append('- ' + str(driven_count) + ' baked shape keys are also driven (by the face rig), and the drivers override the keys')
+            messages.extend(list_repair_messages(processed['repairs']))
+            show_message_box(messages, "Processing complete", 'INFO')
         else:
             #Display the errors
             show_message_box(messages, "Validation error", 'CANCEL') 
         
         return {'FINISHED'}
 
+################################################################    
+# Transfer the animation of another face rig to the Target Rig
+# the Target Rig's face rig keys are replaced
+################################################################    
+class ApplicatorTransferAnimation(bpy.types.Operator):
+    bl_idname = "applicator.transfer_animation"
+    bl_label = "Transfer to Target Rig"
+    bl_description = "Transfer the face rig animation of the Source Rig to the Target Rig, remapped through the selected Mapping File"
+
+    def execute(self, context):
+        props = context.scene.ApplicatorProps
+        source_rig = context.scene.app_transfer_source_rig
+        target_rig = context.scene.app_rig_target
+        capture_path, neutral_path, mapping_path = get_data_paths(props)
+
+        #make sure we are in object mode
+        if bpy.context.object != None and bpy.context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        #validate the settings
+        messages = []
+        if target_rig == None or target_rig.type != 'ARMATURE':
+            messages.append('- No Target Rig selected. Please select the face rig to transfer to.')
+        if source_rig == None or source_rig.type != 'ARMATURE':
+            messages.append('- No Source Rig selected. Please select the face rig to transfer from.')
+        elif source_rig == target_rig:
+            messages.append('- The Source Rig is the Target Rig.')
+        elif source_rig.animation_data == None or source_rig.animation_data.action == None:
+            messages.append('- The Source Rig has no animation to transfer.')
+        if mapping_path == None or mapping_path == '' or data_file_exists(mapping_path) == False:
+            messages.append('- Mapping File missing. Please select the Mapping File.')
+        source_mapping_path = props.transfer_source_mapping_path
+        if source_mapping_path != '':
+            if data_file_exists(source_mapping_path) == False:
+                messages.append('- Selected Source Mapping does not exist. Please reselect the Source Mapping.')
+            elif not is_packed_path(source_mapping_path) and os.path.splitext(source_mapping_path.lower())[1] != '.csv':
+                messages.append('- Incorrect Source Mapping type. Please select a .csv file.')
+        if len(messages) > 0:
+            show_message_box(messages, "Validation error", 'CANCEL')
+            return {'FINISHED'}
+
+        try:
+            target_mapping = get_compiled_mapping(mapping_path)
+            source_mapping = get_compiled_mapping(source_mapping_path) if source_mapping_path != '' else None
+            face_neutral = get_selected_face_neutral(props)
+        except ValueError as error:
+            show_message_box(['- ' + str(error)], "Validation error", 'CANCEL')
+            return {'FINISHED'}
+
+        rig_shapekey_data = props.apply_shapekey_data and props.shape_key_output == 'RIG'
+        frame_count, curve_count = transfer_rig_animation(source_rig, target_rig, target_mapping, source_mapping, face_neutral, props.start_frame,
+            props.transfer_speed, props.transfer_strength, props.rotation_output, props.rotation_order, rig_shapekey_data, props.apply_rotation_data)
+
+        #done
+        show_message_box([str(frame_count) + ' frames have been transferred to ' + str(curve_count) + ' F-Curves'], "Processing complete", 'INFO')
+        return {'FINISHED'}
+
+################################################################    
+# Preview
+################################################################    
+class ApplicatorPreview(bpy.types.Operator):
+    bl_idname = "applicator.preview"
+    bl_label = "Preview"
+    bl_description = "Toggle a live preview of the capture data on the Target Rig, without adding keyframes"
+
+    def execute(self, context):
+        #stop the preview if it's running
+        if is_preview_running():
+            stop_preview(context.scene)
+            return {'FINISHED'}
+
+        #validate the settings
+        props = context.scene.ApplicatorProps
+        is_valid, messages = ApplicatorApply.ValidateSettings(self, context.scene.app_rig_target, props)
+
+        if is_valid:
+            start_preview(context.scene)
+        else:
+            #Display the errors
+            show_message_box(messages, "Validation error", 'CANCEL')
+
+        return {'FINISHED'}
+
+################################################################    
+# Playback Benchmark
+################################################################    
+class ApplicatorBenchmark(bpy.types.Operator, ExportHelper):
+    bl_idname = "applicator.benchmark"
+    bl_label = "Save Benchmark Results"
+    bl_description = "Time the playback of synthetic heads driven by the capture, for each output style, and save the results as JSON"
+
+    filename_ext = '.json'
+
+    filter_glob: bpy.props.StringProperty(
+        default='*.json',
+        options={'HIDDEN'}
+    )
+
+    def execute(self, context):
+        source_scene = context.scene
+        props = source_scene.ApplicatorProps
+        fps = source_scene.render.fps
+
+        #validate the settings (the benchmark builds its own rig)
+        is_valid, messages = ApplicatorApply.ValidateSettings(self, None, props)
+        messages = [message for message in messages if 'Target Rig' not in message]
+        is_valid = len(messages) == 0
+        if props.mapping_file_path == '' or not os.path.exists(props.mapping_file_path):
+            is_valid = False
+            messages.append('- The benchmark needs the Mapping File to create the face rigs.')
+        if 'ApplicatorFaceRig' in bpy.data.objects or 'ApplicatorRig' in bpy.data.collections:
+            is_valid = False
+            messages.append('- The benchmark replaces the Applicator face rig. Run it from a new file, or with the headless script.')
+
+        if not is_valid:
+            show_message_box(messages, "Validation error", 'CANCEL')
+            return {'FINISHED'}
+
+        try:
+            processed = get_processed_capture(props, fps)
+        except ValueError as error:
+            show_message_box(['- ' + str(error)], "Validation error", 'CANCEL')
+            return {'FINISHED'}
+
+        #the preview would set the benchmark rigs on frame change
+        if is_preview_running():
+            stop_preview(source_scene)
+
+        #run in a scene of its own
+        benchmark_scene = bpy.data.scenes.new('ApplicatorBenchmark')
+        benchmark_scene.render.fps = fps
+        benchmark_scene.ApplicatorProps.mapping_file_path = props.mapping_file_path
+        context.window.scene = benchmark_scene
+        try:
+            results = run_playback_benchmark(benchmark_scene, processed)
+        finally:
+            context.window.scene = source_scene
+            bpy.data.scenes.remove(benchmark_scene)
+
+        capture_path, neutral_path, mapping_path = get_data_paths(props)
+        write_benchmark_results(self.filepath, results, capture_path, fps)
+
+        messages = []
+        for case in results:
+            messages.append(str(case['vertex_count']) + ' vertices, ' + case['output_style'] + ': ' + str(round(case['playback_fps'], 1)) + ' fps')
+        show_message_box(messages, "Benchmark complete", 'INFO')
+        return {'FINISHED'}
+
+
+#######################################################################
+# Face rig
+# The face rig is an armature with a bone per face area (plus the head
+# and eyes). Each bone holds a custom property per ARKit blendshape,
+# driving the mapped shape key on the head mesh, and the head & eye
+# bones drive the pivots' rotations.
+# The armature is built with the data API; only the new armature goes
+# into edit mode (to add the bones), so the active object, selection
+# and mode are left as they are
+#######################################################################
+face_rig_bone_blendshapes = [
+    ('Eye_L', ['eyeBlinkLeft', 'eyeLookDownLeft', 'eyeLookInLeft', 'eyeLookOutLeft', 'eyeLookUpLeft', 'eyeSquintLeft', 'eyeWideLeft']),
+    ('Eye_R', ['eyeBlinkRight', 'eyeLookDownRight', 'eyeLookInRight', 'eyeLookOutRight', 'eyeLookUpRight', 'eyeSquintRight', 'eyeWideRight']),
+    ('Nose', ['cheekPuff', 'cheekSquintRight', 'cheekSquintLeft', 'noseSneerRight', 'noseSneerLeft']),
+    ('Mouth', ['jawForward', 'jawRight', 'jawLeft', 'jawOpen', 'mouthClose', 'mouthFunnel', 'mouthPucker', 'mouthRollLower', 'mouthRollUpper', 'mouthShrugLower', 'mouthShrugUpper', 'tongueOut',
+        'mouthLeft', 'mouthSmileLeft', 'mouthFrownLeft', 'mouthDimpleLeft', 'mouthStretchLeft', 'mouthPressLeft', 'mouthLowerDownLeft', 'mouthUpperUpLeft',
+        'mouthRight', 'mouthSmileRight', 'mouthFrownRight', 'mouthDimpleRight', 'mouthStretchRight', 'mouthPressRight', 'mouthLowerDownRight', 'mouthUpperUpRight']),
+    ('Brows', ['browDownRight', 'browDownLeft', 'browInnerUp', 'browOuterUpRight', 'browOuterUpLeft'])
+]
+
+#######################################################################
+# Gets the object's collection
+#######################################################################
+def get_collection_for_object(collection, object, type):
+    #search child collections
+    for coll in collection.children:
+        result = get_collection_for_object(coll, object, type)
+        if result != None:
+            return result
+        
+    #check if the object is in the collection
+    for coll_obj in collection.all_objects:
+        if coll_obj.type == type and coll_obj.name == object.name:
+            #found it
+            return collection
+        
+    #didn't find it, return None    
+    return None
+
+#######################################################################
+# Gets the object form the collection
+#######################################################################
+def get_object(collection, name, type):
+    result = None
+    for coll_obj in collection.all_objects:
+        if coll_obj.type == type and coll_obj.name == name:
+            result = coll_obj
+            break
+    return result
+
+#######################################################################
+# Switches the object's mode, leaving the active object & selection alone
+#######################################################################
+def set_object_mode(target_object, mode):
+    override = {
+        'object': target_object,
+        'active_object': target_object,
+        'selected_objects': [target_object],
+        'selected_editable_objects': [target_object],
+        'editable_objects': [target_object]
+    }
+    if hasattr(bpy.context, 'temp_override'):
+        with bpy.context.temp_override(**override):
+            bpy.ops.object.mode_set(mode=mode)
+    else:
+        bpy.ops.object.mode_set(dict(bpy.context.copy(), **override), mode=mode)
+
+#######################################################################
+# Adds the empties used as the bones' custom shapes
+#######################################################################
+def add_empties(rig_collection):
+    
+    #add empty for head
+    headEmpty = get_object(rig_collection, 'ApplicatorHeadEmpty', 'EMPTY')
+    if headEmpty == None: #should't exist
+        headEmpty = bpy.data.objects.new("ApplicatorHeadEmpty", None )
+        headEmpty.empty_display_size = 0.2
+        headEmpty.empty_display_type = 'CUBE'
+        headEmpty.hide_viewport = True
+        rig_collection.objects.link(headEmpty)
+
+    #add empty for eyes
+    eyeEmpty = get_object(rig_collection, 'ApplicatorEyeEmpty', 'EMPTY')
+    if eyeEmpty == None:
+        eyeEmpty = bpy.data.objects.new('ApplicatorEyeEmpty', None )
+        eyeEmpty.empty_display_size = 0.06
+        eyeEmpty.empty_display_type = 'CONE'
+        eyeEmpty.hide_viewport = True
+        rig_collection.objects.link(eyeEmpty)
+
+    #add empty for nose
+    noseEmpty = get_object(rig_collection, 'ApplicatorNoseEmpty', 'EMPTY')
+    if noseEmpty == None: #should't exist
+        noseEmpty = bpy.data.objects.new('ApplicatorNoseEmpty', None )
+        noseEmpty.empty_display_size = 0.03
+        noseEmpty.empty_display_type = 'CUBE'
+        noseEmpty.hide_viewport = True
+        rig_collection.objects.link(noseEmpty)
+
+    #add empty for mouth
+    mouthEmpty = get_object(rig_collection, 'ApplicatorMouthEmpty', 'EMPTY')
+    if mouthEmpty == None: #should't exist
+        mouthEmpty = bpy.data.objects.new('ApplicatorMouthEmpty', None )
+        mouthEmpty.empty_display_size = 0.02
+        mouthEmpty.empty_display_type = 'CUBE'
+        mouthEmpty.hide_viewport = True
+        rig_collection.objects.link(mouthEmpty)
+        
+    #add empty for brows
+    browsEmpty = get_object(rig_collection, 'ApplicatorBrowsEmpty', 'EMPTY')
+    if browsEmpty == None: #should't exist
+        browsEmpty = bpy.data.objects.new('ApplicatorBrowsEmpty', None )
+        browsEmpty.empty_display_size = 0.02
+        browsEmpty.empty_display_type = 'CUBE'
+        browsEmpty.hide_viewport = True
+        rig_collection.objects.link(browsEmpty)
+    
+    return headEmpty, eyeEmpty, noseEmpty, mouthEmpty, browsEmpty
+
+#######################################################################
+# Adds the face rig armature to the rig collection
+#######################################################################
+def add_face_rig(rig_collection, headEmpty, eyeEmpty, noseEmpty, mouthEmpty, browsEmpty, add_targets_bone=False, rig_name='ApplicatorFaceRig'):
+    armature = bpy.data.armatures.new(rig_name)
+    armature_obj = bpy.data.objects.new(rig_name, armature)
+    rig_collection.objects.link(armature_obj)
+
+    #go into edit mode
+    set_object_mode(armature_obj, 'EDIT')
+    edit_bones = armature.edit_bones
+
+    #Add Head Bone
+    head_bone = edit_bones.new('Head')
+    head_bone.head = (0, 0, 0.0)
+    head_bone.tail = (0, 1, 0.0)
+
+    #Add Eye_R Bone
+    eye_r = edit_bones.new('Eye_R')
+    eye_r.head = (-0.1, -0.2, 0.04)
+    eye_r.tail = (-0.1, 0.8, 0.04)
+    eye_r.parent = head_bone
+
+    #Add Eye_L Bone
+    eye_l = edit_bones.new('Eye_L')
+    eye_l.head = (0.1, -0.2, 0.04)
+    eye_l.tail = (0.1, 0.8, 0.04)
+    eye_l.parent = head_bone
+    
+    #Add Brows Bone
+    brows = edit_bones.new('Brows')
+    brows.head = (0.0, -0.2, 0.15)
+    brows.tail = (0.0, 0.8, 0.15)
+    brows.parent = head_bone
+
+    #Add Nose Bone
+    nose = edit_bones.new('Nose')
+    nose.head = (0.0, -0.23, -0.03)
+    nose.tail = (0.0, 0.8, -0.03)
+    nose.parent = head_bone
+
+    #Add Mouth Bone
+    mouth = edit_bones.new('Mouth')
+    mouth.head = (0.0, -0.18, -0.12)
+    mouth.tail = (0.0, 0.8, -0.12)
+    mouth.parent = head_bone
+
+    #Add Targets Bone (holds the matrix mapping targets)
+    if add_targets_bone:
+        targets = edit_bones.new('Targets')
+        targets.head = (0.0, -0.18, -0.2)
+        targets.tail = (0.0, 0.8, -0.2)
+        targets.parent = head_bone
+
+    #go back to object mode
+    set_object_mode(armature_obj, 'OBJECT')
+
+    set_face_rig_shapes(armature_obj, headEmpty, eyeEmpty, noseEmpty, mouthEmpty, browsEmpty)
+
+    #move 1 unit left, 1 unit up
+    armature_obj.location = (1.0, 0.0, 1.0)
+
+    return armature_obj, armature
+
+#######################################################################
+# Assigns the custom shapes to the face rig's pose bones
+#######################################################################
+def set_face_rig_shapes(armature_obj, headEmpty, eyeEmpty, noseEmpty, mouthEmpty, browsEmpty):
+    armature_obj.pose.bones['Head'].custom_shape = headEmpty
+    armature_obj.pose.bones['Eye_R'].custom_shape = eyeEmpty
+    armature_obj.pose.bones['Eye_L'].custom_shape = eyeEmpty
+    armature_obj.pose.bones['Brows'].custom_shape = browsEmpty
+    armature_obj.pose.bones['Brows'].scale[0] = 8
+    armature_obj.pose.bones['Nose'].custom_shape = noseEmpty
+    armature_obj.pose.bones['Mouth'].custom_shape = mouthEmpty
+    armature_obj.pose.bones['Mouth'].scale[0] = 8
+    if 'Targets' in armature_obj.pose.bones:
+        armature_obj.pose.bones['Targets'].custom_shape = mouthEmpty
+        armature_obj.pose.bones['Targets'].scale[0] = 4
+
+#######################################################################
+# Add Custom Properties to the target bone, and sets them as drivers to the shape key
+# Returns the number of drivers added
+#######################################################################
+def add_shape_key_drivers(armature_obj, target_mesh, bone_name, properties):
+    add_bone_properties(armature_obj, bone_name, properties)
+    return add_property_drivers(armature_obj, target_mesh, bone_name, properties)
+
+#######################################################################
+# Sets the bone's custom properties as drivers to the target mesh's shape keys
+# Returns the number of drivers added
+#######################################################################
+def add_property_drivers(armature_obj, target_mesh, bone_name, properties):
+    driver_count = 0
+    for property in properties:
+        name = property[0]
+        shape_key_name = property[4]
+
+       #only add driver if it has a shapekey to drive
+        if shape_key_name != None:
+            shape_key = target_mesh.shape_keys.key_blocks[shape_key_name]
+            shape_key.driver_remove('value') #removed if exists. no error otherwise
+            driver = shape_key.driver_add('value').driver
+            driver.type ='AVERAGE'
+            driver_var = driver.variables.new()
+            driver_var.type = 'SINGLE_PROP'
+            driver_var.targets[0].id = armature_obj
+            driver_var.targets[0].data_path = 'pose.bones["' + bone_name + '"]["' + name + '"]'
+            driver_count += 1
+    return driver_count
+
+#######################################################################
+# Add the custom properties (that have a shape key to drive) to the bone
+#######################################################################
+def add_bone_properties(armature_obj, bone_name, properties):
+    rna_ui = {}
+    for property in properties:
+        name = property[0]
+        min = property[1]
+        max = property[2]
+        value = property[3]
+        shape_key_name = property[4]
+        
+        #only add custom property if it has a shapekey to drive
+        if shape_key_name != None:
+            #add the property        
+            armature_obj.pose.bones[bone_name][name] = value
+            
+            #set the config the dictionary
+            rna_ui[name] = {"min":min, "max":max}
+
+    #set the property config
+    if not armature_obj.pose.bones[bone_name].get('_RNA_UI'):
+        armature_obj.pose.bones[bone_name]['_RNA_UI'] = {}
+    armature_obj.pose.bones[bone_name]['_RNA_UI'] = rna_ui
+
+#######################################################################
+# Adds the rotation drivers to the head and eyes  
+# The drivers read the bone's rotation as euler angles in the pivot's
+# rotation order, so they work for quaternion and euler keys
+#######################################################################
+def add_rotation_drivers(armature_obj, target_pivot, bone_name):
+    if target_pivot != None:
+        rotation_mode = target_pivot.rotation_mode
+        if rotation_mode not in ('XYZ', 'XZY', 'YXZ', 'YZX', 'ZXY', 'ZYX'):
+            rotation_mode = 'XYZ'
+
+        target_pivot.driver_remove('rotation_euler')
+        driver_x = target_pivot.driver_add('rotation_euler', 0).driver
+        driver_y = target_pivot.driver_add('rotation_euler', 1).driver
+        driver_z = target_pivot.driver_add('rotation_euler', 2).driver
+
+        driver_x.type ='AVERAGE'
+        driver_y.type ='AVERAGE'
+        driver_z.type ='AVERAGE'
+        
+        driver_var_x = driver_x.variables.new()
+        driver_var_y = driver_y.variables.new()
+        driver_var_z = driver_z.variables.new()
+
+        driver_var_x.type = 'TRANSFORMS'
+        driver_var_y.type = 'TRANSFORMS'
+        driver_var_z.type = 'TRANSFORMS'
+        
+        for driver_var, transform_type in [(driver_var_x, 'ROT_X'), (driver_var_y, 'ROT_Y'), (driver_var_z, 'ROT_Z')]:
+            driver_var.targets[0].id = armature_obj
+            driver_var.targets[0].bone_target = bone_name
+            driver_var.targets[0].transform_type = transform_type
+            driver_var.targets[0].transform_space = 'LOCAL_SPACE'
+            driver_var.targets[0].rotation_mode = rotation_mode
+    
+def get_target_shape_key(target_mesh, mapping_data, blend_shape_name):
+    result = None
+    target_shape_key = None
+    
+    #get the target shape key name of the mapping
+    mapping_lines = [mapping for mapping in mapping_data if mapping['Type'] == 'BlendShape' and mapping['Name'] == blend_shape_name]
+    if len(mapping_lines) > 0:
+        target_shape_key = mapping_lines[0]['Target']
+
+    #make sure the mapped shapekey exists in the target mesh
+    if target_shape_key != None and target_shape_key.strip() != '':
+        if target_shape_key in target_mesh.shape_keys.key_blocks:
+            result = target_shape_key
+    
+    return result
+
+#######################################################################
+# Wires the rig's properties to the matching shape keys of an extra mesh
+# (eyelashes, brows, teeth...), the properties having been added for the
+# head mesh. Returns the number of drivers added
+#######################################################################
+def add_extra_mesh_drivers(armature_obj, target_mesh, bone_properties):
+    driver_count = 0
+    for bone_name, properties in bone_properties:
+        matching_properties = [property for property in properties if property[4] != None and property[4] in target_mesh.shape_keys.key_blocks]
+        driver_count += add_property_drivers(armature_obj, target_mesh, bone_name, matching_properties)
+    return driver_count
+
+#######################################################################
+# Gets the meshes with shape keys in the extra meshes collection (once
+# each, leaving out the head mesh)
+#######################################################################
+def list_extra_meshes(collection, head_mesh):
+    extra_meshes = []
+    if collection != None:
+        for coll_obj in collection.all_objects:
+            if coll_obj.type == 'MESH' and coll_obj.data.shape_keys != None and coll_obj.data != head_mesh and coll_obj.data not in extra_meshes:
+                extra_meshes.append(coll_obj.data)
+    return extra_meshes
+
+#######################################################################
+# Gets the custom properties of each face rig bone:
+# [name, min, max, value, shape key (None when not mapped)]
+#######################################################################
+def list_face_rig_properties(head_mesh, mapping_data, matrix_targets):
+    bone_properties = []
+    for bone_name, blendshape_names in face_rig_bone_blendshapes:
+        properties = []
+        for blendshape_name in blendshape_names:
+            properties.append([blendShapeLabels[blendshape_name], 0.0, 1.0, 0.0, get_target_shape_key(head_mesh, mapping_data, blendshape_name)])
+        bone_properties.append((bone_name, properties))
+
+    #the matrix mapping targets (these take over any shape key also driven above)
+    if len(matrix_targets) > 0:
+        properties = []
+        for target_name in matrix_targets:
+            shape_key_name = target_name if target_name in head_mesh.shape_keys.key_blocks else None
+            properties.append([target_name, 0.0, 1.0, 0.0, shape_key_name])
+        bone_properties.append(('Targets', properties))
+    return bone_properties
+
+#######################################################################
+# Copies the shape key drivers of a template rig's mesh to another mesh
+# (with the same shape keys), pointing them at the given rig
+# Returns the number of drivers added
+#######################################################################
+def copy_shape_key_drivers(template_key, target_key, armature_obj, bone_properties):
+    #the driver of each driven shape key (the later bones take over)
+    data_paths = {}
+    for bone_name, properties in bone_properties:
+        for property in properties:
+            if property[4] != None:
+                data_paths['key_blocks["' + property[4] + '"].value'] = property[4]
+
+    if target_key.animation_data == None:
+        target_key.animation_data_create()
+    drivers = target_key.animation_data.drivers
+    for data_path, shape_key_name in data_paths.items():
+        target_key.key_blocks[shape_key_name].driver_remove('value')
+        driver = drivers.from_existing(src_driver=template_key.animation_data.drivers.find(data_path)).driver
+        driver.variables[0].targets[0].id = armature_obj
+    return len(data_paths)
+
+#######################################################################
+# Creates a face rig for each character of a crowd
+# The characters are dictionaries: {'head_object' (the head mesh's
+# object), and optionally 'name', 'head_pivot', 'eye_l_pivot',
+# 'eye_r_pivot', 'extra_meshes'}. The rigs go into one new ApplicatorRigs collection
+# and share a single set of custom shape empties. The first rig is built in edit mode; the others get a copy
+# of its armature and a copy of its drivers (per distinct set of shape
+# keys), so the cost per character is small and constant.
+# Characters sharing a mesh datablock share its shape keys, so they
+# follow the first character's rig, unless make_single_user is set
+# (the mesh is then copied for each of them).
+# Returns {'rigs', 'collection', 'property_count', 'driver_count', 'timings', 'warnings'}
+#######################################################################
+def create_face_rigs(characters, mapping_path=None, mapping_data=None, collection=None, make_single_user=False):
+    start_time = time.perf_counter()
+    timings = {}
+    warnings = []
+
+    for character in characters:
+        head_object = character.get('head_object')
+        if head_object == None or head_object.type != 'MESH' or head_object.data.shape_keys == None:
+            raise ValueError('The head mesh ' + ('' if head_object == None else head_object.name + ' ') + 'has no shape keys. Data is applied to Shape Keys.')
+    if bpy.context.mode != 'OBJECT':
+        raise ValueError('Face rigs can only be created in Object Mode.')
+    if mapping_data == None:
+        if mapping_path == None or mapping_path == '':
+            raise ValueError('A Mapping File (or mapping data) is needed to create the face rigs.')
+        mapping_data = list_csv_data(mapping_path)
+    matrix_targets = compile_mapping_data(mapping_data)['matrix']['targets']
+
+    rigs = []
+    if len(characters) == 0:
+        return {'rigs': rigs, 'collection': None, 'property_count': 0, 'driver_count': 0, 'timings': timings, 'warnings': warnings}
+
+    #the rigs collection, with the shared custom shape empties
+    if collection == None:
+        collection = bpy.context.scene.collection
+    rigs_collection = bpy.data.collections.new('ApplicatorRigs')
+    collection.children.link(rigs_collection)
+    empties = add_empties(rigs_collection)
+
+    #the first rig's armature is the template of the others
+    for index, character in enumerate(characters):
+        head_object = character['head_object']
+        rig_name = character.get('name') or 'ApplicatorFaceRig_' + head_object.name
+        if index == 0:
+            armature_obj, template_armature = add_face_rig(rigs_collection, *empties, len(matrix_targets) > 0, rig_name)
+        else:
+            armature_obj = bpy.data.objects.new(rig_name, template_armature.copy())
+            armature_obj.data.name = rig_name
+            rigs_collection.objects.link(armature_obj)
+
+        #beside the head, 1 unit left & 1 unit up
+        head_location = head_object.matrix_world.translation
+        armature_obj.location = (head_location[0] + 1.0, head_location[1], head_location[2] + 1.0)
+        rigs.append(armature_obj)
+
+    #build the poses of the copies
+    bpy.context.view_layer.update()
+    for armature_obj in rigs[1:]:
+        set_face_rig_shapes(armature_obj, *empties)
+    timings['rigs'] = (time.perf_counter() - start_time) * 1000
+
+    #add the propertes and drivers
+    drivers_start_time = time.perf_counter()
+    property_count = 0
+    driver_count = 0
+    bone_properties_cache = {} #shape key names: bone properties
+    driver_templates = {} #shape key names: the key the drivers were first added to
+    driven_keys = {} #key name: the character driving it
+    for character, armature_obj in zip(characters, rigs):
+        head_object = character['head_object']
+        shape_keys = head_object.data.shape_keys
+        if shape_keys.name in driven_keys:
+            if make_single_user:
+                head_object.data = head_object.data.copy()
+                shape_keys = head_object.data.shape_keys
+            else:
+                warnings.append('- ' + head_object.name + ' shares its mesh with ' + driven_keys[shape_keys.name] + ', so it follows that rig.')
+                shape_keys = None
+
+        shape_key_names = tuple(shape_key.name for shape_key in head_object.data.shape_keys.key_blocks)
+        if shape_key_names not in bone_properties_cache:
+            bone_properties_cache[shape_key_names] = list_face_rig_properties(head_object.data, mapping_data, matrix_targets)
+        bone_properties = bone_properties_cache[shape_key_names]
+
+        if shape_keys == None:
+            for bone_name, properties in bone_properties:
+                add_bone_properties(armature_obj, bone_name, properties)
+        elif shape_key_names in driver_templates:
+            for bone_name, properties in bone_properties:
+                add_bone_properties(armature_obj, bone_name, properties)
+            driver_count += copy_shape_key_drivers(driver_templates[shape_key_names], shape_keys, armature_obj, bone_properties)
+        else:
+            for bone_name, properties in bone_properties:
+                driver_count += add_shape_key_drivers(armature_obj, head_object.data, bone_name, properties)
+            driver_templates[shape_key_names] = shape_keys
+        if shape_keys != None:
+            driven_keys[shape_keys.name] = head_object.name
+        property_count += sum(len([property for property in properties if property[4] != None]) for bone_name, properties in bone_properties)
+
+        for extra_mesh in character.get('extra_meshes', []):
+            driver_count += add_extra_mesh_drivers(armature_obj, extra_mesh, bone_properties)
+
+        #add the rotation drivers
+        add_rotation_drivers(armature_obj, character.get('head_pivot'), 'Head')
+        add_rotation_drivers(armature_obj, character.get('eye_l_pivot'), 'Eye_L')
+        add_rotation_drivers(armature_obj, character.get('eye_r_pivot'), 'Eye_R')
+    timings['drivers'] = (time.perf_counter() - drivers_start_time) * 1000
+    timings['total'] = (time.perf_counter() - start_time) * 1000
+
+    return {
+        'rigs': rigs, 'collection': rigs_collection, 'property_count': property_count, 'driver_count': driver_count,
+        'timings': timings, 'warnings': warnings}
 
 ################################################################    
 # Message Boxes
@@ -1330,6 +2006,11 @@ def show_message_box(messages = [], title = "Message Box", icon = 'INFO'):
         for message in messages:
             self.layout.label(text=message)
 
+    #no UI to show the message in when running in the background
+    if bpy.app.background:
+        print(title + ': ' + ' '.join(messages))
+        return
+
     bpy.context.window_manager.popup_menu(draw, title = title, icon = icon)
 
 ################################################################    
@@ -1352,6 +2033,24 @@ def validate_csv(csv_path, expected_columns):
 
     return result, missing_columns
 
+#######################################################################
+# Validate capture columns
+# Same as validate_csv, but also reads the columns of capture archives
+#######################################################################
+def validate_capture_file(capture_path, expected_columns):
+    if not is_capture_archive(capture_path) and not is_take_archive(capture_path):
+        return validate_csv(capture_path, expected_columns)
+
+    try:
+        if is_take_archive(capture_path):
+            columns = read_take_archive_columns(capture_path)
+        else:
+            columns = read_capture_archive_header(capture_path)['columns']
+    except (OSError, ValueError, zipfile.BadZipFile):
+        columns = []
+    missing_columns = [expected_column for expected_column in expected_columns if expected_column not in columns]
+    return len(missing_columns) == 0, missing_columns
+
 #######################################################################
 # Gets the data as list of dictionary items
 #######################################################################
@@ -1363,118 +2062,45 @@ def list_csv_data(capture_path):
             result.append(row)
     return result
 
-#######################################################################
-# Gets the used frame range
-# Frame range can be larger than the scene's range (typical for mocap data)
-# So we check what has been used
-#######################################################################
-def used_frame_range():
-    frame_range_start = 0
-    frame_range_end = 0
-    for action in bpy.data.actions:
-        if action.frame_range[0] < frame_range_start:
-            frame_range_start = action.frame_range[0]
-        
-        if action.frame_range[1] > frame_range_end:
-            frame_range_end = action.frame_range[1]
-            
-    return frame_range_start, frame_range_end
-
-#######################################################################
-# Delete the keyframes on the object
-#######################################################################
-def remove_keyframes_for_object(object, frame_range_start, frame_range_end, data_path):
-    for frame in range(int(frame_range_start), int(frame_range_end) + 1):    
-        try:
-            object.keyframe_delete(data_path=data_path, frame=frame)
-        except RuntimeError:
-            #No Data.
-            break
-
 #######################################################################
 # Removes the keyframes from the target rig
+# The face rig's F-Curves are removed whole (rather than deleting their
+# keys frame by frame), so the new take is written to new F-Curves in one
+# go and no keys are left past its end
 #######################################################################
 def remove_keyframes(target_rig, remove_property_keyframes, remove_transform_keyframes):
-    frame_range_start, frame_range_end = used_frame_range()
-    if frame_range_start != 0 or frame_range_end != 0:
-        head_bone = target_rig.pose.bones['Head']
-        eye_l_bone = target_rig.pose.bones['Eye_L']
-        eye_r_bone = target_rig.pose.bones['Eye_R']
-
-        if remove_property_keyframes:
-            #head - custom properties
-            for blendShapeLabel in blendShapeLabels.values():
-                try:
-                    prop = head_bone[blendShapeLabel] #this will fail if it doesn't exist
-                    remove_keyframes_for_object(head_bone, frame_range_start, frame_range_end, '["' + blendShapeLabel + '"]')
-                    head_bone[blendShapeLabel] = 0.0
-                except:
-                    #property doesnt exist, sowe skip it
-                    prop = None
-        
-        if remove_transform_keyframes:
-            #left eye - rotation_quaternion
-            remove_keyframes_for_object(eye_l_bone, frame_range_start, frame_range_end, 'rotation_quaternion')
-            eye_l_bone.rotation_quaternion[0] = 1.0 #w
-            eye_l_bone.rotation_quaternion[1] = 0.0 #x
-            eye_l_bone.rotation_quaternion[2] = 0.0 #y
-            eye_l_bone.rotation_quaternion[3] = 0.0 #z
-
-            #left eye - location
-            remove_keyframes_for_object(eye_l_bone, frame_range_start, frame_range_end, 'location')
-            eye_l_bone.location[0] = 0.0 #x
-            eye_l_bone.location[1] = 0.0 #y
-            eye_l_bone.location[2] = 0.0 #z
-
-            #left eye - location
-            remove_keyframes_for_object(eye_l_bone, frame_range_start, frame_range_end, 'scale')
-            eye_l_bone.scale[0] = 1.0 #x
-            eye_l_bone.scale[1] = 1.0 #y
-            eye_l_bone.scale[2] = 1.0 #z
-
-            #right eye - rotation_quaternion
-            remove_keyframes_for_object(eye_r_bone, frame_range_start, frame_range_end, 'rotation_quaternion')
-            eye_r_bone.rotation_quaternion[1] = 0.0 #x
-            eye_r_bone.rotation_quaternion[2] = 0.0 #y
-            eye_r_bone.rotation_quaternion[3] = 0.0 #z
-            
-            #right eye - location
-            remove_keyframes_for_object(eye_r_bone, frame_range_start, frame_range_end, 'location')
-            eye_r_bone.location[0] = 0.0 #x
-            eye_r_bone.location[1] = 0.0 #y
-            eye_r_bone.location[2] = 0.0 #z
-
-            #right eye - location
-            remove_keyframes_for_object(eye_r_bone, frame_range_start, frame_range_end, 'scale')
-            eye_r_bone.scale[0] = 1.0 #x
-            eye_r_bone.scale[1] = 1.0 #y
-            eye_r_bone.scale[2] = 1.0 #z
-            
-            #head - rotation_quaternion
-            remove_keyframes_for_object(head_bone, frame_range_start, frame_range_end, 'rotation_quaternion')
-            head_bone.rotation_quaternion[1] = 0.0 #x
-            head_bone.rotation_quaternion[2] = 0.0 #y
-            head_bone.rotation_quaternion[3] = 0.0 #z
-            
-            #head - location
-            remove_keyframes_for_object(head_bone, frame_range_start, frame_range_end, 'location')
-            head_bone.location[0] = 0.0 #x
-            head_bone.location[1] = 0.0 #y
-            head_bone.location[2] = 0.0 #z
+    remove_face_rig_fcurves(target_rig, remove_property_keyframes, remove_transform_keyframes)
+    pose_bones = target_rig.pose.bones
 
-            #head - location
-            remove_keyframes_for_object(head_bone, frame_range_start, frame_range_end, 'scale')
-            head_bone.scale[0] = 1.0 #x
-            head_bone.scale[1] = 1.0 #y
-            head_bone.scale[2] = 1.0 #z
+    if remove_property_keyframes:
+        #face rig bones & matrix mapping targets - custom properties
+        for bone_name in [bone_name for bone_name, blendshape_names in face_rig_bone_blendshapes] + ['Targets']:
+            if bone_name in pose_bones:
+                prop_bone = pose_bones[bone_name]
+                for property_name in [key for key in prop_bone.keys() if key != '_RNA_UI']:
+                    prop_bone[property_name] = 0.0
 
+    if remove_transform_keyframes:
+        #head & eyes - the location & scale keys go too
+        transform_paths = ['pose.bones["' + bone_name + '"].' + transform for bone_name, item_prefix in rotation_bone_items for transform in ('location', 'scale')]
+        if target_rig.animation_data != None and target_rig.animation_data.action != None:
+            fcurves = target_rig.animation_data.action.fcurves
+            for fcurve in [fcurve for fcurve in fcurves if fcurve.data_path in transform_paths]:
+                fcurves.remove(fcurve)
+
+        for bone_name, item_prefix in rotation_bone_items:
+            if bone_name in pose_bones:
+                pose_bone = pose_bones[bone_name]
+                pose_bone.rotation_quaternion = (1.0, 0.0, 0.0, 0.0)
+                pose_bone.rotation_euler = (0.0, 0.0, 0.0)
+                pose_bone.location = (0.0, 0.0, 0.0)
+                pose_bone.scale = (1.0, 1.0, 1.0)
 
 #######################################################################
 # Determines which capture frames are applied to scene based on the scenes frame rate
-# This function return a list of booleans representing which capture frames to apply
+# This function returns the repeating pattern of booleans representing which capture frames to apply
 #######################################################################
-def list_apply_capture_frames_to(fps, capture_frame_count):
-    result = []
+def get_apply_pattern(fps):
     apply_pattern = []
 
     #set the apply pattern
@@ -1497,98 +2123,3710 @@ def list_apply_capture_frames_to(fps, capture_frame_count):
         #Y|Y|Y|...
         apply_pattern = [True]
 
-    #string together to make the apply_capture_frames list to cover the length of the capture frames
-    while len(result) <= capture_frame_count:
-        result.extend(apply_pattern)
-    
-    #return the results
-    return result
+    return apply_pattern
 
 #######################################################################
-# gets the face zero data 
-# ARKit picks up the captured face's neautral weights differently
-# so this is used to offset thoes charcteristics and give a more natral result
-# the zero value is calulated by vareraging the middle thrid of frame values
-# if no zero face frames are provide, then it will default to 0
+# Capture data cache
+# Parsed files are kept in a small LRU (most recently used last) so
+# switching between takes, or previewing the same take again, skips the parse.
+# Entries are keyed on the file's path, modified time and size, so an edited
+# file is always re-read (packed data is keyed on its content hash)
+# The cache is shared with the prefetch thread: a file being loaded by one
+# thread is waited for by the others, rather than loaded twice
 #######################################################################
-def get_face_neutral_from_frames(shapekey_names, face_neutral_frames):
-    result = { shapekey_name : 0.0 for shapekey_name in shapekey_names }
-    shapekey_tally = { shapekey_name : 0.0 for shapekey_name in shapekey_names }
-    
-    #calculate if we have data
-    if face_neutral_frames != None:		
-        #get the middle third
-        frame_count = len(face_neutral_frames)
-        frame_start = int(frame_count / 3)
-        frame_end = int(frame_start) * 2		
-        
-        #tally up the rows
-        for x in range(frame_start, frame_end):
-            face_neutral_frame = face_neutral_frames[x]
-            for shapekey_name in shapekey_names:
-                #cater for very low numbers
-                shapekey_value_str = face_neutral_frame[shapekey_name]
-                if 'E' in shapekey_value_str:
-                    shapekey_value = 0.0
-                else:
-                    shapekey_value = float(shapekey_value_str)
+file_data_cache_size = 8
+file_data_cache = collections.OrderedDict()
+file_data_cache_lock = threading.RLock()
+file_data_loading = {} #key: the event set once the loading thread is done
 
-                if shapekey_value > 1:
-                    shapekey_value = 1
-                elif shapekey_value < 0:
-                    shapekey_value = 0	
+def get_file_key(file_path):
+    #packed data is named after its content hash, so it never changes
+    if is_packed_path(file_path):
+        return (file_path,)
+    #profiles can be saved again under the same name
+    if is_profile_path(file_path):
+        return (file_path, get_profile_text(get_profile_name(file_path)).as_string())
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
 
-                shapekey_tally[shapekey_name] += shapekey_value
-        
-        #divde by number of frames in the range (i.e. frame_start)
-        for shapekey_name in shapekey_names:
-            result[shapekey_name] = round(shapekey_tally[shapekey_name] / frame_start, 10)
-        
+def get_cached_file_data(file_path, loader, *args):
+    key = (loader.__name__,) + get_file_key(file_path) + args
+    with file_data_cache_lock:
+        if key in file_data_cache:
+            file_data_cache.move_to_end(key)
+            return file_data_cache[key]
+        loading = file_data_loading.get(key)
+        if loading == None:
+            file_data_loading[key] = threading.Event()
+
+    #wait for the other thread's load (and load it here if that failed)
+    if loading != None:
+        loading.wait()
+        return get_cached_file_data(file_path, loader, *args)
+
+    try:
+        result = loader(file_path, *args)
+        with file_data_cache_lock:
+            file_data_cache[key] = result
+            while len(file_data_cache) > file_data_cache_size:
+                file_data_cache.popitem(last=False)
+    finally:
+        with file_data_cache_lock:
+            file_data_loading.pop(key).set()
     return result
-    
-################################################################    
-# Registration
-################################################################    
-def register():
-    bpy.utils.register_class(ApplicatorProps)
-    bpy.utils.register_class(ApplicatorTargetPanel)
-    bpy.utils.register_class(ApplicatorDataPanel)
-    #bpy.utils.register_class(ApplicatorMappingPanel)
-    bpy.utils.register_class(ApplicatorApplyPanel)
-    
-    bpy.utils.register_class(ApplicatorCreateFaceRig)
-    bpy.utils.register_class(ApplicatorSelectCaptureFile)
-    bpy.utils.register_class(ApplicatorClearCaptureFile)
-    
-    bpy.utils.register_class(ApplicatorSelectNeutralFile)
-    bpy.utils.register_class(ApplicatorClearNeutralFile)
-    
-    bpy.utils.register_class(ApplicatorSelectMappingFile)
-    bpy.utils.register_class(ApplicatorClearMappingFile)
-    
-    bpy.utils.register_class(ApplicatorApply)
-    
-    # Register the Props
-    bpy.types.Scene.ApplicatorProps = bpy.props.PointerProperty(type=ApplicatorProps)
- 
-def unregister():
-    bpy.utils.unregister_class(ApplicatorProps)
-    bpy.utils.unregister_class(ApplicatorTargetPanel)
-    bpy.utils.unregister_class(ApplicatorDataPanel)
-    #bpy.utils.unregister_class(ApplicatorMappingPanel)
-    bpy.utils.unregister_class(ApplicatorApplyPanel)
- 
-    bpy.utils.unregister_class(ApplicatorCreateFaceRig)
-    bpy.utils.unregister_class(ApplicatorSelectCaptureFile)
-    bpy.utils.unregister_class(ApplicatorClearCaptureFile)
-    
-    bpy.utils.unregister_class(ApplicatorSelectNeutralFile)
-    bpy.utils.unregister_class(ApplicatorClearNeutralFile)
-    
-    bpy.utils.unregister_class(ApplicatorSelectMappingFile)
-    bpy.utils.unregister_class(ApplicatorClearMappingFile)
-    
-    bpy.utils.unregister_class(ApplicatorApply)
+
+#the file's data if it's already in the cache (None otherwise), without loading it
+#(waiting for another thread's load of it, when wait_for_loading is set)
+def find_cached_file_data(file_path, loader, *args, wait_for_loading=False):
+    try:
+        key = (loader.__name__,) + get_file_key(file_path) + args
+    except OSError:
+        return None
+    with file_data_cache_lock:
+        loading = file_data_loading.get(key)
+        if loading == None or not wait_for_loading:
+            return file_data_cache.get(key)
+    loading.wait()
+    with file_data_cache_lock:
+        return file_data_cache.get(key)
+
+#######################################################################
+# Prefetch
+# Selecting a capture, neutral or mapping file starts loading it on a
+# background thread: the capture is indexed, validated and parsed (and
+# its neutral detected when Detect Neutral is on), the neutral file's
+# values calculated and the mapping compiled, into the data cache, so
+# Apply finds them ready. The Data panel shows each file's status.
+# Selecting another file (or clearing it) makes the running load stale:
+# it stops at its next step and its status is dropped. Only files on
+# disk are prefetched (packed data & profiles are already calculated)
+#######################################################################
+prefetch_state = {'generations': {'capture': 0, 'neutral': 0, 'mapping': 0}, 'status': {}}
+
+def is_prefetch_stale(kind, generation):
+    return prefetch_state['generations'][kind] != generation
+
+def cancel_prefetch(kind):
+    prefetch_state['generations'][kind] += 1
+    prefetch_state['status'].pop(kind, None)
+
+def start_prefetch(kind, file_path, detect_neutral_frames=None):
+    cancel_prefetch(kind)
+    if file_path == None or file_path == '' or is_packed_path(file_path) or is_profile_path(file_path) or not os.path.isfile(get_resolved_take_path(file_path)):
+        return
+    generation = prefetch_state['generations'][kind]
+    prefetch_state['status'][kind] = {'path': file_path, 'state': 'LOADING', 'message': 'Loading...'}
+    thread = threading.Thread(target=run_prefetch, args=(kind, generation, file_path, detect_neutral_frames), daemon=True)
+    thread.start()
+    if not bpy.app.timers.is_registered(redraw_prefetch_status):
+        bpy.app.timers.register(redraw_prefetch_status, first_interval=0.2)
+
+def run_prefetch(kind, generation, status_path, detect_neutral_frames):
+    file_path = get_resolved_take_path(status_path)
+    try:
+        message = 'Ready'
+        if kind == 'mapping':
+            valid_cols, missing_cols = validate_csv(file_path, ['Type', 'Name', 'Target', 'Enabled', 'Multiplier', 'ValueShift', 'Smooth'])
+            if valid_cols == False:
+                raise ValueError('Missing columns: ' + ', '.join(missing_cols))
+            message = 'Ready: ' + str(len(get_compiled_mapping(file_path)['blendshapes'])) + ' blendshapes'
+        else:
+            valid_cols, missing_cols = validate_capture_file(file_path, data_shapkey_names + data_item_names)
+            if valid_cols == False:
+                raise ValueError('Missing columns: ' + ', '.join(missing_cols[:3]) + (', ...' if len(missing_cols) > 3 else ''))
+            if kind == 'neutral':
+                get_face_neutral(file_path)
+            else:
+                if not is_prefetch_stale(kind, generation):
+                    get_capture_index(file_path)
+                if not is_prefetch_stale(kind, generation):
+                    capture = get_capture_arrays(file_path)
+                    message = 'Ready: ' + format_capture_stats(get_capture_stats(capture))
+                if detect_neutral_frames != None and not is_prefetch_stale(kind, generation):
+                    get_detected_face_neutral(file_path, detect_neutral_frames)
+        status = {'path': status_path, 'state': 'READY', 'message': message}
+    except Exception as error:
+        status = {'path': status_path, 'state': 'ERROR', 'message': 'Error: ' + str(error)}
+
+    if not is_prefetch_stale(kind, generation):
+        prefetch_state['status'][kind] = status
+
+#redraws the panels while files are loading
+def redraw_prefetch_status():
+    redraw_view3d_areas()
+    if any(status['state'] == 'LOADING' for status in prefetch_state['status'].values()):
+        return 0.2
+    return None
+
+def redraw_view3d_areas():
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+
+def get_prefetch_status_text(kind, file_path):
+    status = prefetch_state['status'].get(kind)
+    if status == None or status['path'] != file_path:
+        return None
+    return status['message']
+
+#######################################################################
+# Gets the duration, frame count and dropped frames of a loaded capture
+# The timecodes' frame rate is taken as the highest frame number + 1
+#######################################################################
+def get_capture_stats(capture):
+    stats = {'frame_count': capture['frame_count'], 'duration': 0.0, 'dropped_frames': 0}
+    timecode_keys = parse_timecode_keys(capture['timecodes'])
+    timecode_keys = timecode_keys[~np.isnan(timecode_keys)]
+    if len(timecode_keys) > 1:
+        seconds = np.floor(timecode_keys / 1000)
+        frame_numbers = np.floor(timecode_keys - seconds * 1000)
+        timecode_fps = int(frame_numbers.max()) + 1
+        absolute_frames = seconds * timecode_fps + frame_numbers
+        frame_steps = np.diff(absolute_frames)
+        stats['dropped_frames'] = int(np.maximum(frame_steps[frame_steps > 0] - 1, 0).sum())
+        stats['duration'] = float(absolute_frames[-1] - absolute_frames[0] + 1) / timecode_fps
+    return stats
+
+def format_capture_stats(stats):
+    minutes, seconds = divmod(stats['duration'], 60)
+    return '{:d}:{:05.2f}, {} frames, {} dropped'.format(int(minutes), seconds, stats['frame_count'], stats['dropped_frames'])
+
+#######################################################################
+# Converts a capture value to a float
+#######################################################################
+def parse_capture_value(value_str):
+    #cater for when numbers are super low
+    if value_str == None or value_str.strip() == '' or 'E' in value_str:
+        return 0.0
+    return float(value_str)
+
+#######################################################################
+# Gets the capture data as arrays
+# Returns a dictionary holding the first row number, the frame count,
+# the timecodes and a float array per blendshape/item channel.
+# When a row range is given, the rows are read straight from their byte
+# offsets in the capture index, so earlier rows are never parsed.
+# Capture archives, take zips & ingested takes are read whole (they're
+# small) and then sliced
+#######################################################################
+def load_capture_arrays(capture_path, row_start=0, row_end=None):
+    #a take ingested from a watched folder is read from its parsed values
+    ingested_path = get_ingested_capture_path(capture_path)
+    if ingested_path != None:
+        return get_capture_range(get_cached_file_data(ingested_path, read_ingested_capture), row_start, row_end)
+
+    if is_capture_archive(capture_path):
+        return get_capture_range(get_cached_file_data(capture_path, read_capture_archive), row_start, row_end)
+    if is_take_archive(capture_path):
+        return get_capture_range(get_cached_file_data(capture_path, read_take_archive), row_start, row_end)
+
+    if row_start == 0 and row_end == None:
+        return read_capture_csv(capture_path)
+
+    capture_index = get_capture_index(capture_path)
+    row_count = len(capture_index['offsets']) - 1
+    row_start = min(max(row_start, 0), row_count)
+    row_end = row_count if row_end == None else min(max(row_end, row_start), row_count)
+    with open(capture_path, 'rb') as capture_file:
+        header = next(csv.reader([capture_file.readline().decode('utf-8-sig')]), [])
+        capture_file.seek(int(capture_index['offsets'][row_start]))
+        data = capture_file.read(int(capture_index['offsets'][row_end] - capture_index['offsets'][row_start]))
+    rows = [row for row in csv.reader(data.decode('utf-8').splitlines()) if len(row) > 0]
+    return get_capture_arrays_from_rows(header, rows, row_start)
+
+#reads only the given rows (sorted), numbered from 0: each csv row is read from
+#its byte offset in the capture index, other captures are read whole and the rows
+#picked out
+def load_capture_rows(capture_path, rows):
+    capture_index = get_capture_index(capture_path)
+    if capture_index['offsets'] is None:
+        return select_capture_rows(get_capture_arrays(capture_path), rows)
+    offsets = capture_index['offsets']
+    lines = []
+    with open(capture_path, 'rb') as capture_file:
+        header = next(csv.reader([capture_file.readline().decode('utf-8-sig')]), [])
+        for row in rows:
+            capture_file.seek(int(offsets[row]))
+            lines.append(capture_file.read(int(offsets[row + 1] - offsets[row])).decode('utf-8').rstrip('\r\n'))
+    return get_capture_arrays_from_rows(header, [row for row in csv.reader(lines) if len(row) > 0], 0)
+
+def read_capture_csv(capture_path):
+    with open(capture_path) as csv_file:
+        csv_reader = csv.reader(csv_file, delimiter=',')
+        header = next(csv_reader, [])
+        rows = [row for row in csv_reader if len(row) > 0]
+    return get_capture_arrays_from_rows(header, rows, 0)
+
+def get_capture_arrays_from_rows(header, rows, first_row, channel_names=None):
+    if channel_names == None:
+        channel_names = data_shapkey_names + data_item_names + ['BlendShapeCount']
+
+    channels = {}
+    for col_index, col_name in enumerate(header):
+        if col_name in channel_names:
+            channels[col_name] = np.array([parse_capture_value(row[col_index] if col_index < len(row) else None) for row in rows], dtype=np.float64)
+
+    timecodes = []
+    if 'Timecode' in header:
+        timecode_index = header.index('Timecode')
+        timecodes = [row[timecode_index] for row in rows]
+
+    return {'first_row': first_row, 'frame_count': len(rows), 'timecodes': timecodes, 'channels': channels}
+
+#a range of a capture loaded whole (or being loaded, such as by the prefetch) is sliced from it
+def get_capture_arrays(capture_path, row_start=0, row_end=None):
+    if row_start != 0 or row_end != None:
+        capture = find_cached_file_data(capture_path, load_capture_arrays, 0, None, wait_for_loading=True)
+        if capture != None:
+            return get_capture_range(capture, row_start, row_end)
+    return get_cached_file_data(capture_path, load_capture_arrays, row_start, row_end)
+
+#######################################################################
+# Converts a timecode (HH:MM:SS:FF.fff) into a number that sorts in time order
+#######################################################################
+def parse_timecode(timecode):
+    parts = timecode.strip().replace(';', ':').split(':')
+    if len(parts) < 3 or len(parts) > 4:
+        raise ValueError('Invalid timecode: ' + timecode)
+    hours, minutes, seconds = float(parts[0]), float(parts[1]), float(parts[2])
+    frames = float(parts[3]) if len(parts) == 4 else 0.0
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000 + frames
+
+#invalid timecodes are nan
+def parse_timecode_keys(timecodes):
+    #fast path: every timecode is HH:MM:SS:FF, parsed in one go
+    try:
+        parts = np.array(','.join(timecodes).replace(';', ',').replace(':', ',').split(','), dtype=np.float64).reshape(len(timecodes), 4)
+        return ((parts[:, 0] * 60 + parts[:, 1]) * 60 + parts[:, 2]) * 1000 + parts[:, 3]
+    except ValueError:
+        pass
+
+    timecode_keys = np.full(len(timecodes), np.nan)
+    for x, timecode in enumerate(timecodes):
+        try:
+            timecode_keys[x] = parse_timecode(timecode)
+        except ValueError:
+            pass
+    return timecode_keys
+
+#######################################################################
+# Capture index
+# A sidecar file (<capture>.index.npz) holding the byte offset and timecode
+# of every capture row. It's built once per file and rebuilt automatically
+# when the capture's size or modified time changes
+#######################################################################
+capture_index_version = 1
+
+def get_capture_index_path(capture_path):
+    return capture_path + '.index.npz'
+
+def build_capture_index(capture_path):
+    offsets = []
+    timecodes = []
+    with open(capture_path, 'rb') as capture_file:
+        header = next(csv.reader([capture_file.readline().decode('utf-8-sig')]), [])
+        timecode_index = header.index('Timecode') if 'Timecode' in header else -1
+        offset = capture_file.tell()
+        for line in capture_file:
+            if line.strip() != b'':
+                offsets.append(offset)
+                timecodes.append(line.split(b',')[timecode_index].decode('utf-8').strip() if timecode_index >= 0 else '')
+            offset += len(line)
+        offsets.append(offset)
+
+    return {
+        'offsets': np.array(offsets, dtype=np.int64),
+        'timecodes': np.array(timecodes, dtype=str),
+        'timecode_keys': parse_timecode_keys(timecodes)
+    }
+
+def load_capture_index(capture_path):
+    stat = os.stat(capture_path)
+    index_path = get_capture_index_path(capture_path)
+
+    #use the sidecar if it matches the capture
+    try:
+        with np.load(index_path) as index_file:
+            if int(index_file['version']) == capture_index_version and int(index_file['size']) == stat.st_size and int(index_file['mtime_ns']) == stat.st_mtime_ns:
+                return {'offsets': index_file['offsets'], 'timecodes': index_file['timecodes'], 'timecode_keys': index_file['timecode_keys']}
+    except (OSError, KeyError, ValueError):
+        pass
+
+    #otherwise (re)build it
+    capture_index = build_capture_index(capture_path)
+    try:
+        with open(index_path, 'wb') as index_file:
+            np.savez(index_file, version=capture_index_version, size=stat.st_size, mtime_ns=stat.st_mtime_ns, **capture_index)
+    except OSError:
+        #read only location, the index just isn't kept between sessions
+        pass
+    return capture_index
+
+def get_capture_index(capture_path):
+    ingested_path = get_ingested_capture_path(capture_path)
+    if ingested_path != None:
+        return get_cached_file_data(ingested_path, load_ingested_capture_index)
+    if is_capture_archive(capture_path):
+        return get_cached_file_data(capture_path, load_capture_archive_index)
+    if is_take_archive(capture_path):
+        return get_cached_file_data(capture_path, load_take_archive_index)
+    return get_cached_file_data(capture_path, load_capture_index)
+
+#######################################################################
+# Gets the capture rows to apply (row_end is exclusive, None for the end of the capture)
+# The in/out timecodes are looked up in the capture index, and the skipped
+# capture frames are counted from the in point
+#######################################################################
+def get_capture_row_range(capture_path, in_timecode, out_timecode, skip_capture_frames):
+    timecode_keys = None
+    if in_timecode.strip() != '' or out_timecode.strip() != '':
+        timecode_keys = get_capture_index(capture_path)['timecode_keys']
+    return get_timecode_row_range(timecode_keys, in_timecode, out_timecode, skip_capture_frames)
+
+#the timecode keys of the rows from row 0 (only needed with an in/out timecode)
+def get_timecode_row_range(timecode_keys, in_timecode, out_timecode, skip_capture_frames):
+    row_start = 0
+    row_end = None
+
+    if in_timecode.strip() != '' or out_timecode.strip() != '':
+        if in_timecode.strip() != '':
+            matches = np.flatnonzero(timecode_keys >= parse_timecode(in_timecode))
+            if len(matches) == 0:
+                raise ValueError('In Timecode ' + in_timecode + ' is after the end of the capture.')
+            row_start = int(matches[0])
+        if out_timecode.strip() != '':
+            #an out frame without a subframe takes in all of its rows (up to the next frame)
+            if '.' in out_timecode:
+                matches = np.flatnonzero(timecode_keys[row_start:] <= parse_timecode(out_timecode))
+            else:
+                matches = np.flatnonzero(timecode_keys[row_start:] < parse_timecode(out_timecode) + 1)
+            if len(matches) == 0:
+                raise ValueError('Out Timecode ' + out_timecode + ' is before the In Timecode.')
+            row_end = row_start + int(matches[-1]) + 1
+
+    return row_start + skip_capture_frames, row_end
+
+#######################################################################
+# Packed data
+# The capture (as a capture archive), the calculated neutral and the
+# compiled mapping can be packed into the .blend as base64 text blocks,
+# so apply and preview work without access to the original files.
+# Text blocks are named after the content hash, so identical data is
+# only stored once, and packed data is referenced as 'packed:<text name>'
+#######################################################################
+packed_path_prefix = 'packed:'
+packed_text_prefix = 'ApplicatorPacked_'
+
+def is_packed_path(file_path):
+    return file_path != None and file_path.startswith(packed_path_prefix)
+
+def get_packed_text(packed_path):
+    return bpy.data.texts.get(packed_path[len(packed_path_prefix):])
+
+def data_file_exists(file_path):
+    if is_packed_path(file_path):
+        return get_packed_text(file_path) != None
+    if is_profile_path(file_path):
+        return get_profile_text(get_profile_name(file_path)) != None
+    return os.path.exists(file_path)
+
+def get_data_paths(props):
+    #a take folder is read through its capture csv, found when the file was selected
+    capture_path = get_resolved_take_path(props.capture_file_path)
+    neutral_path = get_resolved_take_path(props.neutral_file_path)
+    mapping_path = props.mapping_file_path
+    if props.use_packed_data:
+        if props.packed_capture_path != '':
+            capture_path = props.packed_capture_path
+        if props.packed_neutral_path != '':
+            neutral_path = props.packed_neutral_path
+        if props.packed_mapping_path != '':
+            mapping_path = props.packed_mapping_path
+    #a selected neutral profile replaces the neutral file
+    if props.neutral_profile not in ('', 'NONE'):
+        neutral_path = profile_path_prefix + props.neutral_profile
+    return capture_path, neutral_path, mapping_path
+
+def pack_data(data):
+    text_name = packed_text_prefix + hashlib.sha1(data).hexdigest()
+    text = bpy.data.texts.get(text_name)
+    if text == None:
+        text = bpy.data.texts.new(text_name)
+        text.from_string(base64.encodebytes(data).decode('ascii'))
+        text.use_fake_user = True
+    return packed_path_prefix + text_name
+
+def read_packed_data(packed_path):
+    text = get_packed_text(packed_path)
+    if text == None:
+        raise ValueError('Packed data ' + packed_path + ' is missing from the .blend file.')
+    return base64.decodebytes(text.as_string().encode('ascii'))
+
+def read_packed_json(packed_path):
+    return json.loads(read_packed_data(packed_path).decode('utf-8'))
+
+#######################################################################
+# Packs the selected files into the .blend
+#######################################################################
+def pack_data_files(props):
+    capture_path = get_take_capture_path(props.capture_file_path)
+    if is_capture_archive(capture_path):
+        with open(capture_path, 'rb') as archive_file:
+            props.packed_capture_path = pack_data(archive_file.read())
+    elif is_take_archive(capture_path):
+        capture = get_cached_file_data(capture_path, read_take_archive)
+        props.packed_capture_path = pack_data(get_capture_archive_bytes(capture, capture['columns']))
+    else:
+        props.packed_capture_path = pack_data(get_capture_archive_bytes_from_csv(capture_path))
+
+    if props.neutral_file_path != '':
+        props.packed_neutral_path = pack_data(json.dumps(get_face_neutral(get_take_capture_path(props.neutral_file_path))).encode('utf-8'))
+    else:
+        props.packed_neutral_path = ''
+
+    props.packed_mapping_path = pack_data(json.dumps(get_compiled_mapping(props.mapping_file_path)).encode('utf-8'))
+    props.use_packed_data = True
+    remove_unused_packed_data()
+
+#######################################################################
+# Performer neutral profiles
+# A calculated neutral saved under the performer's name, along with the
+# hash of the neutral data it came from and the estimator settings.
+# Profiles are small JSON files in the profile directory (shared across
+# sessions and users) and are copied into the .blend as text blocks when
+# saved or selected, so the .blend works without the directory.
+# The selected profile is referenced as 'profile:<name>'
+#######################################################################
+profile_path_prefix = 'profile:'
+profile_text_prefix = 'ApplicatorProfile_'
+profile_extension = '.json'
+profile_name_max_bytes = 63 - len(profile_text_prefix) - len(profile_extension) #text block names are at most 63 bytes
+profile_version = 1
+neutral_profile_items = []
+profile_directory_cache = {'key': None, 'names': []}
+
+def is_profile_path(file_path):
+    return file_path != None and file_path.startswith(profile_path_prefix)
+
+#the profile's text block name would be cut short
+def is_profile_name_too_long(profile_name):
+    return len(profile_name.encode('utf-8')) > profile_name_max_bytes
+
+def get_profile_name(profile_path):
+    return profile_path[len(profile_path_prefix):]
+
+def get_profile_text(profile_name):
+    return bpy.data.texts.get(profile_text_prefix + profile_name + profile_extension)
+
+def get_profile_directory(props):
+    if props.profile_directory != '':
+        return bpy.path.abspath(props.profile_directory)
+    return bpy.utils.user_resource('CONFIG', path='applicator_profiles', create=True)
+
+def get_profile_file_path(props, profile_name):
+    return os.path.join(get_profile_directory(props), profile_name + profile_extension)
+
+#the directory is only listed again when it changes
+def list_directory_profile_names(profile_directory):
+    try:
+        key = (profile_directory, os.stat(profile_directory).st_mtime_ns)
+    except OSError:
+        return []
+    if profile_directory_cache['key'] != key:
+        profile_names = [filename[:-len(profile_extension)] for filename in os.listdir(profile_directory) if filename.lower().endswith(profile_extension)]
+        profile_directory_cache['names'] = [profile_name for profile_name in profile_names if not is_profile_name_too_long(profile_name)]
+        profile_directory_cache['key'] = key
+    return profile_directory_cache['names']
+
+def list_neutral_profile_names(props):
+    profile_names = set(list_directory_profile_names(get_profile_directory(props)))
+    for text in bpy.data.texts:
+        if text.name.startswith(profile_text_prefix) and text.name.endswith(profile_extension):
+            profile_names.add(text.name[len(profile_text_prefix):-len(profile_extension)])
+    return sorted(profile_names, key=str.lower)
+
+def list_neutral_profile_items(props):
+    #blender needs the item strings kept referenced
+    global neutral_profile_items
+    neutral_profile_items = [('NONE', '(None)', 'Use the Neutral File')]
+    for profile_name in list_neutral_profile_names(props):
+        neutral_profile_items.append((profile_name, profile_name, 'Neutral profile for ' + profile_name))
+    return neutral_profile_items
+
+#window_frames detects the neutral from the capture at neutral_path
+def create_neutral_profile(profile_name, neutral_path, window_frames=None):
+    if is_packed_path(neutral_path):
+        source_data = read_packed_data(neutral_path)
+    else:
+        with open(neutral_path, 'rb') as neutral_file:
+            source_data = neutral_file.read()
+
+    if window_frames == None:
+        estimator = {'method': 'MIDDLE_THIRD'}
+        values = get_face_neutral(neutral_path)
+    else:
+        estimator = {'method': 'STILLEST_WINDOW', 'window_frames': window_frames}
+        values = get_detected_face_neutral(neutral_path, window_frames)
+
+    return {
+        'version': profile_version,
+        'name': profile_name,
+        'source_name': os.path.basename(neutral_path),
+        'source_hash': hashlib.sha1(source_data).hexdigest(),
+        'estimator': estimator,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'values': values
+    }
+
+def store_neutral_profile_text(profile):
+    text_name = profile_text_prefix + profile['name'] + profile_extension
+    text = bpy.data.texts.get(text_name)
+    if text == None:
+        text = bpy.data.texts.new(text_name)
+        text.use_fake_user = True
+    text.from_string(json.dumps(profile, indent=2))
+
+def save_neutral_profile(props, profile):
+    with open(get_profile_file_path(props, profile['name']), 'w') as profile_file:
+        json.dump(profile, profile_file, indent=2)
+    store_neutral_profile_text(profile)
+
+#######################################################################
+# Copies the profile from the profile directory into the .blend
+# (the .blend copy is kept if the directory doesn't have the profile)
+#######################################################################
+def import_neutral_profile(props, profile_name):
+    if profile_name in ('', 'NONE'):
+        return
+    try:
+        with open(get_profile_file_path(props, profile_name), 'r') as profile_file:
+            profile = json.load(profile_file)
+    except (OSError, ValueError):
+        #missing or unreadable; apply will report it if there's no .blend copy either
+        return
+    if profile.get('version', 0) <= profile_version:
+        store_neutral_profile_text(profile)
+
+def read_neutral_profile(profile_name):
+    text = get_profile_text(profile_name)
+    if text == None:
+        raise ValueError('Neutral profile ' + profile_name + ' not found')
+    return json.loads(text.as_string())
+
+#######################################################################
+# Removes packed text blocks no longer referenced by any scene
+#######################################################################
+def remove_unused_packed_data():
+    used_text_names = set()
+    for scene in bpy.data.scenes:
+        props = scene.ApplicatorProps
+        for packed_path in [props.packed_capture_path, props.packed_neutral_path, props.packed_mapping_path]:
+            if is_packed_path(packed_path):
+                used_text_names.add(packed_path[len(packed_path_prefix):])
+
+    for text in list(bpy.data.texts):
+        if text.name.startswith(packed_text_prefix) and text.name not in used_text_names:
+            bpy.data.texts.remove(text)
+
+#######################################################################
+# Capture archive (.appcap)
+# A compact binary form of a capture file:
+#   8 byte magic, uint32 header length, json header, then a zlib block
+#   for the timecodes and a zlib block holding every channel, in the order
+#   listed in the header.
+# Each channel is stored as int16 steps between its min and max value
+# (scale = (max - min) / 65534), so values are within half a step of the
+# original: under 0.00001 for the 0-1 blendshape values.
+# Channels that never change are stored as a single value, flat channels
+# as runs, and the others as deltas (low bytes then high bytes, which
+# compresses far better than the interleaved values)
+#######################################################################
+capture_archive_magic = b'APPCAP01'
+capture_archive_version = 1
+
+def is_capture_archive(capture_path):
+    #packed captures are always stored as archives
+    return capture_path.lower().endswith(capture_archive_extension) or is_packed_path(capture_path)
+
+def open_capture_archive(archive_path):
+    if is_packed_path(archive_path):
+        return io.BytesIO(read_packed_data(archive_path))
+    return open(archive_path, 'rb')
+
+def encode_archive_channel(name, values):
+    channel = {'name': name, 'encoding': 'constant', 'value': 0.0, 'scale': 0.0, 'offset': 0.0}
+    if len(values) == 0:
+        return channel, b''
+
+    min_value = float(values.min())
+    max_value = float(values.max())
+    if min_value == max_value:
+        channel['value'] = min_value
+        return channel, b''
+
+    offset = (min_value + max_value) / 2
+    scale = (max_value - min_value) / 65534
+    steps = np.clip(np.rint((values - offset) / scale), -32767, 32767).astype(np.int16)
+    channel['scale'] = scale
+    channel['offset'] = offset
+
+    #use runs if they're smaller than the deltas
+    run_starts = np.flatnonzero(np.concatenate(([True], steps[1:] != steps[:-1])))
+    if len(run_starts) * 6 < len(steps) * 2:
+        run_lengths = np.diff(np.append(run_starts, len(steps)))
+        channel['encoding'] = 'rle'
+        channel['runs'] = len(run_starts)
+        return channel, steps[run_starts].astype('<i2').tobytes() + run_lengths.astype('<u4').tobytes()
+
+    #deltas wrap around, so cumsum in 16 bits gets back the exact steps
+    deltas = np.diff(steps.view(np.uint16), prepend=np.uint16(0)).astype('<u2')
+    channel['encoding'] = 'delta'
+    return channel, deltas.view(np.uint8).reshape(-1, 2).T.tobytes()
+
+def decode_archive_channel(channel, data, frame_count):
+    if channel['encoding'] == 'constant':
+        return np.full(frame_count, channel['value'], dtype=np.float64)
+
+    if channel['encoding'] == 'rle':
+        runs = channel['runs']
+        run_values = np.frombuffer(data[:runs * 2], dtype='<i2')
+        run_lengths = np.frombuffer(data[runs * 2:], dtype='<u4')
+        steps = np.repeat(run_values, run_lengths)
+    else:
+        deltas = np.frombuffer(data, dtype=np.uint8).reshape(2, -1).T.copy().view('<u2').ravel()
+        steps = np.cumsum(deltas, dtype=np.uint16).view(np.int16)
+
+    return channel['offset'] + steps.astype(np.float64) * channel['scale']
+
+def get_capture_archive_bytes(capture, columns):
+    header = {
+        'version': capture_archive_version,
+        'frame_count': capture['frame_count'],
+        'columns': columns,
+        'channels': []
+    }
+
+    channel_blocks = []
+    for name, values in capture['channels'].items():
+        channel, block = encode_archive_channel(name, values)
+        channel['length'] = len(block)
+        header['channels'].append(channel)
+        channel_blocks.append(block)
+
+    timecodes_block = zlib.compress('\n'.join(capture['timecodes']).encode('utf-8'), 9)
+    channels_block = zlib.compress(b''.join(channel_blocks), 9)
+    header['timecodes_length'] = len(timecodes_block)
+    header['channels_length'] = len(channels_block)
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return capture_archive_magic + struct.pack('<I', len(header_bytes)) + header_bytes + timecodes_block + channels_block
+
+def write_capture_archive(archive_path, capture, columns):
+    with open(archive_path, 'wb') as archive_file:
+        archive_file.write(get_capture_archive_bytes(capture, columns))
+
+def read_capture_archive_header_from_file(archive_file):
+    if archive_file.read(len(capture_archive_magic)) != capture_archive_magic:
+        raise ValueError('Not an Applicator capture archive.')
+    header_length = struct.unpack('<I', archive_file.read(4))[0]
+    header = json.loads(archive_file.read(header_length).decode('utf-8'))
+    if header['version'] > capture_archive_version:
+        raise ValueError('Capture archive was written by a newer version of Applicator.')
+    return header
+
+def read_capture_archive_header(archive_path):
+    with open_capture_archive(archive_path) as archive_file:
+        return read_capture_archive_header_from_file(archive_file)
+
+def read_capture_archive(archive_path):
+    with open_capture_archive(archive_path) as archive_file:
+        header = read_capture_archive_header_from_file(archive_file)
+        frame_count = header['frame_count']
+        timecodes_data = zlib.decompress(archive_file.read(header['timecodes_length'])).decode('utf-8')
+        timecodes = timecodes_data.split('\n') if frame_count > 0 else []
+
+        channels_data = zlib.decompress(archive_file.read(header['channels_length']))
+
+    channels = {}
+    position = 0
+    for channel in header['channels']:
+        channels[channel['name']] = decode_archive_channel(channel, channels_data[position:position + channel['length']], frame_count)
+        position += channel['length']
+
+    return {'first_row': 0, 'frame_count': frame_count, 'timecodes': timecodes, 'channels': channels, 'columns': header['columns']}
+
+def load_capture_archive_index(archive_path):
+    return get_loaded_capture_index(get_cached_file_data(archive_path, read_capture_archive))
+
+#the capture index of a capture read whole (without the byte offsets)
+def get_loaded_capture_index(capture):
+    timecodes = capture['timecodes']
+    return {'offsets': None, 'timecodes': np.array(timecodes, dtype=str), 'timecode_keys': parse_timecode_keys(timecodes)}
+
+#######################################################################
+# Live Link Face takes
+# Live Link Face exports a take as a folder (or a zip of it) holding the
+# capture csv beside the video, audio, thumbnail and the take metadata
+# (take.json). A take folder is read through its csv. From a take zip
+# only the csv member is decompressed, streamed straight into the csv
+# reader, so nothing is extracted or written, however big the video
+# beside it; like a capture archive, the take is read whole and sliced.
+# The slate, take number and start timecode come from take.json, or
+# else from the take's name (<date>_<slate>_<take>) and its first row
+#######################################################################
+take_metadata_file_name = 'take.json'
+
+def is_take_archive(capture_path):
+    return capture_path != None and capture_path.lower().endswith(take_archive_extension) and not is_packed_path(capture_path)
+
+def is_take_folder(capture_path):
+    if capture_path == None or capture_path == '' or is_packed_path(capture_path) or is_profile_path(capture_path):
+        return False
+    return os.path.isdir(capture_path)
+
+#the take's capture csv: the largest csv besides the frame log
+def find_take_capture_name(names_and_sizes):
+    capture_names = []
+    for name, size in names_and_sizes:
+        base_name = os.path.basename(name)
+        if base_name.lower().endswith('.csv') and not base_name.startswith('.') and not name.startswith('__MACOSX') and 'frame_log' not in base_name.lower():
+            capture_names.append((size, name))
+    if len(capture_names) == 0:
+        return None
+    return max(capture_names)[1]
+
+def find_take_folder_capture(take_folder):
+    with os.scandir(take_folder) as entries:
+        capture_name = find_take_capture_name([(entry.name, entry.stat().st_size) for entry in entries if entry.is_file()])
+    return None if capture_name == None else os.path.join(take_folder, capture_name)
+
+#the capture csv of a take folder (any other path is returned as it is)
+def get_take_capture_path(capture_path):
+    if not is_take_folder(capture_path):
+        return capture_path
+    take_capture_path = get_cached_file_data(capture_path, find_take_folder_capture)
+    return capture_path if take_capture_path == None else take_capture_path
+
+#the capture csvs of the selected files, found when a file is selected
+#(or first used, for a saved .blend), so the settings checked on every
+#frame don't look into the take folder. Each is kept with the take
+#folder's modified time, and found again before Apply if the folder
+#changed since (such as a sync adding the capture csv)
+resolved_take_paths = {} #file path: (modified time, capture csv path)
+
+def get_take_path_mtime(file_path):
+    if file_path == None or file_path == '' or is_packed_path(file_path) or is_profile_path(file_path):
+        return None
+    try:
+        return os.stat(file_path).st_mtime_ns
+    except OSError:
+        return None
+
+def resolve_take_path(file_path):
+    resolved_take_paths[file_path] = (get_take_path_mtime(file_path), get_take_capture_path(file_path))
+    return resolved_take_paths[file_path][1]
+
+def get_resolved_take_path(file_path):
+    resolved = resolved_take_paths.get(file_path)
+    return resolve_take_path(file_path) if resolved == None else resolved[1]
+
+#only the selected files are kept
+def update_take_paths(props):
+    selected_paths = (props.capture_file_path, props.neutral_file_path)
+    for file_path in list(resolved_take_paths):
+        if file_path not in selected_paths:
+            resolved_take_paths.pop(file_path, None)
+    for file_path in selected_paths:
+        resolve_take_path(file_path)
+
+def refresh_take_paths(props):
+    for file_path in (props.capture_file_path, props.neutral_file_path):
+        resolved = resolved_take_paths.get(file_path)
+        if resolved == None or resolved[0] != get_take_path_mtime(file_path):
+            resolve_take_path(file_path)
+
+def open_take_archive_capture(take_zip):
+    capture_name = find_take_capture_name([(info.filename, info.file_size) for info in take_zip.infolist() if not info.is_dir()])
+    if capture_name == None:
+        raise ValueError('The take archive has no capture csv.')
+    return io.TextIOWrapper(take_zip.open(capture_name), encoding='utf-8-sig', newline='')
+
+def read_take_archive_columns(take_path):
+    with zipfile.ZipFile(take_path) as take_zip:
+        with open_take_archive_capture(take_zip) as capture_file:
+            return next(csv.reader(capture_file), [])
+
+def read_take_archive(take_path):
+    with zipfile.ZipFile(take_path) as take_zip:
+        with open_take_archive_capture(take_zip) as capture_file:
+            csv_reader = csv.reader(capture_file)
+            header = next(csv_reader, [])
+            rows = [row for row in csv_reader if len(row) > 0]
+
+    #keep every column besides the timecode, as a capture archive does
+    capture = get_capture_arrays_from_rows(header, rows, 0, [column for column in header if column != 'Timecode'])
+    capture['columns'] = header
+    return capture
+
+def load_take_archive_index(take_path):
+    return get_loaded_capture_index(get_cached_file_data(take_path, read_take_archive))
+
+def load_take_metadata(take_path):
+    metadata = {}
+    first_row = {}
+    try:
+        if is_take_archive(take_path):
+            with zipfile.ZipFile(take_path) as take_zip:
+                metadata_names = [name for name in take_zip.namelist() if os.path.basename(name).lower() == take_metadata_file_name]
+                if len(metadata_names) > 0:
+                    metadata = json.loads(take_zip.read(metadata_names[0]).decode('utf-8-sig'))
+                with open_take_archive_capture(take_zip) as capture_file:
+                    first_row = next(csv.DictReader(capture_file), {})
+        else:
+            metadata_path = os.path.join(take_path, take_metadata_file_name)
+            if os.path.isfile(metadata_path):
+                with open(metadata_path, encoding='utf-8-sig') as metadata_file:
+                    metadata = json.load(metadata_file)
+            capture_path = get_take_capture_path(take_path)
+            if capture_path != take_path:
+                with open(capture_path, encoding='utf-8-sig', newline='') as capture_file:
+                    first_row = next(csv.DictReader(capture_file), {})
+    except ValueError:
+        #unreadable metadata, the rest comes from the take's name
+        pass
+    if not isinstance(metadata, dict):
+        metadata = {}
+
+    #<date>_<slate>_<take>
+    name_parts = os.path.splitext(os.path.basename(os.path.normpath(take_path)))[0].split('_')
+    if len(name_parts) > 1 and name_parts[0].isdigit() and len(name_parts[0]) == 8:
+        name_parts = name_parts[1:]
+    name_take = name_parts[-1] if len(name_parts) > 1 and name_parts[-1].isdigit() else ''
+    name_slate = '_'.join(name_parts[:-1]) if name_take != '' else '_'.join(name_parts)
+
+    return {
+        'slate': str(metadata.get('slate') or name_slate),
+        'take': str(metadata.get('take', metadata.get('takeNumber', '')) or name_take),
+        'start_timecode': str(metadata.get('startTimecode', metadata.get('timecode', '')) or (first_row.get('Timecode') or '')).strip(),
+        'device': str(metadata.get('deviceModel', '')),
+        'metadata': metadata
+    }
+
+def get_take_metadata(take_path):
+    return get_cached_file_data(take_path, load_take_metadata)
+
+#the take line of the Data panel (None for other capture files)
+def get_take_metadata_text(capture_path):
+    if not is_take_archive(capture_path) and not is_take_folder(capture_path):
+        return None
+    try:
+        take_metadata = get_take_metadata(capture_path)
+    except (OSError, zipfile.BadZipFile):
+        return None
+    parts = ['Slate ' + take_metadata['slate']]
+    if take_metadata['take'] != '':
+        parts.append('take ' + take_metadata['take'])
+    if take_metadata['start_timecode'] != '':
+        parts.append('starts ' + take_metadata['start_timecode'])
+    return ', '.join(parts)
+
+#######################################################################
+# Gets a range of rows from loaded capture arrays
+#######################################################################
+def get_capture_range(capture, row_start=0, row_end=None):
+    first_row = capture['first_row']
+    local_start = min(max(row_start - first_row, 0), capture['frame_count'])
+    local_end = capture['frame_count'] if row_end == None else min(max(row_end - first_row, local_start), capture['frame_count'])
+    return {
+        'first_row': first_row + local_start,
+        'frame_count': local_end - local_start,
+        'timecodes': capture['timecodes'][local_start:local_end],
+        'channels': { name : values[local_start:local_end] for name, values in capture['channels'].items() }
+    }
+
+#gets the given rows (sorted) from loaded capture arrays, numbered from 0
+def select_capture_rows(capture, rows):
+    indices = np.asarray(rows, dtype=np.int64) - capture['first_row']
+    return {
+        'first_row': 0,
+        'frame_count': len(indices),
+        'timecodes': [capture['timecodes'][index] for index in indices.tolist()],
+        'channels': { name : values[indices] for name, values in capture['channels'].items() }
+    }
+
+#######################################################################
+# Converts a capture csv to an archive, or an archive back to a csv
+#######################################################################
+def get_capture_archive_bytes_from_csv(capture_path):
+    with open(capture_path) as csv_file:
+        csv_reader = csv.reader(csv_file, delimiter=',')
+        header = next(csv_reader, [])
+        rows = [row for row in csv_reader if len(row) > 0]
+
+    #keep every column besides the timecode (e.g. BlendShapeCount), not just the ARKit channels
+    capture = get_capture_arrays_from_rows(header, rows, 0, [column for column in header if column != 'Timecode'])
+    return get_capture_archive_bytes(capture, header)
+
+def convert_capture_to_archive(capture_path, archive_path):
+    archive_bytes = get_capture_archive_bytes_from_csv(capture_path)
+    with open(archive_path, 'wb') as archive_file:
+        archive_file.write(archive_bytes)
+
+def convert_archive_to_capture(archive_path, capture_path):
+    capture = read_capture_archive(archive_path)
+    write_capture_csv(capture_path, capture, capture['columns'])
+
+def write_capture_csv(capture_path, capture, header):
+    frame_count = capture['frame_count']
+
+    #write whole number columns (e.g. BlendShapeCount) without decimals
+    columns = []
+    for column in header:
+        if column == 'Timecode':
+            columns.append(capture['timecodes'])
+        else:
+            values = capture['channels'].get(column, np.zeros(frame_count))
+            if np.all(values == np.round(values)):
+                columns.append(['%d' % value for value in values.tolist()])
+            else:
+                columns.append(['%.10f' % value for value in values.tolist()])
+
+    with open(capture_path, 'w', newline='') as csv_file:
+        csv_writer = csv.writer(csv_file, delimiter=',')
+        csv_writer.writerow(header)
+        csv_writer.writerows(zip(*columns))
+
+#######################################################################
+# Ingest folder
+# An opt-in watch of a folder the takes arrive in. New or changed capture
+# csvs are validated, parsed and measured (frame count, duration, dropped
+# frames, tracking repairs and the detected neutral) on a background
+# thread, and recorded in a take index. The parsed values are saved as
+# they are (float64 arrays in an .npz, unlike the quantized capture
+# archive), so loading them gives exactly the csv's values. They and the
+# index (take_index.json) are kept in an .applicator folder inside the
+# watched folder, and a csv with up to date parsed values there is loaded
+# from them, so ingested takes cost no parse.
+# The watch timer only stats the folder itself, until its modified time
+# changes (a take added, removed or renamed), plus a full rescan of the
+# files' sizes and modified times every watch_rescan_interval seconds
+# (a take rewritten in place)
+#######################################################################
+ingest_folder_name = '.applicator'
+take_index_file_name = 'take_index.json'
+take_index_version = 2
+ingested_capture_extension = '.npz'
+watch_interval = 2.0
+watch_rescan_interval = 30.0
+take_index_write_interval = 20 #takes ingested between index writes
+watch_state = {'folder': None, 'folder_mtime_ns': None, 'rescan_time': 0.0, 'take_index': None, 'detect_neutral_frames': 60, 'pending': [], 'thread': None, 'generation': 0, 'status': ''}
+take_index_lock = threading.Lock()
+
+def get_ingest_directory(folder):
+    return os.path.join(folder, ingest_folder_name)
+
+def get_take_index_path(folder):
+    return os.path.join(get_ingest_directory(folder), take_index_file_name)
+
+def get_ingested_capture_name(file_name):
+    return os.path.splitext(file_name)[0] + ingested_capture_extension
+
+def read_take_index(folder):
+    try:
+        with open(get_take_index_path(folder)) as index_file:
+            take_index = json.load(index_file)
+        if take_index.get('version') == take_index_version:
+            return take_index
+    except (OSError, ValueError):
+        pass
+    return {'version': take_index_version, 'takes': {}}
+
+def write_take_index(folder, take_index):
+    index_path = get_take_index_path(folder)
+    with take_index_lock:
+        index_text = json.dumps(take_index, indent=1)
+    with open(index_path + '.tmp', 'w') as index_file:
+        index_file.write(index_text)
+    os.replace(index_path + '.tmp', index_path)
+
+def load_take_index(index_path):
+    return read_take_index(os.path.dirname(os.path.dirname(index_path)))
+
+#the parsed values of an ingested take, when they're up to date with the csv (otherwise None)
+def get_ingested_capture_path(capture_path):
+    if capture_path == None or is_capture_archive(capture_path) or is_profile_path(capture_path):
+        return None
+    folder, file_name = os.path.split(os.path.abspath(capture_path))
+    index_path = get_take_index_path(folder)
+    if not os.path.isfile(index_path):
+        return None
+    take = get_cached_file_data(index_path, load_take_index)['takes'].get(file_name)
+    if take == None or 'capture' not in take:
+        return None
+    stat = os.stat(capture_path)
+    ingested_path = os.path.join(get_ingest_directory(folder), take['capture'])
+    if take['size'] != stat.st_size or take['mtime_ns'] != stat.st_mtime_ns or not os.path.isfile(ingested_path):
+        return None
+    return ingested_path
+
+def write_ingested_capture(ingested_path, capture):
+    channel_names = list(capture['channels'].keys())
+    channel_values = np.stack([capture['channels'][name] for name in channel_names]) if len(channel_names) > 0 else np.zeros((0, capture['frame_count']))
+    with open(ingested_path, 'wb') as ingested_file:
+        np.savez(ingested_file, timecodes=np.array(capture['timecodes'], dtype=str), channel_names=np.array(channel_names, dtype=str), channel_values=channel_values)
+
+def read_ingested_capture(ingested_path):
+    with np.load(ingested_path) as ingested_file:
+        channel_values = ingested_file['channel_values']
+        channels = { str(name) : channel_values[x] for x, name in enumerate(ingested_file['channel_names']) }
+        timecodes = ingested_file['timecodes'].tolist()
+    return {'first_row': 0, 'frame_count': channel_values.shape[1], 'timecodes': timecodes, 'channels': channels}
+
+def load_ingested_capture_index(ingested_path):
+    return get_loaded_capture_index(get_cached_file_data(ingested_path, read_ingested_capture))
+
+#######################################################################
+# Ingests a take: returns its take index entry (with the error, if it failed)
+#######################################################################
+def ingest_take(folder, file_name, detect_neutral_frames=60):
+    capture_path = os.path.join(folder, file_name)
+    stat = os.stat(capture_path)
+    take = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'ingested': time.strftime('%Y-%m-%dT%H:%M:%S'), 'neutral_frames': detect_neutral_frames}
+    try:
+        valid_cols, missing_cols = validate_csv(capture_path, data_shapkey_names + data_item_names)
+        if valid_cols == False:
+            raise ValueError('Missing columns: ' + ', '.join(missing_cols[:3]) + (', ...' if len(missing_cols) > 3 else ''))
+
+        capture = read_capture_csv(capture_path)
+        ingested_name = get_ingested_capture_name(file_name)
+        ingested_path = os.path.join(get_ingest_directory(folder), ingested_name)
+        write_ingested_capture(ingested_path + '.tmp', capture)
+        os.replace(ingested_path + '.tmp', ingested_path)
+
+        repairs = repair_capture(capture)[1]
+        take.update(get_capture_stats(capture))
+        take['capture'] = ingested_name
+        take['repair_spans'] = len(repairs)
+        take['repair_frames'] = int(sum(span['row_end'] - span['row_start'] for span in repairs))
+        take['neutral'] = get_face_neutral_from_still_window(data_shapkey_names, capture, detect_neutral_frames)
+    except (OSError, ValueError, KeyError, IndexError) as error:
+        take['error'] = str(error)
+    return take
+
+#######################################################################
+# Lists the csvs that are new or changed since they were ingested (or
+# whose neutral was detected over a different window), and drops the
+# takes that are gone (with their archives)
+#######################################################################
+def scan_ingest_folder(folder, take_index, detect_neutral_frames):
+    pending = []
+    file_names = set()
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith('.csv'):
+                file_names.add(entry.name)
+                stat = entry.stat()
+                take = take_index['takes'].get(entry.name)
+                if take == None or take['size'] != stat.st_size or take['mtime_ns'] != stat.st_mtime_ns or take.get('neutral_frames', 60) != detect_neutral_frames:
+                    pending.append(entry.name)
+
+    with take_index_lock:
+        removed_names = [file_name for file_name in take_index['takes'] if file_name not in file_names]
+        for file_name in removed_names:
+            take = take_index['takes'].pop(file_name)
+            if 'capture' in take:
+                try:
+                    os.remove(os.path.join(get_ingest_directory(folder), take['capture']))
+                except OSError:
+                    pass
+    return sorted(pending), len(removed_names) > 0
+
+def run_ingest(folder, generation, take_index, file_names, detect_neutral_frames):
+    ingested_count = 0
+    for index, file_name in enumerate(file_names):
+        if watch_state['generation'] != generation:
+            return
+        watch_state['status'] = 'Ingesting ' + str(index + 1) + '/' + str(len(file_names)) + ': ' + file_name
+        try:
+            take = ingest_take(folder, file_name, detect_neutral_frames)
+        except OSError:
+            #removed while waiting, the next scan drops it
+            continue
+        with take_index_lock:
+            take_index['takes'][file_name] = take
+        ingested_count += 1
+        if ingested_count % take_index_write_interval == 0:
+            write_take_index(folder, take_index)
+    write_take_index(folder, take_index)
+    watch_state['status'] = get_take_index_summary(take_index)
+
+def get_take_index_summary(take_index):
+    with take_index_lock:
+        takes = list(take_index['takes'].values())
+    failed_count = len([take for take in takes if 'error' in take])
+    return str(len(takes) - failed_count) + ' takes ready' + (', ' + str(failed_count) + ' failed' if failed_count > 0 else '')
+
+#######################################################################
+# The watch timer
+#######################################################################
+def watch_ingest_folder():
+    folder = watch_state['folder']
+    if folder == None:
+        return None
+    try:
+        folder_mtime_ns = os.stat(folder).st_mtime_ns
+    except OSError:
+        watch_state['status'] = 'Folder not found'
+        return watch_interval
+
+    thread = watch_state['thread']
+    is_ingesting = thread != None and thread.is_alive()
+    rescan = time.perf_counter() - watch_state['rescan_time'] >= watch_rescan_interval
+    if not is_ingesting and (folder_mtime_ns != watch_state['folder_mtime_ns'] or rescan):
+        watch_state['folder_mtime_ns'] = folder_mtime_ns
+        watch_state['rescan_time'] = time.perf_counter()
+        pending, removed = scan_ingest_folder(folder, watch_state['take_index'], watch_state['detect_neutral_frames'])
+        if len(pending) > 0:
+            thread = threading.Thread(target=run_ingest, args=(folder, watch_state['generation'], watch_state['take_index'], pending, watch_state['detect_neutral_frames']), daemon=True)
+            watch_state['thread'] = thread
+            thread.start()
+        elif removed:
+            write_take_index(folder, watch_state['take_index'])
+        if len(pending) == 0:
+            watch_state['status'] = get_take_index_summary(watch_state['take_index'])
+
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+    return watch_interval
+
+def start_watching(folder, detect_neutral_frames=60):
+    stop_watching()
+    folder = os.path.abspath(folder)
+    os.makedirs(get_ingest_directory(folder), exist_ok=True)
+    watch_state.update({'folder': folder, 'folder_mtime_ns': None, 'rescan_time': 0.0, 'take_index': read_take_index(folder), 'detect_neutral_frames': detect_neutral_frames, 'status': 'Scanning...'})
+    bpy.app.timers.register(watch_ingest_folder, first_interval=0.1)
+
+def stop_watching():
+    watch_state['generation'] += 1
+    watch_state['folder'] = None
+    watch_state['status'] = ''
+    if bpy.app.timers.is_registered(watch_ingest_folder):
+        bpy.app.timers.unregister(watch_ingest_folder)
+
+def is_watching():
+    return watch_state['folder'] != None
+
+#the watch timer is gone once another file is opened
+@bpy.app.handlers.persistent
+def watch_load_pre(*args):
+    stop_watching()
+
+#######################################################################
+# Compiles the mapping file
+# Parses the mapping rows once into the values the processing needs
+#######################################################################
+rotation_bone_items = [('Head', 'Head'), ('Eye_L', 'LeftEye'), ('Eye_R', 'RightEye')]
+
+def compile_mapping_data(mapping_data):
+    named_curves = compile_named_curves(mapping_data)
+    blendshapes = []
+    for mapping in mapping_data:
+        if mapping['Type'].upper() == 'BLENDSHAPE' and mapping['Enabled'].upper() == 'Y':
+            blendshapes.append({
+                'name': mapping['Name'],
+                'target': (mapping['Target'] or '').strip(),
+                'multiplier': float(mapping['Multiplier']),
+                'value_shift': float(mapping['ValueShift']),
+                'smooth': mapping['Smooth'].upper() == 'Y',
+                'filter': parse_channel_filter(mapping.get('Filter')),
+                'curve': parse_response_curve(mapping.get('Curve'), named_curves)
+            })
+
+    rotations = {}
+    for bone_name, item_prefix in rotation_bone_items:
+        axes = []
+        for axis_name in ['Yaw', 'Pitch', 'Roll']:
+            item_name = item_prefix + axis_name
+            item_mappings = [mapping for mapping in mapping_data if mapping['Name'].upper() == item_name.upper()]
+            if len(item_mappings) > 0:
+                mapping = item_mappings[0]
+                axes.append({
+                    'name': item_name,
+                    'enabled': mapping['Enabled'].upper() == 'Y',
+                    'target': (mapping['Target'] or '').upper(),
+                    'multiplier': float(mapping['Multiplier']),
+                    'value_shift': float(mapping['ValueShift']),
+                    'smooth': mapping['Smooth'].upper() == 'Y',
+                    'filter': parse_channel_filter(mapping.get('Filter')),
+                    'curve': parse_response_curve(mapping.get('Curve'), named_curves)
+                })
+            else:
+                axes.append({'name': item_name, 'enabled': False, 'target': '', 'multiplier': 1.0, 'value_shift': 0.0, 'smooth': False, 'filter': None, 'curve': None})
+        rotations[bone_name] = axes
+
+    return {'blendshapes': blendshapes, 'rotations': rotations, 'matrix': compile_matrix_mapping(mapping_data, named_curves)}
+
+#######################################################################
+# Response curves
+# A mapping row's Curve reshapes its channel (after the 0-1 clip, before
+# the value shift & multiplier), as one of:
+#   a gamma                 "Gamma 0.7" (or just "0.7")
+#   control points (in:out) "0:0 0.7:1", linear between the points
+#   a named LUT             the Name of a Curve row, its Target holding
+#                           the outputs for evenly spaced inputs, such as
+#                           "0 0.4 0.8 1 1" (or control points)
+# Rotations are reshaped symmetrically, by their size.
+# Curves are compiled to a gamma or to the in & out points, so a channel
+# is reshaped in one vectorized np.interp (or power)
+#######################################################################
+def compile_named_curves(mapping_data):
+    named_curves = {}
+    for mapping in mapping_data:
+        if mapping['Type'].upper() == 'CURVE':
+            named_curves[mapping['Name'].strip().upper()] = parse_curve_points(mapping['Name'], mapping['Target'], True)
+    return named_curves
+
+def parse_response_curve(curve_text, named_curves):
+    curve_text = (curve_text or '').strip()
+    if curve_text == '':
+        return None
+    words = curve_text.split()
+    if words[0].upper() == 'GAMMA' and len(words) == 2:
+        return parse_curve_gamma(curve_text, words[1])
+    if len(words) == 1 and ':' not in curve_text and curve_text.upper() not in named_curves:
+        return parse_curve_gamma(curve_text, words[0])
+    if ':' in curve_text:
+        return parse_curve_points(curve_text, curve_text, False)
+    if curve_text.upper() in named_curves:
+        return named_curves[curve_text.upper()]
+    raise ValueError('Unknown Curve "' + curve_text + '" in the Mapping File. Use a gamma, in:out control points or the Name of a Curve row.')
+
+def parse_curve_gamma(curve_text, gamma_text):
+    try:
+        gamma = float(gamma_text)
+    except ValueError:
+        raise ValueError('Unknown Curve "' + curve_text + '" in the Mapping File. Use a gamma, in:out control points or the Name of a Curve row.')
+    if gamma <= 0:
+        raise ValueError('Invalid Curve "' + curve_text + '" in the Mapping File. The gamma must be above 0.')
+    return {'gamma': gamma}
+
+#control points ("in:out in:out ..."), or evenly spaced outputs for a LUT
+def parse_curve_points(curve_name, points_text, allow_lut):
+    words = (points_text or '').replace(',', ' ').split()
+    try:
+        if len(words) > 0 and all(':' in word for word in words):
+            points = sorted((float(word.split(':')[0]), float(word.split(':')[1])) for word in words)
+            inputs = [point[0] for point in points]
+            outputs = [point[1] for point in points]
+        elif allow_lut:
+            outputs = [float(word) for word in words]
+            inputs = np.linspace(0.0, 1.0, len(outputs)).tolist()
+        else:
+            raise ValueError()
+    except (ValueError, IndexError):
+        raise ValueError('Invalid Curve "' + curve_name + '" in the Mapping File. Use in:out control points' + (' or evenly spaced outputs.' if allow_lut else '.'))
+    if len(outputs) < 2 or len(set(inputs)) != len(inputs):
+        raise ValueError('Invalid Curve "' + curve_name + '" in the Mapping File. A curve needs 2 or more points, with different inputs.')
+    return {'inputs': inputs, 'outputs': outputs}
+
+#reshapes the values (0-1, or -1 to 1 for the rotations)
+def apply_response_curve(values, curve, symmetric=False):
+    if curve == None:
+        return values
+    if symmetric:
+        return np.sign(values) * apply_response_curve(np.abs(values), curve)
+    if 'gamma' in curve:
+        return np.power(values, curve['gamma'])
+    return np.interp(values, curve['inputs'], curve['outputs'])
+
+#undoes the curve where it can (rising curves), for the capture export
+def invert_response_curve(values, curve, symmetric=False):
+    if curve == None:
+        return values
+    if symmetric:
+        return np.sign(values) * invert_response_curve(np.abs(values), curve)
+    if 'gamma' in curve:
+        return np.power(np.clip(values, 0.0, None), 1.0 / curve['gamma'])
+    if np.all(np.diff(curve['outputs']) > 0):
+        return np.interp(values, curve['outputs'], curve['inputs'])
+    return values
+
+#######################################################################
+# Compiles the Matrix mapping rows
+# Each enabled Matrix row adds a weight (Multiplier) from an ARKit
+# channel (Name) to a target shape key (Target). A row named Bias adds
+# its ValueShift to the target instead. Only the non-zero weights are
+# kept, as (source, target, weight) entries. A channel is filtered with
+# the Filter (and reshaped by the Curve) of its first row that has one
+#######################################################################
+def compile_matrix_mapping(mapping_data, named_curves={}):
+    sources = []
+    targets = []
+    smooth = []
+    filters = []
+    curves = []
+    entries = []
+    bias = []
+    for mapping in mapping_data:
+        if mapping['Type'].upper() != 'MATRIX' or mapping['Enabled'].upper() != 'Y':
+            continue
+
+        target_name = (mapping['Target'] or '').strip()
+        if target_name == '':
+            continue
+        if target_name not in targets:
+            targets.append(target_name)
+            bias.append(0.0)
+        target_index = targets.index(target_name)
+
+        if mapping['Name'].upper() == 'BIAS':
+            bias[target_index] += float(mapping['ValueShift'])
+            continue
+
+        if mapping['Name'] not in blendShapeLabels:
+            continue
+        if mapping['Name'] not in sources:
+            sources.append(mapping['Name'])
+            smooth.append(False)
+            filters.append(None)
+            curves.append(None)
+        source_index = sources.index(mapping['Name'])
+        smooth[source_index] = smooth[source_index] or mapping['Smooth'].upper() == 'Y'
+        if filters[source_index] == None:
+            filters[source_index] = parse_channel_filter(mapping.get('Filter'))
+        if curves[source_index] == None:
+            curves[source_index] = parse_response_curve(mapping.get('Curve'), named_curves)
+
+        weight = float(mapping['Multiplier'])
+        if weight != 0.0:
+            entries.append([source_index, target_index, weight])
+
+    return {'sources': sources, 'targets': targets, 'smooth': smooth, 'filters': filters, 'curves': curves, 'entries': entries, 'bias': bias}
+
+def load_compiled_mapping(mapping_path):
+    if is_packed_path(mapping_path):
+        return read_packed_json(mapping_path)
+    return compile_mapping_data(list_csv_data(mapping_path))
+
+def get_compiled_mapping(mapping_path):
+    return get_cached_file_data(mapping_path, load_compiled_mapping)
+
+#######################################################################
+# gets the face zero data 
+# ARKit picks up the captured face's neautral weights differently
+# so this is used to offset thoes charcteristics and give a more natral result
+# the zero value is calulated by vareraging the middle thrid of frame values
+# if no zero face frames are provide, then it will default to 0
+#######################################################################
+def get_face_neutral_from_capture(shapekey_names, neutral_capture):
+    result = { shapekey_name : 0.0 for shapekey_name in shapekey_names }
+
+    if neutral_capture != None:
+        frame_start = int(neutral_capture['frame_count'] / 3)
+        frame_end = frame_start * 2
+        if frame_start > 0:
+            for shapekey_name in shapekey_names:
+                if shapekey_name in neutral_capture['channels']:
+                    values = np.clip(neutral_capture['channels'][shapekey_name][frame_start:frame_end], 0.0, 1.0)
+                    #cumsum adds in frame order, matching the tally
+                    result[shapekey_name] = round(float(np.cumsum(values)[-1]) / frame_start, 10)
+
+    return result
+
+#######################################################################
+# Detects the neutral from the capture itself, for takes without a
+# neutral recording. The stillest window is the one with the lowest
+# variance summed over all the blendshape channels; windows with no
+# variance at all are frozen (lost tracking) and are skipped.
+# The rolling sums come from cumulative sums, so the whole take is
+# covered in linear time. The neutral is the per channel median of the
+# stillest window, which ignores the odd twitch
+#######################################################################
+def find_stillest_window(values, window_frames):
+    #values are channel x frame, so the cumulative sums run along memory
+    frame_count = values.shape[1]
+    window_frames = max(min(window_frames, frame_count), 1)
+
+    #centre each channel first, to keep the cumulative sums small
+    values = values - values.mean(axis=1)[:, None]
+
+    #the summed variance is the window mean of the summed squares, less the
+    #summed squares of each channel's window mean
+    square_sums = np.zeros(frame_count + 1)
+    np.cumsum(np.einsum('ij,ij->j', values, values), out=square_sums[1:])
+    sums = np.zeros((values.shape[0], frame_count + 1))
+    np.cumsum(values, axis=1, out=sums[:, 1:])
+    window_means = sums[:, window_frames:] - sums[:, :-window_frames]
+    window_means /= window_frames
+    window_variances = (square_sums[window_frames:] - square_sums[:-window_frames]) / window_frames - np.einsum('ij,ij->j', window_means, window_means)
+
+    frozen = window_variances <= 1e-9
+    if not frozen.all():
+        window_variances[frozen] = np.inf
+    return int(np.argmin(window_variances)), window_frames
+
+def get_face_neutral_from_still_window(shapekey_names, capture, window_frames):
+    result = { shapekey_name : 0.0 for shapekey_name in shapekey_names }
+
+    channel_names = [shapekey_name for shapekey_name in shapekey_names if shapekey_name in capture['channels']]
+    if len(channel_names) > 0 and capture['frame_count'] > 0:
+        values = np.clip(np.stack([capture['channels'][channel_name] for channel_name in channel_names]), 0.0, 1.0)
+        window_start, window_frames = find_stillest_window(values, window_frames)
+        baseline = np.median(values[:, window_start:window_start + window_frames], axis=1)
+        for channel_name, value in zip(channel_names, baseline.tolist()):
+            result[channel_name] = round(value, 10)
+
+    return result
+
+def detect_capture_neutral(capture_path, window_frames):
+    return get_face_neutral_from_still_window(data_shapkey_names, get_capture_arrays(capture_path), window_frames)
+
+def get_detected_face_neutral(capture_path, window_frames):
+    return get_cached_file_data(capture_path, detect_capture_neutral, window_frames)
+
+def get_neutral_file_values(neutral_path):
+    if is_packed_path(neutral_path):
+        return read_packed_json(neutral_path)
+    if is_profile_path(neutral_path):
+        return read_neutral_profile(get_profile_name(neutral_path))['values']
+    return get_face_neutral_from_capture(data_shapkey_names, load_capture_arrays(neutral_path))
+
+def get_face_neutral(neutral_path):
+    if neutral_path == None or neutral_path == '':
+        return get_face_neutral_from_capture(data_shapkey_names, None)
+    return get_cached_file_data(neutral_path, get_neutral_file_values)
+
+#######################################################################
+# Tracking repair
+# When ARKit loses the face it keeps writing rows: frozen (repeating the
+# last values), zeroed, or with a different BlendShapeCount, and the
+# timecode can repeat or step back. Those rows are dropouts for every
+# channel. On top of that, a channel that jumps out and straight back by
+# more than the spike threshold is a spike, for that channel only.
+# Dropouts and spikes are filled by interpolating between the good frames
+# either side, or by holding the last good frame. Forward timecode jumps
+# (frames ARKit never wrote) are only reported, as the capture rows drive
+# the timing everywhere else.
+# Everything is whole array operations, so an hour long take is repaired
+# in a fraction of a second
+#######################################################################
+repair_frozen_frames = 3
+
+def get_runs(mask):
+    #the (start, end) of each run of True, end exclusive
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+def find_dropout_frames(capture, channel_names, timecode_keys=None):
+    frame_count = capture['frame_count']
+    reasons = {}
+    if frame_count == 0 or len(channel_names) == 0:
+        return reasons
+
+    values = np.stack([capture['channels'][channel_name] for channel_name in channel_names])
+
+    #zeroed rows
+    reasons['zeroed'] = np.all(values == 0.0, axis=0)
+
+    #frozen rows: the rows after the first of a run of identical rows
+    repeated = np.zeros(frame_count, dtype=bool)
+    repeated[1:] = np.all(values[:, 1:] == values[:, :-1], axis=0)
+    frozen = np.zeros(frame_count, dtype=bool)
+    for start, end in get_runs(repeated):
+        if end - start >= repair_frozen_frames - 1:
+            frozen[start:end] = True
+    reasons['frozen'] = frozen & ~reasons['zeroed']
+
+    #rows with a different blendshape count to most of the capture
+    blendshape_counts = capture['channels'].get('BlendShapeCount')
+    if blendshape_counts is not None:
+        counts, occurrences = np.unique(blendshape_counts, return_counts=True)
+        reasons['blendshape count'] = blendshape_counts != counts[np.argmax(occurrences)]
+
+    #rows whose timecode repeats or steps back
+    if timecode_keys is not None and len(timecode_keys) == frame_count:
+        out_of_sequence = np.zeros(frame_count, dtype=bool)
+        out_of_sequence[1:] = timecode_keys[1:] <= np.fmax.accumulate(timecode_keys)[:-1]
+        reasons['timecode out of sequence'] = out_of_sequence
+
+    return reasons
+
+def find_spike_frames(values, spike_threshold):
+    spikes = np.zeros(len(values), dtype=bool)
+    if len(values) > 2 and spike_threshold > 0:
+        into = values[1:-1] - values[:-2]
+        out_of = values[2:] - values[1:-1]
+        spikes[1:-1] = (np.abs(into) > spike_threshold) & (np.abs(out_of) > spike_threshold) & (np.sign(into) != np.sign(out_of))
+    return spikes
+
+def fill_frames(values, bad, fill):
+    good_frames = np.flatnonzero(~bad)
+    if len(good_frames) == 0 or len(good_frames) == len(values):
+        return values
+    if fill == 'HOLD':
+        #the last good frame (the first good frame before it)
+        source_frames = np.maximum.accumulate(np.where(bad, -1, np.arange(len(values))))
+        source_frames[source_frames < 0] = good_frames[0]
+        return values[source_frames]
+    return np.interp(np.arange(len(values)), good_frames, values[good_frames])
+
+def find_timecode_gaps(capture, timecode_keys):
+    gaps = []
+    if len(timecode_keys) != capture['frame_count'] or capture['frame_count'] < 2 or np.isnan(timecode_keys).all():
+        return gaps
+
+    #the timecode key is seconds * 1000 + frames
+    seconds = np.floor(timecode_keys / 1000)
+    frames = np.floor(timecode_keys - seconds * 1000)
+    frame_rate = np.nanmax(frames) + 1
+    frame_numbers = seconds * frame_rate + frames
+    steps = np.diff(frame_numbers)
+    for index in np.flatnonzero(steps > 1).tolist():
+        gaps.append({'row': capture['first_row'] + index + 1, 'missing_frames': int(steps[index]) - 1})
+    return gaps
+
+#######################################################################
+# Repairs the dropouts and spikes in the capture
+# Returns the repaired capture and the repaired spans (capture rows,
+# end exclusive) with the reason and the channels repaired
+#######################################################################
+def repair_capture(capture, fill='INTERPOLATE', spike_threshold=0.3):
+    channel_names = [name for name in data_shapkey_names + data_item_names if name in capture['channels']]
+    first_row = capture['first_row']
+    timecodes = capture['timecodes']
+    spans = []
+
+    def add_spans(mask, reason, channels):
+        for start, end in get_runs(mask):
+            spans.append({
+                'row_start': first_row + start,
+                'row_end': first_row + end,
+                'timecode': timecodes[start] if start < len(timecodes) else '',
+                'reason': reason,
+                'channels': channels})
+
+    timecode_keys = parse_timecode_keys(timecodes) if len(timecodes) == capture['frame_count'] else np.zeros(0)
+
+    #dropouts (every channel)
+    dropout_reasons = find_dropout_frames(capture, [name for name in data_shapkey_names if name in capture['channels']], timecode_keys)
+    dropouts = np.zeros(capture['frame_count'], dtype=bool)
+    for reason, mask in dropout_reasons.items():
+        add_spans(mask & ~dropouts, reason, 'all')
+        dropouts |= mask
+
+    channels = dict(capture['channels'])
+    for channel_name in channel_names:
+        values = channels[channel_name]
+        spikes = find_spike_frames(values, spike_threshold) & ~dropouts
+        add_spans(spikes, 'spike', channel_name)
+        if dropouts.any() or spikes.any():
+            channels[channel_name] = fill_frames(values, dropouts | spikes, fill)
+
+    for gap in find_timecode_gaps(capture, timecode_keys):
+        spans.append({
+            'row_start': gap['row'],
+            'row_end': gap['row'],
+            'timecode': timecodes[gap['row'] - first_row],
+            'reason': 'timecode gap (' + str(gap['missing_frames']) + ' missing frames)',
+            'channels': ''})
+
+    spans.sort(key=lambda span: span['row_start'])
+    return dict(capture, channels=channels), spans
+
+def list_repair_messages(repairs, max_messages=10):
+    if len(repairs) == 0:
+        return []
+
+    #the full list goes to the console
+    for span in repairs:
+        print('Applicator repair: rows ' + str(span['row_start']) + '-' + str(span['row_end']) + ' (' + span['timecode'] + ') ' + span['reason'] + ' ' + span['channels'])
+
+    repaired_frames = sum(span['row_end'] - span['row_start'] for span in repairs)
+    messages = ['Repaired ' + str(len(repairs)) + ' spans (' + str(repaired_frames) + ' capture frames):']
+    for span in repairs[:max_messages]:
+        message = '- ' + span['timecode'] + ' ' + span['reason']
+        frame_count = span['row_end'] - span['row_start']
+        if frame_count > 0:
+            message += ', ' + str(frame_count) + (' frame' if frame_count == 1 else ' frames')
+        if span['channels'] not in ('', 'all'):
+            message += ' (' + span['channels'] + ')'
+        messages.append(message)
+    if len(repairs) > max_messages:
+        messages.append('- ... see the system console for the full list')
+    return messages
+
+#######################################################################
+# Gets the number of frames either side of a frame used when smoothing
+#######################################################################
+def get_smooth_shift(smooth_frames):
+    smooth_shifts = {'S3': 1, 'S5': 2, 'S7': 3, 'S9': 4, 'S11': 5}
+    return smooth_shifts.get(smooth_frames, 0)
+
+#######################################################################
+# Smooths an array with a centred rolling average
+# Frames outside the capture are left out of the average.
+# The window is summed in frame order so the result matches the per frame loop
+#######################################################################
+def smooth_array(values, smooth_shift):
+    frame_count = len(values)
+    if smooth_shift <= 0 or frame_count == 0:
+        return values.copy()
+
+    padded = np.zeros(frame_count + smooth_shift * 2)
+    padded[smooth_shift:smooth_shift + frame_count] = values
+
+    range_sum = np.zeros(frame_count)
+    for x in range(smooth_shift * 2 + 1):
+        range_sum += padded[x:x + frame_count]
+
+    frame_numbers = np.arange(frame_count)
+    range_count = np.minimum(frame_numbers + smooth_shift, frame_count - 1) - np.maximum(frame_numbers - smooth_shift, 0) + 1
+    return range_sum / range_count
+
+#######################################################################
+# Causal filters
+# Unlike the rolling average these only use the frames before, so they
+# work on a stream, frame by frame, as well as on a loaded capture.
+#   One Euro    - a low pass whose cutoff rises with the speed: smooth
+#                 when slow, with little lag when fast
+#   Exponential - a one pole low pass
+#   Damped      - a critically damped spring (smoother for the same lag)
+# Each has a cutoff (Hz) and a beta, added to the cutoff per unit/second
+# of the channel's speed (the change between the capture frames, low
+# passed at filter_speed_cutoff), so with the speed known the filters
+# are linear steps.
+# A filter bank holds a few values per channel and steps all its
+# channels a frame at a time. Filtering arrays works out the speed and
+# cutoffs of every frame first, then solves the linear steps over whole
+# arrays in chunks (see solve_linear_steps), so a stream gets the same values as a
+# batch, to rounding
+#
+#   bank = Applicator.create_filter_bank([('ONE_EURO', 1.5, 2.0)] * 3)
+#   filtered = Applicator.step_filter_bank(bank, frame_values)
+#######################################################################
+capture_frame_rate = 60.0
+filter_speed_cutoff = 1.0
+filter_kinds = ('ONE_EURO', 'EXPONENTIAL', 'DAMPED')
+filter_kind_names = {'ONEEURO': 'ONE_EURO', 'EXPONENTIAL': 'EXPONENTIAL', 'EXP': 'EXPONENTIAL', 'DAMPED': 'DAMPED', 'CRITICALLYDAMPED': 'DAMPED'}
+
+#the (kind, cutoff, beta) of each kind when the mapping row gives no parameters
+default_channel_filters = {'ONE_EURO': ('ONE_EURO', 1.5, 2.0), 'EXPONENTIAL': ('EXPONENTIAL', 8.0, 0.0), 'DAMPED': ('DAMPED', 6.0, 0.0)}
+
+#parses a mapping row's Filter, such as "OneEuro 1.5 2" or "Damped 6"
+def parse_channel_filter(filter_text):
+    words = (filter_text or '').replace(',', ' ').split()
+    if len(words) == 0:
+        return None
+    kind = filter_kind_names.get(words[0].upper().replace('_', '').replace('-', ''))
+    if kind == None or len(words) > 3:
+        raise ValueError('Invalid Filter "' + filter_text + '" in the Mapping File. Use OneEuro, Exponential or Damped, then the cutoff (Hz) and beta.')
+    try:
+        parameters = tuple(float(word) for word in words[1:])
+    except ValueError:
+        raise ValueError('Invalid Filter "' + filter_text + '" in the Mapping File. The cutoff (Hz) and beta must be numbers.')
+    if len(parameters) > 0 and parameters[0] <= 0:
+        raise ValueError('Invalid Filter "' + filter_text + '" in the Mapping File. The cutoff (Hz) must be above 0.')
+    return (kind,) + parameters + default_channel_filters[kind][1 + len(parameters):]
+
+def create_filter_bank(channel_filters, frame_rate=capture_frame_rate):
+    frame_time = 1.0 / frame_rate
+    return {
+        'frame_time': frame_time,
+        'cutoff': np.array([channel_filter[1] for channel_filter in channel_filters], dtype=np.float64),
+        'beta': np.array([channel_filter[2] for channel_filter in channel_filters], dtype=np.float64),
+        'damped': np.array([channel_filter[0] == 'DAMPED' for channel_filter in channel_filters], dtype=bool),
+        'has_damped': any(channel_filter[0] == 'DAMPED' for channel_filter in channel_filters),
+        'speed_factor': get_smoothing_factor(filter_speed_cutoff, frame_time),
+        'values': None,
+        'last_values': None,
+        'speed': np.zeros(len(channel_filters)),
+        'velocity': np.zeros(len(channel_filters))
+    }
+
+#the one pole low pass factor for the cutoff (Hz)
+def get_smoothing_factor(cutoff, frame_time):
+    return 1.0 / (1.0 + 1.0 / (2 * math.pi * cutoff * frame_time))
+
+#the critically damped spring's decay over a frame, approximating exp(-omega * frame_time)
+def get_spring_decay(omega, frame_time):
+    x = omega * frame_time
+    return 1.0 / (1.0 + x + 0.48 * x * x + 0.235 * x * x * x)
+
+#filters a frame of values (one per channel), returning the filtered values
+def step_filter_bank(bank, values):
+    values = np.array(values, dtype=np.float64)
+    previous = bank['values']
+    if previous is None:
+        bank['values'] = values.copy()
+        bank['last_values'] = values
+        return bank['values']
+    frame_time = bank['frame_time']
+
+    #the cutoffs rise with the (low passed) speed
+    bank['speed'] += ((values - bank['last_values']) / frame_time - bank['speed']) * bank['speed_factor']
+    cutoff = bank['cutoff'] + bank['beta'] * np.abs(bank['speed'])
+    bank['last_values'] = values
+
+    #One Euro & exponential
+    filtered = previous + (values - previous) * get_smoothing_factor(cutoff, frame_time)
+
+    #critically damped spring
+    if bank['has_damped']:
+        omega = 2 * math.pi * cutoff
+        decay = get_spring_decay(omega, frame_time)
+        change = previous - values
+        spring = (bank['velocity'] + omega * change) * frame_time
+        bank['velocity'] = np.where(bank['damped'], (bank['velocity'] - omega * spring) * decay, 0.0)
+        filtered = np.where(bank['damped'], values + (change + spring) * decay, filtered)
+
+    bank['values'] = filtered
+    return filtered
+
+#filters the arrays (frame x channel) from the bank's state
+def filter_bank_arrays(bank, values):
+    values = np.asarray(values, dtype=np.float64)
+    channel_count = len(bank['cutoff'])
+    if len(values) == 0:
+        return np.empty((0, channel_count))
+    if bank['values'] is None:
+        #the first frame passes through
+        first = step_filter_bank(bank, values[0])
+        return np.concatenate([first[np.newaxis], filter_bank_arrays(bank, values[1:])])
+    frame_time = bank['frame_time']
+
+    #the (low passed) speed and the cutoffs of every frame
+    changes = np.diff(values, axis=0, prepend=bank['last_values'][np.newaxis]) / frame_time
+    speed_factor = bank['speed_factor']
+    speed = solve_linear_steps(np.full(values.shape, 1.0 - speed_factor), changes * speed_factor, bank['speed'])
+    bank['speed'] = speed[-1].copy()
+    cutoff = bank['cutoff'] + bank['beta'] * np.abs(speed)
+    bank['last_values'] = values[-1].copy()
+
+    filtered = np.empty(values.shape)
+    damped = bank['damped']
+    velocity = np.zeros(channel_count)
+
+    #One Euro & exponential: filtered = previous + (values - previous) * factor
+    if not np.all(damped):
+        factor = get_smoothing_factor(cutoff[:, ~damped], frame_time)
+        filtered[:, ~damped] = solve_linear_steps(1.0 - factor, values[:, ~damped] * factor, bank['values'][~damped])
+
+    #critically damped spring: the position & velocity step linearly
+    if np.any(damped):
+        omega = 2 * math.pi * cutoff[:, damped]
+        decay = get_spring_decay(omega, frame_time)
+        step = omega * frame_time
+        damped_values = values[:, damped]
+        position, velocity[damped] = solve_linear_pair_steps(
+            (decay * (1 + step), decay * frame_time, -decay * omega * step, decay * (1 - step)),
+            (damped_values * (1 - decay * (1 + step)), damped_values * decay * omega * step),
+            (bank['values'][damped], bank['velocity'][damped]))
+        filtered[:, damped] = position
+
+    bank['values'] = filtered[-1].copy()
+    bank['velocity'] = velocity
+    return filtered
+
+#######################################################################
+# Solves linear steps along the frames (the first axis):
+#   state[n] = factor[n] * state[n - 1] + offset[n]
+# from the initial state. The frames are split into chunks (about the
+# square root of the frame count): every chunk steps from a zero state
+# at once, a frame at a time, then the chunks' end states are joined in
+# order and each chunk adds its starting state, times its factors so
+# far. solve_linear_pair_steps does the same for a pair of states
+# (x, y) stepped by a 2x2 matrix
+#######################################################################
+def get_solve_chunks(frame_count, shape):
+    chunk_size = max(int(math.sqrt(frame_count)), 1)
+    chunk_count = -(-frame_count // chunk_size)
+    padding = chunk_count * chunk_size - frame_count
+
+    #padded with steps that keep the state
+    def split(values, padding_value):
+        values = np.concatenate([values, np.full((padding,) + shape[1:], padding_value)])
+        return values.reshape((chunk_count, chunk_size) + shape[1:])
+    return chunk_size, split
+
+def solve_linear_steps(factor, offset, initial):
+    frame_count = len(factor)
+    chunk_size, split = get_solve_chunks(frame_count, factor.shape)
+    factor, offset = split(factor, 1.0), split(offset, 0.0)
+    for frame_index in range(1, chunk_size):
+        offset[:, frame_index] += factor[:, frame_index] * offset[:, frame_index - 1]
+        factor[:, frame_index] *= factor[:, frame_index - 1]
+
+    state = initial
+    starts = np.empty((len(factor),) + factor.shape[2:])
+    for chunk_index in range(len(factor)):
+        starts[chunk_index] = state
+        state = factor[chunk_index, -1] * state + offset[chunk_index, -1]
+    offset += factor * starts[:, np.newaxis]
+    return offset.reshape((-1,) + offset.shape[2:])[:frame_count]
+
+def solve_linear_pair_steps(matrix, offset, initial):
+    frame_count = len(offset[0])
+    chunk_size, split = get_solve_chunks(frame_count, offset[0].shape)
+    m00, m01, m10, m11 = split(matrix[0], 1.0), split(matrix[1], 0.0), split(matrix[2], 0.0), split(matrix[3], 1.0)
+    x, y = split(offset[0], 0.0), split(offset[1], 0.0)
+    for frame_index in range(1, chunk_size):
+        step = (m00[:, frame_index].copy(), m01[:, frame_index].copy(), m10[:, frame_index].copy(), m11[:, frame_index].copy())
+        last = frame_index - 1
+        x[:, frame_index] += step[0] * x[:, last] + step[1] * y[:, last]
+        y[:, frame_index] += step[2] * x[:, last] + step[3] * y[:, last]
+        m00[:, frame_index] = step[0] * m00[:, last] + step[1] * m10[:, last]
+        m01[:, frame_index] = step[0] * m01[:, last] + step[1] * m11[:, last]
+        m10[:, frame_index] = step[2] * m00[:, last] + step[3] * m10[:, last]
+        m11[:, frame_index] = step[2] * m01[:, last] + step[3] * m11[:, last]
+
+    state_x, state_y = initial
+    starts_x, starts_y = np.empty((len(x),) + x.shape[2:]), np.empty((len(y),) + y.shape[2:])
+    for chunk_index in range(len(x)):
+        starts_x[chunk_index], starts_y[chunk_index] = state_x, state_y
+        state_x, state_y = (m00[chunk_index, -1] * state_x + m01[chunk_index, -1] * state_y + x[chunk_index, -1],
+                            m10[chunk_index, -1] * state_x + m11[chunk_index, -1] * state_y + y[chunk_index, -1])
+    x += m00 * starts_x[:, np.newaxis] + m01 * starts_y[:, np.newaxis]
+    return x.reshape((-1,) + x.shape[2:])[:frame_count], state_y
+
+#######################################################################
+# Sets the smoothing of each mapping row: False, True (the rolling
+# average) or its causal filter. A row's Filter overrides its Smooth;
+# with a causal Smoothing the rows with Smooth on use that filter
+#######################################################################
+def get_row_smoothing(smooth, channel_filter, smooth_frames):
+    if channel_filter != None and len(channel_filter) > 0:
+        return tuple(channel_filter)
+    if smooth and smooth_frames in default_channel_filters:
+        return default_channel_filters[smooth_frames]
+    return smooth
+
+def resolve_mapping_smoothing(compiled_mapping, smooth_frames):
+    resolved = dict(compiled_mapping)
+    resolved['blendshapes'] = [
+        dict(blendshape_mapping, smooth=get_row_smoothing(blendshape_mapping['smooth'], blendshape_mapping.get('filter'), smooth_frames))
+        for blendshape_mapping in compiled_mapping['blendshapes']]
+    resolved['rotations'] = {
+        bone_name: [dict(item_mapping, smooth=get_row_smoothing(item_mapping['smooth'], item_mapping.get('filter'), smooth_frames)) for item_mapping in item_mappings]
+        for bone_name, item_mappings in compiled_mapping['rotations'].items()}
+    if 'matrix' in compiled_mapping:
+        matrix_mapping = compiled_mapping['matrix']
+        filters = matrix_mapping.get('filters', [None] * len(matrix_mapping['sources']))
+        resolved['matrix'] = dict(matrix_mapping, smooth=[get_row_smoothing(smooth, channel_filter, smooth_frames) for smooth, channel_filter in zip(matrix_mapping['smooth'], filters)])
+    return resolved
+
+#the mapping without its rows' filters, for curves that are already smoothed
+def remove_mapping_filters(compiled_mapping):
+    unfiltered = dict(compiled_mapping)
+    unfiltered['blendshapes'] = [dict(blendshape_mapping, filter=None) for blendshape_mapping in compiled_mapping['blendshapes']]
+    unfiltered['rotations'] = {
+        bone_name: [dict(item_mapping, filter=None) for item_mapping in item_mappings]
+        for bone_name, item_mappings in compiled_mapping['rotations'].items()}
+    if 'matrix' in compiled_mapping:
+        unfiltered['matrix'] = dict(compiled_mapping['matrix'], filters=[None] * len(compiled_mapping['matrix']['sources']))
+    return unfiltered
+
+def uses_causal_filters(compiled_mapping, smooth_frames):
+    return len(list_filtered_channels(resolve_mapping_smoothing(compiled_mapping, smooth_frames))) > 0
+
+#the (channel, filter) pairs of the resolved mapping
+def list_filtered_channels(compiled_mapping):
+    channel_smoothing = [(blendshape_mapping['name'], blendshape_mapping['smooth']) for blendshape_mapping in compiled_mapping['blendshapes']]
+    for item_mappings in compiled_mapping['rotations'].values():
+        channel_smoothing.extend((item_mapping['name'], item_mapping['smooth']) for item_mapping in item_mappings if item_mapping['enabled'])
+    if 'matrix' in compiled_mapping:
+        channel_smoothing.extend(zip(compiled_mapping['matrix']['sources'], compiled_mapping['matrix']['smooth']))
+
+    filtered_channels = []
+    for channel_name, smooth in channel_smoothing:
+        if type(smooth) == tuple and (channel_name, smooth) not in filtered_channels:
+            filtered_channels.append((channel_name, smooth))
+    return filtered_channels
+
+#adds the filtered channels to the capture, all filtered in one bank
+def filter_capture_channels(capture, compiled_mapping):
+    filtered_channels = list_filtered_channels(compiled_mapping)
+    if len(filtered_channels) == 0:
+        return capture
+    values = np.zeros((capture['frame_count'], len(filtered_channels)))
+    for channel_index, (channel_name, channel_filter) in enumerate(filtered_channels):
+        if channel_name in capture['channels']:
+            values[:, channel_index] = capture['channels'][channel_name]
+    filtered = filter_bank_arrays(create_filter_bank([channel_filter for channel_name, channel_filter in filtered_channels]), values)
+    return dict(capture, filtered={filtered_channel: filtered[:, channel_index] for channel_index, filtered_channel in enumerate(filtered_channels)})
+
+#######################################################################
+# Gets the indices of the loaded capture frames applied to the scene
+# The apply pattern follows the row numbers in the capture file, so a
+# range load applies the same rows as a full load
+#######################################################################
+def list_apply_capture_indices(fps, capture, row_start, row_end):
+    apply_pattern = np.array(get_apply_pattern(fps), dtype=bool)
+    first_row = capture['first_row']
+    last_row = first_row + capture['frame_count']
+    if row_end != None:
+        last_row = min(last_row, row_end)
+    rows = np.arange(max(row_start, first_row), max(last_row, row_start, first_row))
+    return rows[apply_pattern[rows % len(apply_pattern)]] - first_row
+
+#######################################################################
+# Gets the processed channel values for the applied frames
+#######################################################################
+def get_channel_values(capture, channel_name, smooth, smooth_shift, capture_indices):
+    if type(smooth) == tuple:
+        #a causal filter (see filter_capture_channels)
+        return capture['filtered'][(channel_name, smooth)][capture_indices]
+    values = capture['channels'].get(channel_name)
+    if values is None:
+        values = np.zeros(capture['frame_count'])
+    if smooth:
+        values = smooth_array(values, smooth_shift)
+    return values[capture_indices]
+
+def process_blendshape_values(capture, blendshape_mapping, face_neutral, smooth_shift, capture_indices):
+    strength = get_channel_values(capture, blendshape_mapping['name'], blendshape_mapping['smooth'], smooth_shift, capture_indices)
+
+    #make sure the strength is within the range 0-1, reshape it, then apply the value shift and multiplier
+    strength = apply_response_curve(np.clip(strength, 0.0, 1.0), blendshape_mapping.get('curve'))
+    strength = (strength + blendshape_mapping['value_shift']) * blendshape_mapping['multiplier']
+
+    #apply the Neutralizer
+    #(Actual - Neutral)/(1-Neutral)
+    neutral = face_neutral.get(blendshape_mapping['name'], 0.0)
+    strength = (strength - neutral) / (1 - neutral)
+    return np.round(strength, 4)
+
+#######################################################################
+# Processes the Matrix mapping targets
+# The ARKit channels are clipped to 0-1 and neutralized, then mapped to
+# all the targets, for all the frames, a weight at a time
+#######################################################################
+def process_matrix_values(capture, matrix_mapping, face_neutral, smooth_shift, capture_indices):
+    targets = matrix_mapping['targets']
+    if len(targets) == 0:
+        return {}
+
+    sources = matrix_mapping['sources']
+    curves = matrix_mapping.get('curves', [None] * len(sources))
+    source_values = np.zeros((len(capture_indices), len(sources)))
+    for source_index, source_name in enumerate(sources):
+        strength = np.clip(get_channel_values(capture, source_name, matrix_mapping['smooth'][source_index], smooth_shift, capture_indices), 0.0, 1.0)
+        strength = apply_response_curve(strength, curves[source_index])
+        neutral = face_neutral.get(source_name, 0.0)
+        source_values[:, source_index] = (strength - neutral) / (1 - neutral)
+
+    weights = np.zeros((len(sources), len(targets)))
+    for source_index, target_index, weight in matrix_mapping['entries']:
+        weights[int(source_index), int(target_index)] += weight
+
+    #summed weight by weight in a fixed order, rather than a matrix multiply,
+    #so a frame's values don't depend on how many frames are processed together
+    target_values = np.zeros((len(capture_indices), len(targets)))
+    for source_index, target_index in zip(*np.nonzero(weights)):
+        target_values[:, target_index] += source_values[:, source_index] * weights[source_index, target_index]
+
+    target_values = np.round(target_values + np.array(matrix_mapping['bias']), 4)
+    return {target_name: target_values[:, target_index] for target_index, target_name in enumerate(targets)}
+
+def process_rotation_values(capture, item_mappings, smooth_shift, capture_indices, rotation_output='QUATERNION', rotation_order='XYZ'):
+    #the euler angles, with the yaw, pitch and roll on their target axes
+    rotation_eulers = np.zeros((len(capture_indices), 3))
+    for item_mapping in item_mappings:
+        if item_mapping['enabled'] and item_mapping['target'] in ('X', 'Y', 'Z'):
+            strength = get_channel_values(capture, item_mapping['name'], item_mapping['smooth'], smooth_shift, capture_indices)
+            strength = apply_response_curve(np.clip(strength, -1.0, 1.0), item_mapping.get('curve'), True)
+            strength = (strength + item_mapping['value_shift']) * item_mapping['multiplier']
+            rotation_eulers[:, 'XYZ'.index(item_mapping['target'])] = strength
+
+    if rotation_output == 'EULER':
+        return rotation_eulers
+
+    if rotation_output == 'LEGACY':
+        #the raw values in the quaternion's vector part, as face rigs before 0.8 expect
+        return np.concatenate((np.ones((len(capture_indices), 1)), rotation_eulers), axis=1)
+
+    return get_rotation_quaternions(rotation_eulers, rotation_order)
+
+#######################################################################
+# Multiplies two arrays of quaternions (frame x wxyz)
+#######################################################################
+def quaternion_multiply(a, b):
+    aw, ax, ay, az = a[:, 0], a[:, 1], a[:, 2], a[:, 3]
+    bw, bx, by, bz = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    return np.stack((
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw), axis=1)
+
+#######################################################################
+# Converts euler angles (frame x xyz) to normalized quaternions (frame x wxyz)
+# The rotation order is the order the axes are applied in, as in Blender
+# (XYZ rotates around X first). Each quaternion is flipped, if needed, into
+# the same hemisphere as the one before, so interpolating between keys
+# never takes the long way round
+#######################################################################
+def get_rotation_quaternions(rotation_eulers, rotation_order='XYZ'):
+    frame_count = len(rotation_eulers)
+    half_angles = rotation_eulers * 0.5
+
+    rotation_quaternions = None
+    for axis in rotation_order:
+        axis_index = 'XYZ'.index(axis)
+        axis_quaternions = np.zeros((frame_count, 4))
+        axis_quaternions[:, 0] = np.cos(half_angles[:, axis_index])
+        axis_quaternions[:, axis_index + 1] = np.sin(half_angles[:, axis_index])
+        if rotation_quaternions is None:
+            rotation_quaternions = axis_quaternions
+        else:
+            rotation_quaternions = quaternion_multiply(axis_quaternions, rotation_quaternions)
+
+    rotation_quaternions /= np.linalg.norm(rotation_quaternions, axis=1)[:, None]
+
+    #hemisphere continuity
+    if frame_count > 1:
+        dots = np.sum(rotation_quaternions[1:] * rotation_quaternions[:-1], axis=1)
+        flips = np.cumprod(np.where(dots < 0, -1.0, 1.0))
+        rotation_quaternions[1:] *= flips[:, None]
+
+    return rotation_quaternions
+
+#######################################################################
+# Converts quaternions (frame x wxyz) back to euler angles (frame x xyz)
+# in the rotation order, the inverse of get_rotation_quaternions
+#######################################################################
+def get_rotation_eulers(rotation_quaternions, rotation_order='XYZ'):
+    q = rotation_quaternions / np.linalg.norm(rotation_quaternions, axis=1)[:, None]
+    w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    matrices = np.empty((len(q), 3, 3))
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - w * z)
+    matrices[:, 0, 2] = 2 * (x * z + w * y)
+    matrices[:, 1, 0] = 2 * (x * y + w * z)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - w * x)
+    matrices[:, 2, 0] = 2 * (x * z - w * y)
+    matrices[:, 2, 1] = 2 * (y * z + w * x)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+
+    #the first (i), second (j) and last (k) axes applied, and the order's parity
+    i, j, k = ['XYZ'.index(axis) for axis in rotation_order]
+    parity = 1.0 if rotation_order in ('XYZ', 'YZX', 'ZXY') else -1.0
+
+    rotation_eulers = np.empty((len(q), 3))
+    rotation_eulers[:, j] = np.arcsin(np.clip(-parity * matrices[:, k, i], -1.0, 1.0))
+    rotation_eulers[:, i] = np.arctan2(parity * matrices[:, k, j], matrices[:, k, k])
+    rotation_eulers[:, k] = np.arctan2(parity * matrices[:, j, i], matrices[:, i, i])
+    return rotation_eulers
+
+#######################################################################
+# Sets the bone's rotation mode for the rotation output
+# Returns the rotation property the keys are written to
+#######################################################################
+def set_rotation_mode(pose_bone, rotation_output, rotation_order):
+    if rotation_output == 'EULER':
+        pose_bone.rotation_mode = rotation_order
+        return 'rotation_euler'
+
+    pose_bone.rotation_mode = 'QUATERNION'
+    return 'rotation_quaternion'
+
+#######################################################################
+# Processes the capture into the values applied to the rig
+# Applies the capture rows from row_start up to row_end. Rows loaded
+# either side of the range are only used as smoothing context.
+# Returns the number of scene frames, the blendshape values per blendshape name,
+# the matrix mapping values per target and the rotations per bone: quaternions (frame x wxyz), or euler angles
+# (frame x xyz) for the euler rotation output
+#######################################################################
+def process_capture(capture, face_neutral, compiled_mapping, fps, row_start, smooth_frames, row_end=None, rotation_output='QUATERNION', rotation_order='XYZ'):
+    smooth_shift = get_smooth_shift(smooth_frames)
+    compiled_mapping = resolve_mapping_smoothing(compiled_mapping, smooth_frames)
+    capture = filter_capture_channels(capture, compiled_mapping)
+    capture_indices = list_apply_capture_indices(fps, capture, row_start, row_end)
+
+    blendshapes = {}
+    for blendshape_mapping in compiled_mapping['blendshapes']:
+        blendshapes[blendshape_mapping['name']] = process_blendshape_values(capture, blendshape_mapping, face_neutral, smooth_shift, capture_indices)
+
+    #mappings packed before the matrix rows were added have no matrix
+    targets = {}
+    if 'matrix' in compiled_mapping:
+        targets = process_matrix_values(capture, compiled_mapping['matrix'], face_neutral, smooth_shift, capture_indices)
+
+    rotations = {}
+    for bone_name, item_mappings in compiled_mapping['rotations'].items():
+        rotations[bone_name] = process_rotation_values(capture, item_mappings, smooth_shift, capture_indices, rotation_output, rotation_order)
+
+    return {
+        'frame_count': len(capture_indices), 'blendshapes': blendshapes, 'targets': targets, 'rotations': rotations,
+        'rotation_output': rotation_output, 'rotation_order': rotation_order}
+
+#######################################################################
+# Gets the neutral selected in the Applicator properties
+#######################################################################
+def get_selected_face_neutral(props):
+    capture_path, neutral_path, mapping_path = get_data_paths(props)
+    return get_capture_face_neutral(capture_path, neutral_path, props.detect_neutral_frames if props.detect_neutral else None)
+
+#the neutral file's neutral, or else the one detected in the capture (when detect_neutral_frames isn't None)
+def get_capture_face_neutral(capture_path, neutral_path, detect_neutral_frames):
+    if (neutral_path == None or neutral_path == '') and detect_neutral_frames != None:
+        return get_detected_face_neutral(capture_path, detect_neutral_frames)
+    return get_face_neutral(neutral_path)
+
+#######################################################################
+# Processes the capture selected in the Applicator properties
+# Only the applied rows (plus the smoothing frames either side) are loaded
+#######################################################################
+def get_processed_capture(props, fps):
+    capture_path, neutral_path, mapping_path = get_data_paths(props)
+    smooth_shift = get_smooth_shift(props.smoothing_frames)
+    row_start, row_end = get_capture_row_range(capture_path, props.capture_in_timecode, props.capture_out_timecode, props.skip_capture_frames)
+    capture = get_capture_arrays(
+        capture_path,
+        max(row_start - smooth_shift, 0),
+        None if row_end == None else row_end + smooth_shift)
+    return process_loaded_capture(props, fps, capture, row_start, row_end)
+
+#processes the capture rows loaded for the applied rows
+def process_loaded_capture(props, fps, capture, row_start, row_end):
+    capture_path, neutral_path, mapping_path = get_data_paths(props)
+    repairs = []
+    if props.repair_tracking:
+        capture, repairs = repair_capture(capture, props.repair_fill, props.spike_threshold)
+    face_neutral = get_selected_face_neutral(props)
+    compiled_mapping = get_compiled_mapping(mapping_path)
+    processed = process_capture(capture, face_neutral, compiled_mapping, fps, row_start, props.smoothing_frames, row_end, props.rotation_output, props.rotation_order)
+    processed['repairs'] = list_applied_repairs(repairs, row_start, row_end)
+    return processed
+
+#######################################################################
+# Gets the capture rows applied to the scene frames from frame_start to
+# frame_end (with the capture rows from row_start applied from the start
+# frame), and the scene frame of the first of them
+# The apply pattern repeats, so the row of any applied frame is found
+# without going through the rows before it
+#######################################################################
+def get_frame_window_rows(fps, row_start, row_end, start_frame, frame_start, frame_end):
+    apply_pattern = np.array(get_apply_pattern(fps), dtype=bool)
+    pattern_positions = np.nonzero(np.roll(apply_pattern, -(row_start % len(apply_pattern))))[0]
+
+    def get_applied_row(frame_index):
+        return row_start + (frame_index // len(pattern_positions)) * len(apply_pattern) + int(pattern_positions[frame_index % len(pattern_positions)])
+
+    first_index = max(frame_start - start_frame, 0)
+    last_index = frame_end - start_frame
+    if last_index < first_index:
+        return row_start, row_start, start_frame
+    window_start = get_applied_row(first_index)
+    window_end = get_applied_row(last_index) + 1
+    if row_end != None:
+        window_start = min(window_start, row_end)
+        window_end = min(window_end, row_end)
+    return window_start, window_end, start_frame + first_index
+
+#######################################################################
+# Gets the capture rows loaded to process the window_start to window_end
+# rows of the applied rows (row_start to row_end): the smoothing frames
+# either side. The tracking repair fills a dropout from the good frames
+# either side of it, which can be outside the window, so with it the
+# applied rows are loaded (and repaired) whole, as applying them does.
+# The causal filters are stepped from the first loaded row, so with them
+# the rows are loaded from there, as applying them does
+#######################################################################
+def get_window_load_rows(row_start, row_end, window_start, window_end, smooth_shift, repair_tracking, causal_filters):
+    if repair_tracking:
+        return max(row_start - smooth_shift, 0), None if row_end == None else row_end + smooth_shift
+    if causal_filters:
+        return max(row_start - smooth_shift, 0), window_end + smooth_shift
+    return max(window_start - smooth_shift, 0), window_end + smooth_shift
+
+#######################################################################
+# Processes the capture rows applied to the scene frames from frame_start
+# to frame_end, with the options in the Applicator properties, loading
+# the rows get_window_load_rows needs. Returns the processed capture and
+# the scene frame of its first frame
+#######################################################################
+def get_processed_frame_window(props, fps, frame_start, frame_end):
+    capture_path, neutral_path, mapping_path = get_data_paths(props)
+    smooth_shift = get_smooth_shift(props.smoothing_frames)
+    row_start, row_end = get_capture_row_range(capture_path, props.capture_in_timecode, props.capture_out_timecode, props.skip_capture_frames)
+    window_start, window_end, window_start_frame = get_frame_window_rows(fps, row_start, row_end, props.start_frame, frame_start, frame_end)
+    causal_filters = uses_causal_filters(get_compiled_mapping(mapping_path), props.smoothing_frames)
+    load_start, load_end = get_window_load_rows(row_start, row_end, window_start, window_end, smooth_shift, props.repair_tracking, causal_filters)
+    capture = get_capture_arrays(capture_path, load_start, load_end)
+    return process_loaded_capture(props, fps, capture, window_start, window_end), window_start_frame
+
+#only report the repairs in the applied rows
+def list_applied_repairs(repairs, row_start, row_end):
+    return [span for span in repairs if span['row_end'] > row_start and (row_end == None or span['row_start'] < row_end)]
+
+#######################################################################
+# Parallel apply
+# A long capture is split into row shards, and each shard is parsed and
+# processed in a background Blender. A shard loads the smoothing frames
+# either side of its rows as context, so its values are the same as in
+# a single process run; the rotations come back as euler angles and are
+# turned into quaternions once the shards are joined, so the hemisphere
+# continuity runs across the whole take.
+# The tracking repair and the causal filters need the whole take, so
+# with them the workers only parse their rows and the joined capture is
+# processed here.
+# Jobs and results are passed as temporary JSON and .npz files; the
+# joined result is keyed on the rig as usual, one bulk write per F-Curve
+#######################################################################
+parallel_apply_min_rows = 36000
+
+def can_apply_in_parallel(props, fps):
+    capture_path, neutral_path, mapping_path = get_data_paths(props)
+    if props.apply_workers < 2 or is_packed_path(capture_path) or is_capture_archive(capture_path) or is_take_archive(capture_path) or get_ingested_capture_path(capture_path) != None:
+        return False
+    row_start, row_end = get_capture_row_range(capture_path, props.capture_in_timecode, props.capture_out_timecode, props.skip_capture_frames)
+    row_count = len(get_capture_index(capture_path)['offsets']) - 1
+    return (row_count if row_end == None else min(row_end, row_count)) - row_start >= parallel_apply_min_rows
+
+#splits the rows from row_start up to row_end into shard ranges
+def list_shard_ranges(row_start, row_end, shard_count):
+    bounds = np.linspace(row_start, row_end, shard_count + 1).round().astype(np.int64)
+    return [(int(bounds[x]), int(bounds[x + 1])) for x in range(shard_count)]
+
+#runs in the background Blender
+def run_shard_job(job_path):
+    with open(job_path) as job_file:
+        job = json.load(job_file)
+
+    capture = load_capture_arrays(job['capture_path'], job['load_start'], job['load_end'])
+    arrays = {}
+    if job['process']:
+        processed = process_capture(
+            capture, job['face_neutral'], job['compiled_mapping'], job['fps'], job['row_start'], job['smoothing_frames'], job['row_end'],
+            job['rotation_output'], job['rotation_order'])
+        arrays['frame_count'] = np.array(processed['frame_count'])
+        for blendshape_name, values in processed['blendshapes'].items():
+            arrays['blendshape:' + blendshape_name] = values
+        for target_name, values in processed['targets'].items():
+            arrays['target:' + target_name] = values
+        for bone_name, rotations in processed['rotations'].items():
+            arrays['rotation:' + bone_name] = rotations
+    else:
+        arrays['frame_count'] = np.array(capture['frame_count'])
+        arrays['timecodes'] = np.array(capture['timecodes'], dtype=str)
+        for channel_name, values in capture['channels'].items():
+            arrays['channel:' + channel_name] = values
+
+    np.savez(job['output_path'], **arrays)
+
+def run_shard_workers(job_paths):
+    module_directory, module_file_name = os.path.split(os.path.abspath(__file__))
+    module_name = os.path.splitext(module_file_name)[0]
+    python_expr = 'import sys; sys.path.insert(0, %r); import %s; %s.run_shard_job(sys.argv[-1])' % (module_directory, module_name, module_name)
+
+    processes = []
+    for job_path in job_paths:
+        processes.append(subprocess.Popen(
+            [bpy.app.binary_path, '-b', '--factory-startup', '--python-exit-code', '1', '--python-expr', python_expr, '--', job_path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE))
+
+    errors = []
+    for process in processes:
+        stdout, stderr = process.communicate()
+        if process.returncode != 0:
+            error_lines = stderr.decode('utf-8', 'replace').strip().splitlines()
+            errors.append(error_lines[-1] if len(error_lines) > 0 else 'exit code ' + str(process.returncode))
+    if len(errors) > 0:
+        raise ValueError('Parallel apply worker failed: ' + errors[0])
+
+def join_shard_captures(results, first_row):
+    channels = {}
+    for file_name in results[0].files:
+        if file_name.startswith('channel:'):
+            channels[file_name[len('channel:'):]] = np.concatenate([result[file_name] for result in results])
+    return {
+        'first_row': first_row,
+        'frame_count': sum(int(result['frame_count']) for result in results),
+        'timecodes': [timecode for result in results for timecode in result['timecodes'].tolist()],
+        'channels': channels
+    }
+
+def join_shard_processed(results, compiled_mapping, rotation_output, rotation_order):
+    blendshapes = {}
+    for blendshape_mapping in compiled_mapping['blendshapes']:
+        blendshapes[blendshape_mapping['name']] = np.concatenate([result['blendshape:' + blendshape_mapping['name']] for result in results])
+
+    targets = {}
+    if 'matrix' in compiled_mapping:
+        for target_name in compiled_mapping['matrix']['targets']:
+            targets[target_name] = np.concatenate([result['target:' + target_name] for result in results])
+
+    rotations = {}
+    for bone_name in compiled_mapping['rotations'].keys():
+        rotations[bone_name] = np.concatenate([result['rotation:' + bone_name] for result in results])
+        if rotation_output == 'QUATERNION':
+            rotations[bone_name] = get_rotation_quaternions(rotations[bone_name], rotation_order)
+
+    return {
+        'frame_count': sum(int(result['frame_count']) for result in results), 'blendshapes': blendshapes, 'targets': targets, 'rotations': rotations,
+        'rotation_output': rotation_output, 'rotation_order': rotation_order, 'repairs': []}
+
+def get_processed_capture_in_parallel(props, fps):
+    capture_path, neutral_path, mapping_path = get_data_paths(props)
+    capture_path = os.path.abspath(capture_path)
+    smooth_shift = get_smooth_shift(props.smoothing_frames)
+    row_start, row_end = get_capture_row_range(capture_path, props.capture_in_timecode, props.capture_out_timecode, props.skip_capture_frames)
+    row_count = len(get_capture_index(capture_path)['offsets']) - 1
+    apply_end = row_count if row_end == None else min(row_end, row_count)
+    face_neutral = get_selected_face_neutral(props)
+    compiled_mapping = get_compiled_mapping(mapping_path)
+    process_shards = not props.repair_tracking and not uses_causal_filters(compiled_mapping, props.smoothing_frames)
+
+    #the shards split the applied rows (processed in the workers), or the loaded rows (parsed only)
+    if process_shards:
+        shard_ranges = list_shard_ranges(row_start, apply_end, props.apply_workers)
+    else:
+        load_start = max(row_start - smooth_shift, 0)
+        shard_ranges = list_shard_ranges(load_start, min(apply_end + smooth_shift, row_count), props.apply_workers)
+
+    with tempfile.TemporaryDirectory(prefix='applicator_') as work_directory:
+        job_paths = []
+        for shard_index, (shard_start, shard_end) in enumerate(shard_ranges):
+            job = {
+                'capture_path': capture_path,
+                'load_start': max(shard_start - smooth_shift, 0) if process_shards else shard_start,
+                'load_end': shard_end + smooth_shift if process_shards else shard_end,
+                'row_start': shard_start,
+                'row_end': shard_end,
+                'process': process_shards,
+                'face_neutral': {name: float(value) for name, value in face_neutral.items()},
+                'compiled_mapping': compiled_mapping,
+                'fps': fps,
+                'smoothing_frames': props.smoothing_frames,
+                'rotation_output': 'EULER' if props.rotation_output == 'QUATERNION' else props.rotation_output,
+                'rotation_order': props.rotation_order,
+                'output_path': os.path.join(work_directory, 'shard%03d.npz' % shard_index)
+            }
+            job_paths.append(os.path.join(work_directory, 'shard%03d.json' % shard_index))
+            with open(job_paths[-1], 'w') as job_file:
+                json.dump(job, job_file)
+
+        run_shard_workers(job_paths)
+        results = [np.load(os.path.join(work_directory, 'shard%03d.npz' % shard_index)) for shard_index in range(len(shard_ranges))]
+        try:
+            if process_shards:
+                return join_shard_processed(results, compiled_mapping, props.rotation_output, props.rotation_order)
+            return process_loaded_capture(props, fps, join_shard_captures(results, shard_ranges[0][0]), row_start, row_end)
+        finally:
+            for result in results:
+                result.close()
+
+#######################################################################
+# Writes keyframes to an F-Curve of the object's action
+# Empty F-Curves are filled in one go; otherwise the keyframes are inserted
+# one by one, replacing any keyframe already on the same frame
+#######################################################################
+def write_keyframes(target_object, data_path, index, group_name, frames, values):
+    if len(frames) == 0:
+        return
+
+    fcurve = get_action_fcurve(target_object, data_path, index, group_name)
+    if len(fcurve.keyframe_points) == 0:
+        coordinates = np.empty(len(frames) * 2, dtype=np.float32)
+        coordinates[0::2] = frames
+        coordinates[1::2] = values
+        fcurve.keyframe_points.add(len(frames))
+        fcurve.keyframe_points.foreach_set('co', coordinates)
+    else:
+        for frame, value in zip(frames.tolist(), values.tolist()):
+            fcurve.keyframe_points.insert(frame, value, options={'FAST'})
+
+    fcurve.update()
+
+#gets the F-Curve of the object's action (adding the action & F-Curve if needed)
+def get_action_fcurve(target_object, data_path, index, group_name):
+    if target_object.animation_data == None:
+        target_object.animation_data_create()
+    if target_object.animation_data.action == None:
+        target_object.animation_data.action = bpy.data.actions.new(name=target_object.name + 'Action')
+    action = target_object.animation_data.action
+
+    fcurve = action.fcurves.find(data_path, index=index)
+    if fcurve == None:
+        fcurve = action.fcurves.new(data_path, index=index, action_group=group_name)
+    return fcurve
+
+#######################################################################
+# Splices keyframes into an F-Curve of the object's action
+# Only the keys from the first to the last frame are replaced; the
+# keys outside (hand edits included) are left as they are. The blend
+# frames at each edge are mixed with the curve's old values, ramping
+# from the old to the new values, so the splice has no step.
+# The keys are found by bisecting and removed/inserted one by one, so
+# the Python work is in proportion to the frames spliced, not the curve
+#######################################################################
+def splice_keyframes(target_object, data_path, index, group_name, frames, values, blend_frames=0):
+    if len(frames) == 0:
+        return
+
+    fcurve = get_action_fcurve(target_object, data_path, index, group_name)
+    keyframe_points = fcurve.keyframe_points
+    if len(keyframe_points) == 0:
+        write_keyframes(target_object, data_path, index, group_name, frames, values)
+        return
+
+    #blend the edges (with the old values, before they're removed)
+    blend_count = min(blend_frames, len(frames) // 2)
+    if blend_count > 0:
+        values = np.array(values, dtype=np.float64)
+        for x in range(blend_count):
+            weight = (x + 1) / (blend_count + 1)
+            values[x] = weight * values[x] + (1 - weight) * fcurve.evaluate(float(frames[x]))
+            values[-1 - x] = weight * values[-1 - x] + (1 - weight) * fcurve.evaluate(float(frames[-1 - x]))
+
+    #remove the old keys in the frame range (from the end, so the indices hold)
+    first_index = find_keyframe_index(keyframe_points, frames[0] - 0.5)
+    last_index = find_keyframe_index(keyframe_points, frames[-1] + 0.5)
+    for x in range(last_index - 1, first_index - 1, -1):
+        keyframe_points.remove(keyframe_points[x], fast=True)
+
+    for frame, value in zip(frames.tolist(), values.tolist()):
+        keyframe_points.insert(frame, value, options={'FAST'})
+    fcurve.update()
+
+#the index of the first keyframe at or after the frame (the keys are sorted)
+def find_keyframe_index(keyframe_points, frame):
+    low = 0
+    high = len(keyframe_points)
+    while low < high:
+        middle = (low + high) // 2
+        if keyframe_points[middle].co[0] < frame:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+#######################################################################
+# Flips the spliced quaternions onto the hemisphere of the keyed
+# rotation just before them, so the splice doesn't flip the rotation
+#######################################################################
+def align_to_keyed_quaternion(target_object, data_path, frame, rotations):
+    if target_object.animation_data == None or target_object.animation_data.action == None:
+        return rotations
+    fcurves = [target_object.animation_data.action.fcurves.find(data_path, index=index) for index in range(4)]
+    if None in fcurves or len(rotations) == 0:
+        return rotations
+    keyed_rotation = np.array([fcurve.evaluate(frame) for fcurve in fcurves])
+    if np.dot(keyed_rotation, rotations[0]) < 0:
+        return -rotations
+    return rotations
+
+#writes the keys, or splices them in with the blend frames
+def get_keyframe_writer(blend_frames):
+    if blend_frames == None:
+        return write_keyframes
+    return lambda target_object, data_path, index, group_name, frames, values: splice_keyframes(target_object, data_path, index, group_name, frames, values, blend_frames)
+
+#######################################################################
+# Keys the processed capture on the face rig, from the start frame
+# With blend_frames, the keys are spliced into the frames of the
+# processed capture (see splice_keyframes) instead
+#######################################################################
+def apply_processed_capture(target_rig, processed, start_frame, apply_shapekey_data=True, apply_rotation_data=True, blend_frames=None, write_curve=None):
+    #the scene frames the processed capture frames are applied to
+    frames = np.arange(processed['frame_count']) + start_frame
+    curve_count = 0
+    if write_curve == None:
+        write_curve = get_keyframe_writer(blend_frames)
+
+    #apply ShapeKey data
+    if apply_shapekey_data == True:
+        for bone_name in ['Eye_R', 'Eye_L', 'Brows', 'Nose', 'Mouth']:
+            if bone_name in target_rig.pose.bones:
+                prop_bone = target_rig.pose.bones[bone_name]
+                for blendshape_name, values in processed['blendshapes'].items():
+                    #skip the property if it doesn't exist
+                    blendShapeLabel = blendShapeLabels[blendshape_name]
+                    if prop_bone.get(blendShapeLabel) != None:
+                        data_path = 'pose.bones["' + bone_name + '"]["' + blendShapeLabel + '"]'
+                        write_curve(target_rig, data_path, 0, bone_name, frames, values)
+                        curve_count += 1
+
+        #matrix mapping targets
+        if 'Targets' in target_rig.pose.bones:
+            prop_bone = target_rig.pose.bones['Targets']
+            for target_name, values in processed['targets'].items():
+                if prop_bone.get(target_name) != None:
+                    data_path = 'pose.bones["Targets"]["' + target_name + '"]'
+                    write_curve(target_rig, data_path, 0, 'Targets', frames, values)
+                    curve_count += 1
+
+    #apply rotation data
+    if apply_rotation_data == True:
+        for bone_name, rotations in processed['rotations'].items():
+            if bone_name in target_rig.pose.bones:
+                rotation_path = set_rotation_mode(target_rig.pose.bones[bone_name], processed['rotation_output'], processed['rotation_order'])
+                data_path = 'pose.bones["' + bone_name + '"].' + rotation_path
+                if blend_frames != None and rotation_path == 'rotation_quaternion':
+                    rotations = align_to_keyed_quaternion(target_rig, data_path, start_frame - 1, rotations)
+                for index in range(rotations.shape[1]):
+                    write_curve(target_rig, data_path, index, bone_name, frames, rotations[:, index])
+                    curve_count += 1
+
+    return curve_count
+
+#######################################################################
+# Gets the shape key each processed value is applied to
+#######################################################################
+def list_shape_key_values(processed, compiled_mapping):
+    shape_key_values = {}
+    for blendshape_mapping in compiled_mapping['blendshapes']:
+        target_name = blendshape_mapping.get('target', blendshape_mapping['name'])
+        if target_name != '' and blendshape_mapping['name'] in processed['blendshapes']:
+            shape_key_values[target_name] = processed['blendshapes'][blendshape_mapping['name']]
+    shape_key_values.update(processed['targets'])
+    return shape_key_values
+
+#######################################################################
+# Bakes the processed shape key values straight onto the meshes' shape
+# keys, from the start frame. The F-Curves are written once, into one
+# action all the meshes' shape keys share (the action already on one of
+# them, or a new one), so the cost doesn't grow with the mesh count.
+# Clearing removes the baked shape keys' F-Curves before writing; with
+# blend_frames, the keys are spliced in instead (see splice_keyframes).
+# Returns the number of F-Curves written and the number of baked shape
+# keys that are also driven (the drivers override the keys)
+#######################################################################
+def bake_processed_capture(target_meshes, processed, compiled_mapping, start_frame, clear_existing_keyframes=False, blend_frames=None, write_curve=None):
+    frames = np.arange(processed['frame_count']) + start_frame
+    if write_curve == None:
+        write_curve = get_keyframe_writer(blend_frames)
+    shape_keys = []
+    for target_mesh in target_meshes:
+        if target_mesh.shape_keys != None and target_mesh.shape_keys not in shape_keys:
+            shape_keys.append(target_mesh.shape_keys)
+    if len(shape_keys) == 0:
+        return 0, 0
+
+    action = None
+    for shape_key in shape_keys:
+        if action == None and shape_key.animation_data != None and shape_key.animation_data.action != None:
+            action = shape_key.animation_data.action
+    if action == None:
+        action = bpy.data.actions.new(name='ApplicatorShapeKeysAction')
+    for shape_key in shape_keys:
+        if shape_key.animation_data == None:
+            shape_key.animation_data_create()
+        shape_key.animation_data.action = action
+
+    shape_key_names = set(key_block.name for shape_key in shape_keys for key_block in shape_key.key_blocks)
+    curve_count = 0
+    driven_count = 0
+    for shape_key_name, values in list_shape_key_values(processed, compiled_mapping).items():
+        if shape_key_name in shape_key_names:
+            data_path = 'key_blocks["' + shape_key_name + '"].value'
+            if clear_existing_keyframes and blend_frames == None:
+                fcurve = action.fcurves.find(data_path)
+                if fcurve != None:
+                    action.fcurves.remove(fcurve)
+            write_curve(shape_keys[0], data_path, 0, 'ShapeKeys', frames, values)
+            curve_count += 1
+            if any(shape_key.animation_data.drivers.find(data_path) != None for shape_key in shape_keys):
+                driven_count += 1
+    return curve_count, driven_count
+
+#######################################################################
+# Progressive apply
+# Keys the take roughly straight away, then swaps in the full result.
+# A background thread (so Apply returns straight away) builds the coarse
+# pass first: every 4th applied frame, unsmoothed, read row by row
+# through the capture index (or picked out of a capture already in the
+# cache), so it doesn't wait for the parse; the F-Curves interpolate
+# between them. Until the capture is loaded, a detected neutral is
+# detected in those rows. The thread then loads, repairs & processes the
+# capture as Apply does. A timer keys the coarse pass once it's ready (clearing the
+# existing keyframes by removing their F-Curves), then rewrites the
+# F-Curves with the processed values, as many as fit in a tick, so the
+# UI isn't blocked. F-Curves with no keys before the apply are written
+# again in one go; the others have the keys inserted, as Apply does, so
+# the keys end up the same as a normal Apply's.
+# Data packed into the .blend (and profiles) is only read here, so it's
+# loaded before the thread starts. Opening a file cancels the job
+#######################################################################
+progressive_coarse_step = 4
+progressive_tick_time = 0.02
+progressive_state = {'generation': 0, 'job': None, 'status': None}
+
+def start_progressive_apply(scene, props, target_rig, fps):
+    cancel_progressive_apply()
+    capture_path, neutral_path, mapping_path = get_data_paths(props)
+
+    #the ShapeKey data is keyed on the rig, or baked on the meshes
+    rig_shapekey_data = props.apply_shapekey_data and props.shape_key_output == 'RIG'
+    target_meshes = []
+    if props.apply_shapekey_data and props.shape_key_output == 'BAKE':
+        target_meshes = [scene.app_head_mesh_target] + list_extra_meshes(scene.app_extra_meshes_target, scene.app_head_mesh_target)
+
+    job = {
+        'target_rig': target_rig, 'target_meshes': target_meshes, 'start_frame': props.start_frame,
+        'rig_shapekey_data': rig_shapekey_data, 'apply_rotation_data': props.apply_rotation_data,
+        'clear_existing_keyframes': props.clear_existing_keyframes, 'coarse_keyed': False, 'keyed_curves': None,
+        'curves': None, 'curve_index': 0, 'driven_count': 0}
+    settings = (
+        capture_path, neutral_path, mapping_path, props.detect_neutral_frames if props.detect_neutral else None,
+        props.capture_in_timecode, props.capture_out_timecode, props.skip_capture_frames, fps, props.smoothing_frames,
+        props.rotation_output, props.rotation_order, props.repair_tracking, props.repair_fill, props.spike_threshold)
+    loaded = None
+    if any(is_packed_path(file_path) or is_profile_path(file_path) for file_path in (capture_path, neutral_path, mapping_path)):
+        loaded = load_progressive_data(settings)
+
+    generation = progressive_state['generation']
+    progressive_state['job'] = job
+    progressive_state['status'] = 'Loading the capture...'
+    thread = threading.Thread(target=run_progressive_process, args=(job, settings, loaded, generation), daemon=True)
+    thread.start()
+    bpy.app.timers.register(lambda: run_progressive_apply(generation), first_interval=progressive_tick_time)
+
+#loads the applied rows (plus the smoothing frames either side), the neutral and the mapping
+def load_progressive_data(settings):
+    capture_path, neutral_path, mapping_path, detect_neutral_frames, in_timecode, out_timecode, skip_capture_frames = settings[:7]
+    smoothing_frames = settings[8]
+    smooth_shift = get_smooth_shift(smoothing_frames)
+    row_start, row_end = get_capture_row_range(capture_path, in_timecode, out_timecode, skip_capture_frames)
+    capture = get_capture_arrays(capture_path, max(row_start - smooth_shift, 0), None if row_end == None else row_end + smooth_shift)
+    face_neutral = get_capture_face_neutral(capture_path, neutral_path, detect_neutral_frames)
+    return capture, row_start, row_end, face_neutral, get_compiled_mapping(mapping_path)
+
+#processes the coarse pass from every progressive_coarse_step-th applied row (and the last),
+#reading only those rows unless the capture is already loaded or cached
+def process_progressive_coarse(settings, loaded):
+    capture_path, neutral_path, mapping_path, detect_neutral_frames, in_timecode, out_timecode, skip_capture_frames, fps = settings[:8]
+    smoothing_frames, rotation_output, rotation_order = settings[8:11]
+    if loaded != None:
+        capture, row_start, row_end, face_neutral, compiled_mapping = loaded
+    else:
+        row_start, row_end = get_capture_row_range(capture_path, in_timecode, out_timecode, skip_capture_frames)
+        smooth_shift = get_smooth_shift(smoothing_frames)
+        capture = find_cached_file_data(capture_path, load_capture_arrays, 0, None)
+        if capture == None:
+            capture = find_cached_file_data(capture_path, load_capture_arrays, max(row_start - smooth_shift, 0), None if row_end == None else row_end + smooth_shift)
+        compiled_mapping = get_compiled_mapping(mapping_path)
+
+    if capture == None:
+        row_count = len(get_capture_index(capture_path)['timecodes'])
+        applied_rows = list_apply_capture_indices(fps, {'first_row': 0, 'frame_count': row_count}, row_start, row_end)
+    else:
+        applied_rows = list_apply_capture_indices(fps, capture, row_start, row_end) + capture['first_row']
+    frame_indices = get_decimated_indices(len(applied_rows), progressive_coarse_step)
+    rows = applied_rows[frame_indices]
+    coarse_capture = load_capture_rows(capture_path, rows) if capture == None else select_capture_rows(capture, rows)
+
+    if loaded == None:
+        face_neutral = get_progressive_coarse_neutral(capture_path, neutral_path, detect_neutral_frames, coarse_capture, rows)
+
+    #every row of the coarse capture is applied (as at 60 fps)
+    coarse = process_capture(coarse_capture, face_neutral, compiled_mapping, 60, 0, 'S0', None, rotation_output, rotation_order)
+    coarse['frame_indices'] = frame_indices
+    return coarse, compiled_mapping
+
+#the neutral for the coarse pass: a detected neutral not in the cache yet is detected in the coarse rows
+def get_progressive_coarse_neutral(capture_path, neutral_path, detect_neutral_frames, coarse_capture, rows):
+    if (neutral_path == None or neutral_path == '') and detect_neutral_frames != None:
+        face_neutral = find_cached_file_data(capture_path, detect_capture_neutral, detect_neutral_frames)
+        if face_neutral == None and len(rows) > 0:
+            #the window covers about as many capture rows
+            window_frames = max(int(round(detect_neutral_frames * len(rows) / (rows[-1] - rows[0] + 1))), 1)
+            face_neutral = get_face_neutral_from_still_window(data_shapkey_names, coarse_capture, window_frames)
+        if face_neutral != None:
+            return face_neutral
+    return get_capture_face_neutral(capture_path, neutral_path, None)
+
+#processes the coarse pass, then loads and processes the capture as Apply does (on the background thread)
+def run_progressive_process(job, settings, loaded, generation):
+    fps, smoothing_frames, rotation_output, rotation_order, repair_tracking, repair_fill, spike_threshold = settings[7:]
+    try:
+        coarse, compiled_mapping = process_progressive_coarse(settings, loaded)
+        job['compiled_mapping'] = compiled_mapping
+        job['coarse'] = coarse
+        if progressive_state['generation'] != generation:
+            return
+
+        if loaded == None:
+            loaded = load_progressive_data(settings)
+        capture, row_start, row_end, face_neutral, compiled_mapping = loaded
+        if progressive_state['generation'] != generation:
+            return
+
+        repairs = []
+        if repair_tracking:
+            capture, repairs = repair_capture(capture, repair_fill, spike_threshold)
+        processed = process_capture(capture, face_neutral, compiled_mapping, fps, row_start, smoothing_frames, row_end, rotation_output, rotation_order)
+        processed['repairs'] = list_applied_repairs(repairs, row_start, row_end)
+        job['processed'] = processed
+    except Exception as error:
+        job['error'] = str(error)
+
+#keys the coarse pass, clearing the existing keyframes first
+def write_progressive_coarse(job):
+    target_rig = job['target_rig']
+    target_meshes = job['target_meshes']
+    if job['clear_existing_keyframes']:
+        remove_keyframes(target_rig, job['rig_shapekey_data'], job['apply_rotation_data'])
+    keyed_id_datas = [target_rig]
+    if not job['clear_existing_keyframes']:
+        keyed_id_datas.extend(target_mesh.shape_keys for target_mesh in target_meshes)
+    job['keyed_curves'] = list_keyed_curves(keyed_id_datas)
+
+    coarse = job['coarse']
+    coarse_frames = coarse['frame_indices'] + job['start_frame']
+    write_coarse = lambda target_object, data_path, index, group_name, frames, values: write_keyframes(target_object, data_path, index, group_name, coarse_frames, values)
+    apply_processed_capture(target_rig, coarse, job['start_frame'], job['rig_shapekey_data'], job['apply_rotation_data'], write_curve=write_coarse)
+    if len(target_meshes) > 0:
+        bake_processed_capture(target_meshes, coarse, job['compiled_mapping'], job['start_frame'], job['clear_existing_keyframes'], write_curve=write_coarse)
+    job['coarse_keyed'] = True
+
+#keys the coarse pass, then rewrites the F-Curves with the full result, a tick at a time
+def run_progressive_apply(generation):
+    job = progressive_state['job']
+    if progressive_state['generation'] != generation or job == None:
+        return None
+    if 'error' in job:
+        return finish_progressive_apply('Progressive apply failed: ' + job['error'])
+    if not job['coarse_keyed']:
+        if 'coarse' not in job:
+            return progressive_tick_time
+        try:
+            write_progressive_coarse(job)
+        except ReferenceError:
+            return finish_progressive_apply('Progressive apply stopped, the Target Rig or a mesh was removed')
+        progressive_state['status'] = 'Coarse pass keyed, processing the full capture...'
+        redraw_view3d_areas()
+        return progressive_tick_time
+    if 'processed' not in job:
+        return progressive_tick_time
+
+    processed = job['processed']
+    tick_end_time = time.perf_counter() + progressive_tick_time
+    try:
+        if job['curves'] == None:
+            #collect the F-Curves (and values) Apply would write
+            job['curves'] = []
+            collect_curve = lambda *curve: job['curves'].append(curve)
+            apply_processed_capture(job['target_rig'], processed, job['start_frame'], job['rig_shapekey_data'], job['apply_rotation_data'], write_curve=collect_curve)
+            if len(job['target_meshes']) > 0:
+                job['driven_count'] = bake_processed_capture(job['target_meshes'], processed, job['compiled_mapping'], job['start_frame'], write_curve=collect_curve)[1]
+        while job['curve_index'] < len(job['curves']) and time.perf_counter() < tick_end_time:
+            swap_in_keyframes(*job['curves'][job['curve_index']], keyed_curves=job['keyed_curves'])
+            job['curve_index'] += 1
+    except ReferenceError:
+        #the rig or a mesh was deleted
+        return finish_progressive_apply('Progressive apply stopped, the Target Rig or a mesh was removed')
+
+    if job['curve_index'] < len(job['curves']):
+        progressive_state['status'] = 'Full result: ' + str(job['curve_index']) + '/' + str(len(job['curves'])) + ' F-Curves'
+        redraw_view3d_areas()
+        return progressive_tick_time
+
+    messages = ['Applied ' + str(processed['frame_count']) + ' frames']
+    if job['driven_count'] > 0:
+        messages.append(str(job['driven_count']) + ' baked shape keys are also driven')
+    #the spans repaired go to the console
+    repair_messages = list_repair_messages(processed['repairs'], 0)
+    if len(repair_messages) > 0:
+        messages.append(repair_messages[0].rstrip(':'))
+    return finish_progressive_apply(', '.join(messages))
+
+def finish_progressive_apply(status):
+    progressive_state['job'] = None
+    progressive_state['status'] = status
+    redraw_view3d_areas()
+    return None
+
+def cancel_progressive_apply():
+    progressive_state['generation'] += 1
+    progressive_state['job'] = None
+    progressive_state['status'] = None
+
+#the job's timer is gone once another file is opened
+@bpy.app.handlers.persistent
+def progressive_load_pre(*args):
+    cancel_progressive_apply()
+
+def get_progressive_status_text():
+    return progressive_state['status']
+
+#the (data path, index) of the F-Curves with keys
+def list_keyed_curves(id_datas):
+    keyed_curves = set()
+    for id_data in id_datas:
+        if id_data != None and id_data.animation_data != None and id_data.animation_data.action != None:
+            for fcurve in id_data.animation_data.action.fcurves:
+                if len(fcurve.keyframe_points) > 0:
+                    keyed_curves.add((fcurve.data_path, fcurve.array_index))
+    return keyed_curves
+
+#every nth frame index (and the last)
+def get_decimated_indices(frame_count, frame_step):
+    indices = np.arange(0, frame_count, frame_step)
+    if frame_count > 0 and indices[-1] != frame_count - 1:
+        indices = np.append(indices, frame_count - 1)
+    return indices
+
+#replaces the coarse keys (the F-Curve is written again, unless it had keys before)
+def swap_in_keyframes(target_object, data_path, index, group_name, frames, values, keyed_curves):
+    fcurve = find_fcurve(target_object, data_path, index)
+    if fcurve != None and (data_path, index) not in keyed_curves:
+        target_object.animation_data.action.fcurves.remove(fcurve)
+    write_keyframes(target_object, data_path, index, group_name, frames, values)
+
+#######################################################################
+# Scripting API
+# Creates face rigs and applies captures from scripts, with everything
+# passed in: the scene properties, selection, mode, 3D cursor and popups
+# aren't used. Both return a dictionary with the timings (ms), counts
+# and warnings, and raise a ValueError for invalid input.
+#
+#   import Applicator
+#   rig = Applicator.create_face_rig(head_mesh, 'Mapping.csv')['rig']
+#   result = Applicator.apply_capture(rig, capture_path='Take.csv', mapping_path='Mapping.csv', fps=30)
+#   print(result['key_count'], result['timings']['total'], result['warnings'])
+#######################################################################
+
+#######################################################################
+# Creates a face rig for the head mesh (a Mesh with the shape keys)
+# The rig goes into a new ApplicatorRig collection, inside the given
+# collection or the collection holding the head mesh. The mapping is
+# the mapping file path, or its rows (mapping_data). The shape keys of
+# the extra meshes (Meshes) with the same names as the head mesh's are
+# driven by the same properties. Needs Object Mode.
+# Returns {'rig', 'collection', 'property_count', 'driver_count', 'timings', 'warnings'}
+#######################################################################
+def create_face_rig(head_mesh, mapping_path=None, head_pivot=None, eye_l_pivot=None, eye_r_pivot=None, mapping_data=None, collection=None, extra_meshes=None):
+    start_time = time.perf_counter()
+    timings = {}
+    warnings = []
+
+    if head_mesh == None or head_mesh.shape_keys == None:
+        raise ValueError('The head mesh has no shape keys. Data is applied to Shape Keys.')
+    if extra_meshes == None:
+        extra_meshes = []
+    for extra_mesh in extra_meshes:
+        if extra_mesh.shape_keys == None:
+            raise ValueError('The extra mesh ' + extra_mesh.name + ' has no shape keys.')
+    if bpy.context.mode != 'OBJECT':
+        raise ValueError('Face rigs can only be created in Object Mode.')
+    if mapping_data == None:
+        if mapping_path == None or mapping_path == '':
+            raise ValueError('A Mapping File (or mapping data) is needed to create the face rig.')
+        mapping_data = list_csv_data(mapping_path)
+    matrix_targets = compile_mapping_data(mapping_data)['matrix']['targets']
+
+    #the rig collection, with the custom shape empties & the armature
+    if collection == None:
+        collection = get_collection_for_object(bpy.context.scene.collection, head_mesh, 'MESH')
+    if collection == None:
+        collection = bpy.context.scene.collection
+    rig_collection = bpy.data.collections.new('ApplicatorRig')
+    collection.children.link(rig_collection)
+    headEmpty, eyeEmpty, noseEmpty, mouthEmpty, browsEmpty = add_empties(rig_collection)
+    face_rig_object, face_rig_armature = add_face_rig(rig_collection, headEmpty, eyeEmpty, noseEmpty, mouthEmpty, browsEmpty, len(matrix_targets) > 0)
+    timings['rig'] = (time.perf_counter() - start_time) * 1000
+
+    #add the propertes and drivers
+    drivers_start_time = time.perf_counter()
+    property_count = 0
+    driver_count = 0
+    unmapped_names = []
+    bone_properties = list_face_rig_properties(head_mesh, mapping_data, matrix_targets)
+    for bone_name, properties in bone_properties:
+        driver_count += add_shape_key_drivers(face_rig_object, head_mesh, bone_name, properties)
+        property_count += len([property for property in properties if property[4] != None])
+        unmapped_names.extend([property[0] for property in properties if property[4] == None])
+
+    #drive the extra meshes' matching shape keys with the same properties
+    for extra_mesh in extra_meshes:
+        extra_driver_count = add_extra_mesh_drivers(face_rig_object, extra_mesh, bone_properties)
+        if extra_driver_count == 0:
+            warnings.append('- The extra mesh ' + extra_mesh.name + ' has none of the head mesh\'s mapped shape keys.')
+        driver_count += extra_driver_count
+
+    #add the rotation drivers
+    add_rotation_drivers(face_rig_object, head_pivot, 'Head')
+    add_rotation_drivers(face_rig_object, eye_l_pivot, 'Eye_L')
+    add_rotation_drivers(face_rig_object, eye_r_pivot, 'Eye_R')
+    timings['drivers'] = (time.perf_counter() - drivers_start_time) * 1000
+    timings['total'] = (time.perf_counter() - start_time) * 1000
+
+    if len(unmapped_names) > 0:
+        warnings.append('- ' + str(len(unmapped_names)) + ' properties have no mapped shape key on the head mesh: ' + ', '.join(unmapped_names[:10]) + (', ...' if len(unmapped_names) > 10 else ''))
+
+    return {
+        'rig': face_rig_object, 'collection': rig_collection, 'property_count': property_count, 'driver_count': driver_count,
+        'timings': timings, 'warnings': warnings}
+
+#######################################################################
+# Applies a capture to a face rig
+# The capture is the capture file (capture_path, .csv or .appcap), or a
+# loaded capture ({'first_row', 'frame_count', 'timecodes', 'channels'},
+# as get_capture_arrays returns). The mapping is the mapping file, or a
+# compiled mapping; the neutral is the neutral file, or the neutral
+# values per blendshape, or none. With bake_meshes (Meshes), the shape
+# key data is baked on their shape keys instead of keyed on the rig.
+# With frame_range (the first & last scene frames), only the capture
+# rows of those frames are processed, and their keys spliced in with
+# blend_frames blended at each edge. The other options match the Apply panel.
+# Returns {'frame_count', 'curve_count', 'key_count', 'repairs', 'timings', 'warnings'}
+#######################################################################
+def apply_capture(target_rig, capture_path=None, capture=None, mapping_path=None, compiled_mapping=None, neutral_path=None, face_neutral=None,
+        fps=None, start_frame=1, skip_capture_frames=0, in_timecode='', out_timecode='', smoothing_frames='S7',
+        repair_tracking=False, repair_fill='INTERPOLATE', spike_threshold=0.3, detect_neutral=False, detect_neutral_frames=60,
+        rotation_output='QUATERNION', rotation_order='XYZ', apply_shapekey_data=True, apply_rotation_data=True, clear_existing_keyframes=False,
+        bake_meshes=None, frame_range=None, blend_frames=0):
+    start_time = time.perf_counter()
+    timings = {}
+    warnings = []
+
+    #validate
+    if target_rig == None or target_rig.type != 'ARMATURE':
+        raise ValueError('The Target Rig must be an Armature.')
+    missing_bones = [bone_name for bone_name in ['Head', 'Eye_L', 'Eye_R'] if bone_name not in target_rig.pose.bones]
+    if len(missing_bones) > 0:
+        raise ValueError('The Target Rig is missing the bones: ' + ', '.join(missing_bones))
+    if fps == None:
+        fps = bpy.context.scene.render.fps
+    if fps not in supported_fps:
+        raise ValueError('Unsupported Frame Rate ' + str(fps) + '. Supported Frame Rates: ' + ', '.join(str(x) for x in supported_fps))
+    if capture == None and (capture_path == None or capture_path == ''):
+        raise ValueError('A Capture File (or loaded capture) is needed to apply.')
+    if compiled_mapping == None:
+        if mapping_path == None or mapping_path == '':
+            raise ValueError('A Mapping File (or compiled mapping) is needed to apply.')
+        compiled_mapping = get_compiled_mapping(mapping_path)
+
+    #a take folder is read through its capture csv
+    capture_path = get_take_capture_path(capture_path)
+    neutral_path = get_take_capture_path(neutral_path)
+
+    #load the applied rows (plus the smoothing frames either side)
+    smooth_shift = get_smooth_shift(smoothing_frames)
+    if capture == None:
+        row_start, row_end = get_capture_row_range(capture_path, in_timecode, out_timecode, skip_capture_frames)
+    else:
+        timecode_keys = None
+        if in_timecode.strip() != '' or out_timecode.strip() != '':
+            timecode_keys = parse_timecode_keys(capture['timecodes'])
+        row_start, row_end = get_timecode_row_range(timecode_keys, in_timecode, out_timecode, skip_capture_frames)
+        row_start += capture['first_row']
+        row_end = None if row_end == None else row_end + capture['first_row']
+    load_start, load_end = max(row_start - smooth_shift, 0), None if row_end == None else row_end + smooth_shift
+    splice_blend_frames = None
+    if frame_range != None:
+        window_start, window_end, start_frame = get_frame_window_rows(fps, row_start, row_end, start_frame, frame_range[0], frame_range[1])
+        causal_filters = uses_causal_filters(compiled_mapping, smoothing_frames)
+        load_start, load_end = get_window_load_rows(row_start, row_end, window_start, window_end, smooth_shift, repair_tracking, causal_filters)
+        row_start, row_end = window_start, window_end
+        splice_blend_frames = blend_frames
+    if capture == None:
+        capture = get_capture_arrays(capture_path, load_start, load_end)
+
+    if face_neutral == None:
+        if neutral_path != None and neutral_path != '':
+            face_neutral = get_face_neutral(neutral_path)
+        elif detect_neutral and capture_path != None and capture_path != '':
+            face_neutral = get_detected_face_neutral(capture_path, detect_neutral_frames)
+        elif detect_neutral:
+            face_neutral = get_face_neutral_from_still_window(data_shapkey_names, capture, detect_neutral_frames)
+        else:
+            face_neutral = get_face_neutral(None)
+
+    repairs = []
+    if repair_tracking:
+        capture, repairs = repair_capture(capture, repair_fill, spike_threshold)
+    timings['load'] = (time.perf_counter() - start_time) * 1000
+
+    #process
+    process_start_time = time.perf_counter()
+    processed = process_capture(capture, face_neutral, compiled_mapping, fps, row_start, smoothing_frames, row_end, rotation_output, rotation_order)
+    repairs = list_applied_repairs(repairs, row_start, row_end)
+    timings['process'] = (time.perf_counter() - process_start_time) * 1000
+    if processed['frame_count'] == 0:
+        warnings.append('- No capture frames to apply.')
+
+    #key the rig (and bake the meshes)
+    rig_shapekey_data = apply_shapekey_data and bake_meshes == None
+    if clear_existing_keyframes and frame_range == None:
+        clear_start_time = time.perf_counter()
+        remove_keyframes(target_rig, rig_shapekey_data, apply_rotation_data)
+        timings['clear'] = (time.perf_counter() - clear_start_time) * 1000
+    write_start_time = time.perf_counter()
+    curve_count = apply_processed_capture(target_rig, processed, start_frame, rig_shapekey_data, apply_rotation_data, splice_blend_frames)
+    if apply_shapekey_data and bake_meshes != None:
+        bake_curve_count, driven_count = bake_processed_capture(bake_meshes, processed, compiled_mapping, start_frame, clear_existing_keyframes, splice_blend_frames)
+        curve_count += bake_curve_count
+        if driven_count > 0:
+            warnings.append('- ' + str(driven_count) + ' baked shape keys are also driven (by the face rig), and the drivers override the keys')
+    timings['write'] = (time.perf_counter() - write_start_time) * 1000
+    timings['total'] = (time.perf_counter() - start_time) * 1000
+
+    warnings.extend(list_repair_messages(repairs))
+    return {
+        'frame_count': processed['frame_count'], 'curve_count': curve_count, 'key_count': processed['frame_count'] * curve_count,
+        'repairs': repairs, 'timings': timings, 'warnings': warnings}
+
+#######################################################################
+# Capture export
+# Samples the applied animation, from the face rig's property & rotation
+# F-Curves or from shape key F-Curves baked on the head mesh, and builds
+# a capture with the Live Link Face columns, at any sample rate.
+# The keyframes are read in bulk (foreach_get); samples that land on a
+# keyframe, or between linear or constant keyframes, are worked out from
+# those directly, and only the rest go through F-Curve evaluate.
+# With Undo Mapping the mapping's multiplier & value shift and the neutral
+# are reversed, so applying the export with the same files rebuilds the
+# animation; otherwise the rig values are written as they are
+#######################################################################
+capture_export_columns = ['Timecode', 'BlendShapeCount'] + data_shapkey_names + data_item_names
+fcurve_interpolation_constant = 0
+fcurve_interpolation_linear = 1
+
+def find_fcurve(id_data, data_path, index=0):
+    if id_data == None or id_data.animation_data == None or id_data.animation_data.action == None:
+        return None
+    return id_data.animation_data.action.fcurves.find(data_path, index=index)
+
+def sample_fcurve(fcurve, times):
+    key_count = len(fcurve.keyframe_points)
+    if key_count == 0:
+        return np.array([fcurve.evaluate(time) for time in times.tolist()])
+
+    coordinates = np.empty(key_count * 2, dtype=np.float32)
+    fcurve.keyframe_points.foreach_get('co', coordinates)
+    key_frames = coordinates[0::2].astype(np.float64)
+    key_values = coordinates[1::2].astype(np.float64)
+    interpolations = np.empty(key_count, dtype=np.int32)
+    fcurve.keyframe_points.foreach_get('interpolation', interpolations)
+
+    #samples on a keyframe are the keyframe's value
+    key_indices = np.clip(np.searchsorted(key_frames, times), 0, key_count - 1)
+    on_key = np.abs(key_frames[key_indices] - times) < 1e-4
+    values = np.where(on_key, key_values[key_indices], 0.0)
+
+    off_key = ~on_key
+    if off_key.any():
+        plain = len(fcurve.modifiers) == 0 and fcurve.extrapolation == 'CONSTANT'
+        if plain and np.all(interpolations[:-1] == fcurve_interpolation_linear):
+            values[off_key] = np.interp(times[off_key], key_frames, key_values)
+        elif plain and np.all(interpolations[:-1] == fcurve_interpolation_constant):
+            values[off_key] = key_values[np.clip(np.searchsorted(key_frames, times[off_key], side='right') - 1, 0, key_count - 1)]
+        else:
+            values[off_key] = [fcurve.evaluate(time) for time in times[off_key].tolist()]
+    return values
+
+#samples the F-Curve, or holds the current value if it's not animated
+def sample_property(id_data, data_path, index, current_value, times):
+    fcurve = find_fcurve(id_data, data_path, index)
+    if fcurve == None:
+        return np.full(len(times), float(current_value))
+    return sample_fcurve(fcurve, times)
+
+def get_export_times(scene, sample_rate):
+    scene_fps = scene.render.fps / scene.render.fps_base
+    sample_count = int(math.floor((scene.frame_end - scene.frame_start) / scene_fps * sample_rate + 1e-6)) + 1
+    return scene.frame_start + np.arange(max(sample_count, 0)) * (scene_fps / sample_rate)
+
+def get_export_timecodes(sample_count, sample_rate):
+    timecodes = []
+    for index in range(sample_count):
+        seconds, frame = divmod(index, sample_rate)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        timecodes.append('%02d:%02d:%02d:%02d.000' % (hours, minutes, seconds, frame))
+    return timecodes
+
+def sample_blendshape_values(target_rig, head_mesh, compiled_mapping, source, times):
+    values = {}
+    if source == 'SHAPE_KEYS':
+        shape_keys = head_mesh.shape_keys if head_mesh != None else None
+        if shape_keys != None:
+            for blendshape_mapping in compiled_mapping['blendshapes']:
+                target_name = blendshape_mapping.get('target', blendshape_mapping['name'])
+                if target_name != '' and target_name in shape_keys.key_blocks:
+                    values[blendshape_mapping['name']] = sample_property(shape_keys, 'key_blocks["' + target_name + '"].value', 0, shape_keys.key_blocks[target_name].value, times)
+    elif target_rig != None:
+        for bone_name in ['Eye_R', 'Eye_L', 'Brows', 'Nose', 'Mouth']:
+            if bone_name in target_rig.pose.bones:
+                prop_bone = target_rig.pose.bones[bone_name]
+                for blendshape_name in data_shapkey_names:
+                    blendShapeLabel = blendShapeLabels[blendshape_name]
+                    if prop_bone.get(blendShapeLabel) != None:
+                        data_path = 'pose.bones["' + bone_name + '"]["' + blendShapeLabel + '"]'
+                        values[blendshape_name] = sample_property(target_rig, data_path, 0, prop_bone[blendShapeLabel], times)
+    return values
+
+#returns the euler angles (frame x xyz) of each bone
+def sample_rotation_values(target_rig, rotation_output, rotation_order, times):
+    rotations = {}
+    if target_rig == None:
+        return rotations
+
+    for bone_name, item_prefix in rotation_bone_items:
+        if bone_name not in target_rig.pose.bones:
+            continue
+        pose_bone = target_rig.pose.bones[bone_name]
+        data_path = 'pose.bones["' + bone_name + '"].'
+        if pose_bone.rotation_mode == 'QUATERNION':
+            rotation_quaternions = np.stack([sample_property(target_rig, data_path + 'rotation_quaternion', index, pose_bone.rotation_quaternion[index], times) for index in range(4)], axis=1)
+            if rotation_output == 'LEGACY':
+                #the raw values are in the quaternion's vector part
+                rotations[bone_name] = rotation_quaternions[:, 1:]
+            else:
+                rotations[bone_name] = get_rotation_eulers(rotation_quaternions, rotation_order)
+        elif pose_bone.rotation_mode in ('XYZ', 'XZY', 'YXZ', 'YZX', 'ZXY', 'ZYX'):
+            rotations[bone_name] = np.stack([sample_property(target_rig, data_path + 'rotation_euler', index, pose_bone.rotation_euler[index], times) for index in range(3)], axis=1)
+    return rotations
+
+def build_export_capture(scene, props, source, sample_rate, undo_mapping):
+    capture_path, neutral_path, mapping_path = get_data_paths(props)
+    compiled_mapping = get_compiled_mapping(mapping_path)
+    face_neutral = get_selected_face_neutral(props) if undo_mapping else {}
+    times = get_export_times(scene, sample_rate)
+    capture = build_rig_capture(scene.app_rig_target, scene.app_head_mesh_target, compiled_mapping, face_neutral, source, props.rotation_output, props.rotation_order, times, undo_mapping)
+    capture['timecodes'] = get_export_timecodes(len(times), sample_rate)
+    return capture
+
+#samples the rig (or head mesh) at the times into capture channels
+def build_rig_capture(target_rig, head_mesh, compiled_mapping, face_neutral, source, rotation_output, rotation_order, times, undo_mapping):
+    frame_count = len(times)
+
+    channels = {'BlendShapeCount': np.full(frame_count, float(len(data_shapkey_names) + len(data_item_names)))}
+
+    #blendshapes
+    blendshape_values = sample_blendshape_values(target_rig, head_mesh, compiled_mapping, source, times)
+    blendshape_mappings = {blendshape_mapping['name']: blendshape_mapping for blendshape_mapping in compiled_mapping['blendshapes']}
+    for blendshape_name in data_shapkey_names:
+        values = blendshape_values.get(blendshape_name, np.zeros(frame_count))
+        blendshape_mapping = blendshape_mappings.get(blendshape_name)
+        if undo_mapping and blendshape_mapping != None:
+            #reverse (Actual - Neutral)/(1-Neutral), then the multiplier & value shift, then the curve
+            neutral = face_neutral.get(blendshape_name, 0.0)
+            values = values * (1 - neutral) + neutral
+            if blendshape_mapping['multiplier'] != 0:
+                values = values / blendshape_mapping['multiplier'] - blendshape_mapping['value_shift']
+            values = np.clip(invert_response_curve(np.clip(values, 0.0, 1.0), blendshape_mapping.get('curve')), 0.0, 1.0)
+        channels[blendshape_name] = np.round(values, 8)
+
+    #rotations
+    rotations = sample_rotation_values(target_rig, rotation_output, rotation_order, times)
+    for bone_name, item_mappings in compiled_mapping['rotations'].items():
+        for item_mapping in item_mappings:
+            values = np.zeros(frame_count)
+            if bone_name in rotations and item_mapping['enabled'] and item_mapping['target'] in ('X', 'Y', 'Z'):
+                values = rotations[bone_name][:, 'XYZ'.index(item_mapping['target'])]
+                if undo_mapping and item_mapping['multiplier'] != 0:
+                    values = values / item_mapping['multiplier'] - item_mapping['value_shift']
+                    values = invert_response_curve(values, item_mapping.get('curve'), True)
+            channels[item_mapping['name']] = np.round(values, 8)
+
+    return {'first_row': 0, 'frame_count': frame_count, 'timecodes': [], 'channels': channels}
+
+#######################################################################
+# Rig to rig transfer
+# Moves the animation of one face rig to another, without going back to
+# the capture file: the source rig's property & rotation F-Curves are read
+# in bulk (see sample_fcurve), taken back to capture channels by reversing
+# the source mapping (the target's, when the source has none of its own)
+# and the neutral, and processed through the target's mapping with the
+# same neutral and no smoothing or filters (the source is already
+# smoothed). Retiming (speed) and scaling (strength) are done on the
+# arrays, and the target is keyed with the bulk F-Curve writes
+#######################################################################
+def transfer_rig_animation(source_rig, target_rig, target_mapping, source_mapping=None, face_neutral={}, target_start_frame=1, speed=1.0, strength=1.0,
+        rotation_output='QUATERNION', rotation_order='XYZ', apply_shapekey_data=True, apply_rotation_data=True):
+    if source_rig.animation_data == None or source_rig.animation_data.action == None:
+        return 0, 0
+    source_start, source_end = source_rig.animation_data.action.frame_range
+
+    #the source frames sampled for each target frame
+    frame_count = int(math.floor((source_end - source_start) / speed + 1e-6)) + 1
+    times = source_start + np.arange(frame_count) * speed
+
+    if source_mapping == None:
+        source_mapping = target_mapping
+    capture = build_rig_capture(source_rig, None, source_mapping, face_neutral, 'RIG', rotation_output, rotation_order, times, True)
+    processed = process_capture(capture, face_neutral, remove_mapping_filters(target_mapping), 60, 0, 'S0', None, rotation_output, rotation_order)
+    if strength != 1.0:
+        for values_name in ['blendshapes', 'targets']:
+            processed[values_name] = {name: np.round(values * strength, 4) for name, values in processed[values_name].items()}
+
+    #replace the target's face rig curves
+    remove_face_rig_fcurves(target_rig, apply_shapekey_data, apply_rotation_data)
+    curve_count = apply_processed_capture(target_rig, processed, target_start_frame, apply_shapekey_data, apply_rotation_data)
+    return processed['frame_count'], curve_count
+
+#lists the F-Curves of the face rig's properties and/or rotations
+def list_face_rig_fcurves(target_rig, property_fcurves, rotation_fcurves):
+    if target_rig.animation_data == None or target_rig.animation_data.action == None:
+        return []
+    face_rig_fcurves = []
+    for fcurve in target_rig.animation_data.action.fcurves:
+        is_rotation = any(fcurve.data_path.startswith('pose.bones["' + bone_name + '"].rotation_') for bone_name, item_prefix in rotation_bone_items)
+        is_property = fcurve.data_path.startswith('pose.bones["') and fcurve.data_path.endswith('"]') and '"][' in fcurve.data_path
+        if (is_rotation and rotation_fcurves) or (is_property and property_fcurves):
+            face_rig_fcurves.append(fcurve)
+    return face_rig_fcurves
+
+#removes the F-Curves of the face rig's properties and/or rotations
+def remove_face_rig_fcurves(target_rig, remove_property_fcurves, remove_rotation_fcurves):
+    for fcurve in list_face_rig_fcurves(target_rig, remove_property_fcurves, remove_rotation_fcurves):
+        target_rig.animation_data.action.fcurves.remove(fcurve)
+
+def export_capture(export_path, capture):
+    if export_path.lower().endswith(capture_archive_extension):
+        write_capture_archive(export_path, capture, capture_export_columns)
+    else:
+        write_capture_csv(export_path, capture, capture_export_columns)
+
+#######################################################################
+# Live preview
+# A frame change handler that sets the face rig's properties and rotations
+# from the processed capture, without adding keyframes.
+# The processed data is rebuilt only when the preview settings change,
+# or the files are edited, so each frame change only costs a lookup per
+# channel. The files are only checked for edits every half second.
+# The rig's face rig F-Curves are muted while previewing, so any keys
+# already applied don't override the previewed values. They are unmuted
+# while the .blend is saved, and the preview stops when a file is opened
+#######################################################################
+preview_file_check_seconds = 0.5
+preview_state = {'settings_key': None, 'file_keys': None, 'files_checked': 0.0, 'processed': None, 'property_targets': [], 'rotation_targets': [], 'muted_fcurves': (None, [])}
+
+def get_preview_settings_key(scene):
+    props = scene.ApplicatorProps
+    target_rig = scene.app_rig_target
+    return (
+        target_rig.name if target_rig != None else None,
+        get_data_paths(props),
+        props.skip_capture_frames, props.capture_in_timecode, props.capture_out_timecode,
+        props.smoothing_frames, scene.render.fps, props.rotation_output, props.rotation_order,
+        props.detect_neutral, props.detect_neutral_frames,
+        props.repair_tracking, props.repair_fill, props.spike_threshold,
+        props.apply_shapekey_data, props.apply_rotation_data)
+
+#the previewed files' keys in the data cache (None for a missing file)
+def get_preview_file_keys(data_paths):
+    file_keys = []
+    for file_path in data_paths:
+        try:
+            file_keys.append(get_file_key(file_path) if file_path != None and data_file_exists(file_path) else None)
+        except OSError:
+            file_keys.append(None)
+    return tuple(file_keys)
+
+#mutes the face rig F-Curves keyed on the rig, remembering the ones muted here
+def mute_preview_fcurves(target_rig, props):
+    muted_fcurves = []
+    for fcurve in list_face_rig_fcurves(target_rig, props.apply_shapekey_data, props.apply_rotation_data):
+        if not fcurve.mute:
+            fcurve.mute = True
+            muted_fcurves.append((fcurve.data_path, fcurve.array_index))
+    preview_state['muted_fcurves'] = (target_rig.name, muted_fcurves)
+
+def unmute_preview_fcurves():
+    rig_name, muted_fcurves = preview_state['muted_fcurves']
+    target_rig = bpy.data.objects.get(rig_name) if rig_name != None else None
+    if target_rig != None and target_rig.animation_data != None and target_rig.animation_data.action != None:
+        fcurves = target_rig.animation_data.action.fcurves
+        for data_path, index in muted_fcurves:
+            fcurve = fcurves.find(data_path, index=index)
+            if fcurve != None:
+                fcurve.mute = False
+    preview_state['muted_fcurves'] = (None, [])
+
+def update_preview_data(scene):
+    props = scene.ApplicatorProps
+    target_rig = scene.app_rig_target
+
+    processed = get_processed_capture(props, scene.render.fps)
+
+    #list the bone properties and rotations to set on each frame
+    property_targets = []
+    if props.apply_shapekey_data:
+        for bone_name in ['Eye_R', 'Eye_L', 'Brows', 'Nose', 'Mouth']:
+            if bone_name in target_rig.pose.bones:
+                prop_bone = target_rig.pose.bones[bone_name]
+                for blendshape_name, values in processed['blendshapes'].items():
+                    blendShapeLabel = blendShapeLabels[blendshape_name]
+                    if prop_bone.get(blendShapeLabel) != None:
+                        property_targets.append((bone_name, blendShapeLabel, values.tolist()))
+        if 'Targets' in target_rig.pose.bones:
+            prop_bone = target_rig.pose.bones['Targets']
+            for target_name, values in processed['targets'].items():
+                if prop_bone.get(target_name) != None:
+                    property_targets.append(('Targets', target_name, values.tolist()))
+
+    rotation_targets = []
+    if props.apply_rotation_data:
+        for bone_name, rotations in processed['rotations'].items():
+            if bone_name in target_rig.pose.bones:
+                rotation_path = set_rotation_mode(target_rig.pose.bones[bone_name], props.rotation_output, props.rotation_order)
+                rotation_targets.append((bone_name, rotation_path, rotations.tolist()))
+
+    #the rig's keys would override the previewed values
+    unmute_preview_fcurves()
+    mute_preview_fcurves(target_rig, props)
+
+    preview_state['settings_key'] = get_preview_settings_key(scene)
+    preview_state['processed'] = processed
+    preview_state['property_targets'] = property_targets
+    preview_state['rotation_targets'] = rotation_targets
+
+def preview_frame_change(scene, *args):
+    target_rig = scene.app_rig_target
+    if target_rig == None or target_rig.type != 'ARMATURE':
+        return
+
+    #the files are checked for edits every so often, rather than on every frame change
+    settings_key = get_preview_settings_key(scene)
+    if preview_state['settings_key'] != settings_key or time.monotonic() - preview_state['files_checked'] > preview_file_check_seconds:
+        file_keys = get_preview_file_keys(settings_key[1])
+        preview_state['files_checked'] = time.monotonic()
+        if preview_state['settings_key'] != settings_key or preview_state['file_keys'] != file_keys:
+            try:
+                update_preview_data(scene)
+            except (OSError, ValueError, KeyError):
+                #file missing or invalid; keep the rig as it is
+                preview_state['settings_key'] = None
+                return
+            preview_state['file_keys'] = file_keys
+
+    frame_count = preview_state['processed']['frame_count']
+    if frame_count == 0:
+        return
+
+    #hold the first/last values outside the capture, as the applied keyframes would
+    frame_index = min(max(scene.frame_current - scene.ApplicatorProps.start_frame, 0), frame_count - 1)
+
+    pose_bones = target_rig.pose.bones
+    for bone_name, blendShapeLabel, values in preview_state['property_targets']:
+        pose_bones[bone_name][blendShapeLabel] = values[frame_index]
+    for bone_name, rotation_path, rotations in preview_state['rotation_targets']:
+        setattr(pose_bones[bone_name], rotation_path, rotations[frame_index])
+
+def is_preview_running():
+    return preview_frame_change in bpy.app.handlers.frame_change_pre
+
+def start_preview(scene):
+    preview_state['settings_key'] = None
+    preview_state['file_keys'] = None
+    if not is_preview_running():
+        bpy.app.handlers.frame_change_pre.append(preview_frame_change)
+    preview_frame_change(scene)
+
+def stop_preview(scene):
+    if is_preview_running():
+        bpy.app.handlers.frame_change_pre.remove(preview_frame_change)
+
+    #the rig's keys apply again
+    unmute_preview_fcurves()
+
+    #reset the previewed values back to their rest state
+    target_rig = scene.app_rig_target if scene != None else None
+    if target_rig != None and target_rig.type == 'ARMATURE':
+        pose_bones = target_rig.pose.bones
+        for bone_name, blendShapeLabel, values in preview_state['property_targets']:
+            if bone_name in pose_bones:
+                pose_bones[bone_name][blendShapeLabel] = 0.0
+        for bone_name, rotation_path, rotations in preview_state['rotation_targets']:
+            if bone_name in pose_bones:
+                pose_bones[bone_name].rotation_quaternion = (1.0, 0.0, 0.0, 0.0)
+                pose_bones[bone_name].rotation_euler = (0.0, 0.0, 0.0)
+
+        #re-evaluate any existing animation
+        scene.frame_set(scene.frame_current)
+
+    preview_state['settings_key'] = None
+    preview_state['file_keys'] = None
+    preview_state['processed'] = None
+    preview_state['property_targets'] = []
+    preview_state['rotation_targets'] = []
+
+#the muted F-Curves are unmuted while the .blend is saved, so a file
+#saved while previewing doesn't keep the rig's keys muted
+@bpy.app.handlers.persistent
+def preview_save_pre(*args):
+    preview_state['saved_muted_rig'] = preview_state['muted_fcurves'][0]
+    unmute_preview_fcurves()
+
+@bpy.app.handlers.persistent
+def preview_save_post(*args):
+    rig_name = preview_state.pop('saved_muted_rig', None)
+    target_rig = bpy.data.objects.get(rig_name) if rig_name != None else None
+    if is_preview_running() and target_rig != None:
+        mute_preview_fcurves(target_rig, bpy.context.scene.ApplicatorProps)
+
+#the preview belongs to the open file
+@bpy.app.handlers.persistent
+def preview_load_pre(*args):
+    stop_preview(None)
+
+#######################################################################
+# Playback benchmark
+# Builds synthetic heads with all the ARKit shape keys at several vertex
+# counts, keys the processed capture in each output style and times the
+# frame evaluation (animation, drivers & depsgraph) over the keyed frames.
+# Output styles:
+#   DRIVERS: the face rig, with the shape keys driven by its properties
+#   BAKED: the values keyed straight on the shape keys, a key per frame
+#   REDUCED: as BAKED, keeping only the keys linear interpolation can't
+#            rebuild within the reduce tolerance
+# Nothing is drawn when running in the background, so the playback fps
+# there is the evaluation only fps
+#######################################################################
+benchmark_vertex_counts = (5000, 25000, 100000)
+benchmark_output_styles = ('DRIVERS', 'BAKED', 'REDUCED')
+benchmark_frame_limit = 600
+benchmark_reduce_tolerance = 0.001
+
+def create_benchmark_head(scene, name, vertex_count, shape_key_names):
+    #a square grid of quads, facing -Y
+    grid_size = max(int(math.sqrt(vertex_count)), 2)
+    x, z = np.meshgrid(np.linspace(-0.1, 0.1, grid_size), np.linspace(-0.1, 0.1, grid_size))
+    coordinates = np.stack((x.ravel(), np.zeros(grid_size * grid_size), z.ravel()), axis=1)
+    corners = (np.arange(grid_size - 1)[:, None] * grid_size + np.arange(grid_size - 1)[None, :]).ravel()
+    faces = np.stack((corners, corners + 1, corners + grid_size + 1, corners + grid_size), axis=1)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(coordinates.tolist(), [], faces.tolist())
+    head_object = bpy.data.objects.new(name, mesh)
+    scene.collection.objects.link(head_object)
+
+    #each shape key pushes out a different patch of the grid
+    head_object.shape_key_add(name='Basis')
+    for index, shape_key_name in enumerate(shape_key_names):
+        rng = np.random.default_rng(index)
+        centre = rng.uniform(-0.08, 0.08, 2)
+        distance = (coordinates[:, 0] - centre[0]) ** 2 + (coordinates[:, 2] - centre[1]) ** 2
+        shape_coordinates = coordinates.copy()
+        shape_coordinates[:, 1] -= 0.02 * np.exp(-distance / 0.0009)
+        shape_key = head_object.shape_key_add(name=shape_key_name, from_mix=False)
+        shape_key.data.foreach_set('co', shape_coordinates.ravel())
+
+    return head_object
+
+#######################################################################
+# Reduces the keys so linear interpolation between the kept keys rebuilds
+# every frame within the tolerance (Douglas-Peucker): a span keeps the
+# key furthest from the line between its ends, and is split there until
+# no frame in any span is further than the tolerance. The first and last
+# keys are always kept
+#######################################################################
+def reduce_keyframes(frames, values, tolerance):
+    if len(values) < 3:
+        return frames, values
+    keep = np.zeros(len(values), dtype=bool)
+    keep[[0, -1]] = True
+    spans = [(0, len(values) - 1)]
+    while len(spans) > 0:
+        first, last = spans.pop()
+        if last - first < 2:
+            continue
+        inner_frames = frames[first + 1:last]
+        line = values[first] + (values[last] - values[first]) * (inner_frames - frames[first]) / (frames[last] - frames[first])
+        errors = np.abs(values[first + 1:last] - line)
+        furthest = int(np.argmax(errors))
+        if errors[furthest] > tolerance:
+            split = first + 1 + furthest
+            keep[split] = True
+            spans.extend([(first, split), (split, last)])
+    return frames[keep], values[keep]
+
+#######################################################################
+# Times the scene's frame evaluation, frame by frame
+#######################################################################
+def time_frame_evaluation(scene, frame_start, frame_count):
+    scene.frame_set(frame_start) #warm up
+    frame_times = np.zeros(frame_count)
+    for index in range(frame_count):
+        start_time = time.perf_counter()
+        scene.frame_set(frame_start + index)
+        frame_times[index] = time.perf_counter() - start_time
+
+    frame_times_ms = frame_times * 1000
+    return {
+        'playback_fps': frame_count / max(frame_times.sum(), 1e-9),
+        'evaluation_ms': {
+            'mean': float(frame_times_ms.mean()),
+            'median': float(np.median(frame_times_ms)),
+            'p95': float(np.percentile(frame_times_ms, 95)),
+            'max': float(frame_times_ms.max())
+        }
+    }
+
+def list_data_names():
+    return {collection_name: set(item.name for item in getattr(bpy.data, collection_name)) for collection_name in ['objects', 'meshes', 'armatures', 'actions', 'collections']}
+
+def remove_new_data(data_names):
+    for collection_name, names in data_names.items():
+        data_collection = getattr(bpy.data, collection_name)
+        for item in [item for item in data_collection if item.name not in names]:
+            data_collection.remove(item)
+
+#######################################################################
+# Runs the benchmark in the scene (which needs the Mapping File set, to
+# create the face rigs). The scene is left as it was found
+#######################################################################
+def run_playback_benchmark(scene, processed, vertex_counts=benchmark_vertex_counts, output_styles=benchmark_output_styles, frame_limit=benchmark_frame_limit):
+    props = scene.ApplicatorProps
+    compiled_mapping = get_compiled_mapping(props.mapping_file_path)
+    shape_key_values = list_shape_key_values(processed, compiled_mapping)
+    shape_key_names = list(shape_key_values.keys())
+    frame_count = min(processed['frame_count'], frame_limit)
+    frames = np.arange(processed['frame_count']) + props.start_frame
+
+    results = []
+    for vertex_count in vertex_counts:
+        for output_style in output_styles:
+            data_names = list_data_names()
+            setup_start = time.perf_counter()
+
+            head_object = create_benchmark_head(scene, 'ApplicatorBenchmarkHead', vertex_count, shape_key_names)
+            key_count = 0
+            if output_style == 'DRIVERS':
+                scene.app_head_mesh_target = head_object.data
+                bpy.ops.applicator.create_rig()
+                apply_processed_capture(scene.app_rig_target, processed, props.start_frame)
+                key_count = sum(len(fcurve.keyframe_points) for fcurve in scene.app_rig_target.animation_data.action.fcurves)
+            else:
+                shape_keys = head_object.data.shape_keys
+                for shape_key_name, values in shape_key_values.items():
+                    key_frames, key_values = frames, values
+                    if output_style == 'REDUCED':
+                        key_frames, key_values = reduce_keyframes(frames, values, benchmark_reduce_tolerance)
+                    write_keyframes(shape_keys, 'key_blocks["' + shape_key_name + '"].value', 0, 'ShapeKeys', key_frames, key_values)
+                    if output_style == 'REDUCED':
+                        #the keys were reduced for linear interpolation
+                        for keyframe_point in get_action_fcurve(shape_keys, 'key_blocks["' + shape_key_name + '"].value', 0, 'ShapeKeys').keyframe_points:
+                            keyframe_point.interpolation = 'LINEAR'
+                    key_count += len(key_frames)
+
+            setup_seconds = time.perf_counter() - setup_start
+            timing = time_frame_evaluation(scene, props.start_frame, frame_count)
+
+            results.append(dict({
+                'vertex_count': len(head_object.data.vertices),
+                'output_style': output_style,
+                'shape_key_count': len(shape_key_names),
+                'key_count': key_count,
+                'frame_count': frame_count,
+                'setup_seconds': setup_seconds
+            }, **timing))
+
+            #clean up the head, rig and actions before the next run
+            scene.app_head_mesh_target = None
+            scene.app_rig_target = None
+            remove_new_data(data_names)
+
+    return results
+
+def write_benchmark_results(results_path, results, capture_path, fps):
+    with open(results_path, 'w') as results_file:
+        json.dump({
+            'blender_version': bpy.app.version_string,
+            'addon_version': '.'.join(str(x) for x in bl_info['version']),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'background': bpy.app.background,
+            'capture': os.path.basename(capture_path),
+            'fps': fps,
+            'startup_ms': dict(startup_timings),
+            'results': results
+        }, results_file, indent=2)
+
+################################################################    
+# Registration
+# All the classes are registered in one go, then the Scene properties.
+# Registering again first unregisters, and unregistering removes exactly
+# what was registered (in reverse), so reloading the add-on is safe
+################################################################    
+applicator_classes = (
+    ApplicatorProps,
+    ApplicatorTargetPanel,
+    ApplicatorDataPanel,
+    #ApplicatorMappingPanel,
+    ApplicatorApplyPanel,
+
+    ApplicatorCreateFaceRig,
+    ApplicatorCreateFaceRigs,
+    ApplicatorSelectCaptureFile,
+    ApplicatorClearCaptureFile,
+
+    ApplicatorSelectNeutralFile,
+    ApplicatorClearNeutralFile,
+    ApplicatorSaveNeutralProfile,
+
+    ApplicatorSelectMappingFile,
+    ApplicatorClearMappingFile,
+    ApplicatorConvertCaptures,
+    ApplicatorWatchFolder,
+    ApplicatorExportCapture,
+    ApplicatorPackData,
+    ApplicatorUnpackData,
+
+    ApplicatorApply,
+    ApplicatorReapplyRange,
+    ApplicatorTransferAnimation,
+    ApplicatorPreview,
+    ApplicatorBenchmark
+)
+register_applicator_classes, unregister_applicator_classes = bpy.utils.register_classes_factory(applicator_classes)
+registration_state = {'registered': False}
+
+#the handlers kept when a file is saved or opened
+file_handlers = (('save_pre', preview_save_pre), ('save_post', preview_save_post), ('load_pre', preview_load_pre), ('load_pre', progressive_load_pre), ('load_pre', watch_load_pre))
+
+def register():
+    register_start_time = time.perf_counter()
+    if registration_state['registered']:
+        unregister()
+
+    register_applicator_classes()
+
+    # Register the Props
+    for property_name, property_type in scene_pointer_properties:
+        setattr(bpy.types.Scene, property_name, bpy.props.PointerProperty(type=property_type))
+    bpy.types.Scene.ApplicatorProps = bpy.props.PointerProperty(type=ApplicatorProps)
+
+    for handler_name, handler in file_handlers:
+        getattr(bpy.app.handlers, handler_name).append(handler)
+
+    registration_state['registered'] = True
+    startup_timings['register'] = (time.perf_counter() - register_start_time) * 1000
+    report_startup_timings()
+ 
+def unregister():
+    if not registration_state['registered']:
+        return
+
+    if is_preview_running():
+        bpy.app.handlers.frame_change_pre.remove(preview_frame_change)
+    unmute_preview_fcurves()
+    for handler_name, handler in file_handlers:
+        if handler in getattr(bpy.app.handlers, handler_name):
+            getattr(bpy.app.handlers, handler_name).remove(handler)
+    cancel_progressive_apply()
+    for kind in prefetch_state['generations']:
+        cancel_prefetch(kind)
+    if bpy.app.timers.is_registered(redraw_prefetch_status):
+        bpy.app.timers.unregister(redraw_prefetch_status)
+    stop_watching()
+
+    del bpy.types.Scene.ApplicatorProps
+    for property_name, property_type in reversed(scene_pointer_properties):
+        delattr(bpy.types.Scene, property_name)
+
+    unregister_applicator_classes()
+    registration_state['registered'] = False
+
+startup_timings['import'] = (time.perf_counter() - import_start_time) * 1000
 
 if __name__ == "__main__":
     register()
\ No newline at end of file
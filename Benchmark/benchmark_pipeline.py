@@ -0,0 +1,394 @@
+#########################################################################
+# Applicator for Blender: headless apply pipeline benchmark
+#
+# Generates synthetic Live Link Face captures from 1 minute up to 2 hours,
+# following the statistics of the sample takes, and times each stage of
+# applying them: parse, validate, neutral, decimate, repair, smooth,
+# causal filter (every channel, the filter kinds in turn), process,
+# write keys, clear and write the keys again. Each capture is
+# run through each load path (the csv read whole, the capture archive,
+# and an in/out range read through the capture index), and the results
+# are checked against the thresholds file and, optionally, a saved
+# baseline run. A frame range re-applied with Repair Tracking on, and
+# with each causal filter, is checked against the same frames of the
+# full apply.
+#
+# Usage:
+# blender -b --factory-startup -P Benchmark/benchmark_pipeline.py -- [options]
+#
+# Options:
+# --samples PATH [PATH..] the takes the statistics come from (default: Sample/SampleTest*.csv)
+# --neutral PATH          the neutral file (default: Sample/SampleNeutral.csv)
+# --mapping PATH          the mapping file (default: Sample/SampleMappingFile.csv)
+# --minutes N [N..]       the capture lengths (default: 1 10 30 60 120)
+# --paths NAME [NAME..]   the load paths: csv archive range (default: all)
+# --fps FPS               the scene frame rate (default: 30)
+# --smoothing S           the smoothing frames: S3 S5 S7 S9 S11 (default: S5)
+# --work-dir PATH         where the synthetic captures are kept (default: benchmark_captures)
+# --seed N                the synthetic capture seed (default: 0)
+# --thresholds PATH       the thresholds file (default: Benchmark/pipeline_thresholds.json)
+# --baseline PATH         a previous results file to compare against
+# --output PATH           the results file (default: benchmark_pipeline.json)
+#
+# Exits with 1 when a stage is over its threshold, so it can be used as
+# a local check before committing.
+#########################################################################
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+
+import bpy
+import numpy as np
+
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repo_path, 'Applicator'))
+import Applicator
+
+capture_fps = 60
+pipeline_paths = ('csv', 'archive', 'range')
+pipeline_stages = ('index', 'parse', 'validate', 'neutral', 'neutral_detect', 'decimate', 'repair', 'smooth', 'filter', 'process', 'write_keys', 'rewrite_keys', 'clear')
+benchmark_head_vertex_count = 1000
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(description='Applicator apply pipeline benchmark')
+    parser.add_argument('--samples', nargs='+', default=sorted(glob.glob(os.path.join(repo_path, 'Sample', 'SampleTest*.csv'))))
+    parser.add_argument('--neutral', default=os.path.join(repo_path, 'Sample', 'SampleNeutral.csv'))
+    parser.add_argument('--mapping', default=os.path.join(repo_path, 'Sample', 'SampleMappingFile.csv'))
+    parser.add_argument('--minutes', type=float, nargs='+', default=[1, 10, 30, 60, 120])
+    parser.add_argument('--paths', nargs='+', choices=pipeline_paths, default=list(pipeline_paths))
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--smoothing', default='S5')
+    parser.add_argument('--work-dir', default='benchmark_captures')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--thresholds', default=os.path.join(repo_path, 'Benchmark', 'pipeline_thresholds.json'))
+    parser.add_argument('--baseline', default='')
+    parser.add_argument('--output', default='benchmark_pipeline.json')
+    return parser.parse_args(argv)
+
+#######################################################################
+# Synthetic captures
+# Each channel is a first order autoregressive series with the sample
+# takes' mean, spread and frame to frame correlation, driven by noise
+# with the channels' correlation (so blinks and the jaw move together as
+# they do in the samples), clipped to the sampled range.
+# About once a minute the tracking freezes for a short run of rows, as
+# ARKit does when it loses the face, so the repair has work to do
+#######################################################################
+def get_sample_statistics(sample_paths):
+    channel_names = Applicator.data_shapkey_names + Applicator.data_item_names
+    takes = []
+    for sample_path in sample_paths:
+        capture = Applicator.load_capture_arrays(sample_path)
+        takes.append(np.stack([capture['channels'].get(name, np.zeros(capture['frame_count'])) for name in channel_names], axis=1))
+
+    values = np.concatenate(takes)
+    mean = values.mean(axis=0)
+    spread = values.std(axis=0)
+
+    #the frame to frame correlation, from the pairs within each take
+    pairs = [(take[:-1] - mean, take[1:] - mean) for take in takes if len(take) > 1]
+    previous = np.concatenate([pair[0] for pair in pairs])
+    current = np.concatenate([pair[1] for pair in pairs])
+    correlation = np.clip((previous * current).sum(axis=0) / np.maximum((previous * previous).sum(axis=0), 1e-12), 0.0, 0.999)
+
+    #the noise correlation between channels, as a matrix square root
+    residuals = current - previous * correlation
+    residual_spread = np.maximum(residuals.std(axis=0), 1e-12)
+    channel_correlation = np.corrcoef(residuals / residual_spread, rowvar=False)
+    channel_correlation[~np.isfinite(channel_correlation)] = 0.0
+    np.fill_diagonal(channel_correlation, 1.0)
+    eigen_values, eigen_vectors = np.linalg.eigh(channel_correlation)
+    mixing = eigen_vectors * np.sqrt(np.maximum(eigen_values, 0.0))
+
+    return {
+        'channel_names': channel_names,
+        'mean': mean,
+        'spread': spread,
+        'correlation': correlation,
+        'mixing': mixing,
+        'min': values.min(axis=0),
+        'max': values.max(axis=0)
+    }
+
+def generate_synthetic_capture(statistics, frame_count, seed):
+    rng = np.random.default_rng(seed)
+    channel_count = len(statistics['channel_names'])
+    correlation = statistics['correlation']
+    noise_scale = statistics['spread'] * np.sqrt(1 - correlation ** 2)
+
+    noise = (rng.standard_normal((frame_count, channel_count)) @ statistics['mixing'].T) * noise_scale
+    values = np.empty((frame_count, channel_count))
+    value = np.zeros(channel_count)
+    for frame in range(frame_count):
+        value = value * correlation + noise[frame]
+        values[frame] = value
+    values = np.clip(values + statistics['mean'], statistics['min'], statistics['max'])
+
+    #tracking dropouts: the rows repeat for 5-30 frames
+    for dropout_start in rng.integers(1, max(frame_count - 30, 2), max(frame_count // (capture_fps * 60), 1)):
+        values[dropout_start:dropout_start + rng.integers(5, 31)] = values[dropout_start - 1]
+
+    channels = {name: values[:, index] for index, name in enumerate(statistics['channel_names'])}
+    channels['BlendShapeCount'] = np.full(frame_count, float(channel_count))
+    return {'first_row': 0, 'frame_count': frame_count, 'timecodes': Applicator.get_export_timecodes(frame_count, capture_fps), 'channels': channels}
+
+#the captures are kept between runs; they only depend on the length, seed and samples
+def get_synthetic_capture_paths(statistics, work_dir, minutes, seed):
+    frame_count = int(round(minutes * 60 * capture_fps))
+    name = 'synthetic_{}min_seed{}'.format(('%g' % minutes).replace('.', '_'), seed)
+    csv_path = os.path.join(work_dir, name + '.csv')
+    archive_path = os.path.join(work_dir, name + Applicator.capture_archive_extension)
+    if not os.path.exists(csv_path) or not os.path.exists(archive_path):
+        print('Generating ' + name + ' (' + str(frame_count) + ' rows)')
+        capture = generate_synthetic_capture(statistics, frame_count, seed)
+        Applicator.write_capture_csv(csv_path, capture, Applicator.capture_export_columns)
+        Applicator.write_capture_archive(archive_path, capture, Applicator.capture_export_columns)
+    return csv_path, archive_path, frame_count
+
+#######################################################################
+# Pipeline stages
+#######################################################################
+def time_stage(timings, stage, function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    timings[stage] = (time.perf_counter() - start_time) * 1000
+    return result
+
+def reset_caches(capture_path):
+    Applicator.file_data_cache.clear()
+    index_path = Applicator.get_capture_index_path(capture_path)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+
+def get_range_timecodes(frame_count):
+    #the middle minute of the capture
+    timecodes = Applicator.get_export_timecodes(frame_count, capture_fps)
+    middle = frame_count // 2
+    return timecodes[max(middle - capture_fps * 30, 0)], timecodes[min(middle + capture_fps * 30, frame_count - 1)]
+
+def smooth_capture(capture, smooth_shift):
+    return {name: Applicator.smooth_array(values, smooth_shift) for name, values in capture['channels'].items()}
+
+def filter_capture(capture):
+    channel_names = list(capture['channels'])
+    channel_filters = [Applicator.default_channel_filters[Applicator.filter_kinds[channel_index % len(Applicator.filter_kinds)]] for channel_index in range(len(channel_names))]
+    values = np.stack([capture['channels'][channel_name] for channel_name in channel_names], axis=1)
+    return Applicator.filter_bank_arrays(Applicator.create_filter_bank(channel_filters), values)
+
+def run_pipeline(scene, path_name, capture_path, frame_count, args):
+    props = scene.ApplicatorProps
+    props.capture_file_path = capture_path
+    props.capture_in_timecode, props.capture_out_timecode = get_range_timecodes(frame_count) if path_name == 'range' else ('', '')
+    props.smoothing_frames = args.smoothing
+    smooth_shift = Applicator.get_smooth_shift(args.smoothing)
+    reset_caches(capture_path)
+    timings = {}
+
+    row_start, row_end = time_stage(timings, 'index', Applicator.get_capture_row_range, capture_path, props.capture_in_timecode, props.capture_out_timecode, 0)
+    capture = time_stage(timings, 'parse', Applicator.load_capture_arrays, capture_path, max(row_start - smooth_shift, 0), None if row_end == None else row_end + smooth_shift)
+    is_valid, messages = time_stage(timings, 'validate', Applicator.ApplicatorApply.ValidateSettings, None, scene.app_rig_target, props)
+    if not is_valid:
+        raise ValueError('\n'.join(messages))
+    face_neutral = time_stage(timings, 'neutral', Applicator.get_face_neutral, args.neutral)
+    time_stage(timings, 'neutral_detect', Applicator.get_face_neutral_from_still_window, Applicator.data_shapkey_names, capture, props.detect_neutral_frames)
+    time_stage(timings, 'decimate', Applicator.list_apply_capture_indices, args.fps, capture, row_start, row_end)
+    capture, repairs = time_stage(timings, 'repair', Applicator.repair_capture, capture, props.repair_fill, props.spike_threshold)
+    time_stage(timings, 'smooth', smooth_capture, capture, smooth_shift)
+    time_stage(timings, 'filter', filter_capture, capture)
+    compiled_mapping = Applicator.get_compiled_mapping(args.mapping)
+    processed = time_stage(timings, 'process', Applicator.process_capture, capture, face_neutral, compiled_mapping, args.fps, row_start, args.smoothing, row_end, props.rotation_output, props.rotation_order)
+
+    #keys on a fresh face rig, then cleared and keyed again, as applying again does
+    target_rig = scene.app_rig_target
+    time_stage(timings, 'write_keys', Applicator.apply_processed_capture, target_rig, processed, props.start_frame)
+    time_stage(timings, 'clear', Applicator.remove_keyframes, target_rig, True, True)
+    time_stage(timings, 'rewrite_keys', Applicator.apply_processed_capture, target_rig, processed, props.start_frame)
+    if target_rig.animation_data != None and target_rig.animation_data.action != None:
+        action = target_rig.animation_data.action
+        target_rig.animation_data.action = None
+        bpy.data.actions.remove(action)
+
+    return {
+        'path': path_name,
+        'capture_frames': frame_count,
+        'loaded_frames': capture['frame_count'],
+        'applied_frames': processed['frame_count'],
+        'repaired_spans': len(repairs),
+        'stages_ms': timings,
+        'total_ms': sum(timings.values())
+    }
+
+#######################################################################
+# Re-apply parity
+# Re-applying a frame range has to give the values of the same frames
+# of a full apply. Checked with Repair Tracking on, over a window
+# starting inside the first repaired dropout, so its repair needs the
+# good frames before the window, and with each causal filter over a
+# window in the middle of the capture, so the filters need the frames
+# from the start
+#######################################################################
+parity_tolerance = 1e-9
+
+def get_window_difference(window, window_offset, full):
+    difference = 0.0
+    for kind in ('blendshapes', 'targets', 'rotations'):
+        for name, values in window[kind].items():
+            if len(values) > 0:
+                difference = max(difference, float(np.abs(values - full[kind][name][window_offset:window_offset + len(values)]).max()))
+    return difference
+
+def check_reapply_parity(scene, capture_path, frame_count, fps, smoothing_frames, repair_tracking):
+    props = scene.ApplicatorProps
+    props.capture_file_path = capture_path
+    props.capture_in_timecode, props.capture_out_timecode = '', ''
+    props.smoothing_frames = smoothing_frames
+    props.repair_tracking = repair_tracking
+    try:
+        full = Applicator.get_processed_capture(props, fps)
+        window_row = frame_count // 2
+        if repair_tracking and len(full['repairs']) > 0:
+            window_row = (full['repairs'][0]['row_start'] + full['repairs'][0]['row_end']) // 2
+        frame_start = props.start_frame + window_row * full['frame_count'] // frame_count
+        window, window_start_frame = Applicator.get_processed_frame_window(props, fps, frame_start, frame_start + fps * 2)
+    finally:
+        props.repair_tracking = False
+
+    name = smoothing_frames + (' repaired' if repair_tracking else '')
+    difference = get_window_difference(window, window_start_frame - props.start_frame, full)
+    print('Re-apply parity {}: {:g}'.format(name, difference))
+    if difference > parity_tolerance:
+        return ['re-apply {}: the window differs from the full apply by {:g}'.format(name, difference)]
+    return []
+
+#######################################################################
+# Regression report
+# The thresholds are per minute of capture, so the same numbers hold for
+# every length. Costs that grow faster than the capture are caught by
+# the scaling check: the cost per minute of the longest capture over
+# that of the shortest
+#######################################################################
+def get_minutes(result):
+    return result['capture_frames'] / float(capture_fps) / 60
+
+def check_results(results, thresholds, baseline_results, baseline_tolerance):
+    failures = []
+    for result in results:
+        path_thresholds = thresholds['ms_per_minute'].get(result['path'], {})
+        for stage, stage_ms in result['stages_ms'].items():
+            limit = path_thresholds.get(stage)
+            #the range path loads the same minute whatever the capture length
+            minutes = 1.0 if result['path'] == 'range' and stage not in ('index', 'validate', 'neutral') else get_minutes(result)
+            if limit != None and stage_ms / minutes > limit:
+                failures.append('{} {:g} min {}: {:.1f} ms/min (threshold {:g})'.format(result['path'], get_minutes(result), stage, stage_ms / minutes, limit))
+
+    for path_name in pipeline_paths:
+        path_results = sorted([result for result in results if result['path'] == path_name], key=get_minutes)
+        if len(path_results) < 2 or path_name == 'range':
+            continue
+        shortest, longest = path_results[0], path_results[-1]
+        for stage, stage_ms in longest['stages_ms'].items():
+            shortest_ms = shortest['stages_ms'].get(stage)
+            #stages this quick are all noise
+            if shortest_ms == None or stage_ms < thresholds['scaling_min_ms']:
+                continue
+            scaling = (stage_ms / get_minutes(longest)) / max(shortest_ms / get_minutes(shortest), 1e-6)
+            if scaling > thresholds['max_scaling']:
+                failures.append('{} {}: the cost per minute grows {:.1f}x from {:g} to {:g} min (threshold {:g}x)'.format(
+                    path_name, stage, scaling, get_minutes(shortest), get_minutes(longest), thresholds['max_scaling']))
+
+    for result in results:
+        matches = [baseline for baseline in baseline_results if baseline['path'] == result['path'] and baseline['capture_frames'] == result['capture_frames']]
+        if len(matches) == 0:
+            continue
+        for stage, stage_ms in result['stages_ms'].items():
+            baseline_ms = matches[0]['stages_ms'].get(stage)
+            if baseline_ms != None and stage_ms > thresholds['scaling_min_ms'] and stage_ms > baseline_ms * baseline_tolerance:
+                failures.append('{} {:g} min {}: {:.1f} ms, {:.2f}x the baseline {:.1f} ms'.format(
+                    result['path'], get_minutes(result), stage, stage_ms, stage_ms / max(baseline_ms, 1e-6), baseline_ms))
+    return failures
+
+def print_results(results):
+    print('{:<8} {:>7}  '.format('path', 'minutes') + ' '.join('{:>14}'.format(stage) for stage in pipeline_stages) + '  {:>10}'.format('total'))
+    for result in results:
+        stages_ms = result['stages_ms']
+        print('{:<8} {:>7g}  '.format(result['path'], get_minutes(result))
+            + ' '.join('{:>14}'.format('-' if stage not in stages_ms else '%.1f' % stages_ms[stage]) for stage in pipeline_stages)
+            + '  {:>10.1f}'.format(result['total_ms']))
+
+def main():
+    args = parse_args()
+    Applicator.register()
+
+    scene = bpy.context.scene
+    scene.render.fps = args.fps
+    scene.render.fps_base = 1.0
+
+    props = scene.ApplicatorProps
+    props.neutral_file_path = os.path.abspath(args.neutral)
+    props.mapping_file_path = os.path.abspath(args.mapping)
+    args.neutral = props.neutral_file_path
+    args.mapping = props.mapping_file_path
+
+    with open(args.thresholds) as thresholds_file:
+        thresholds = json.load(thresholds_file)
+    baseline_results = []
+    if args.baseline != '':
+        with open(args.baseline) as baseline_file:
+            baseline_results = json.load(baseline_file)['results']
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    statistics = get_sample_statistics(args.samples)
+
+    #a face rig on a small head, as the keys go on the rig whatever the head
+    data_names = Applicator.list_data_names()
+    compiled_mapping = Applicator.get_compiled_mapping(props.mapping_file_path)
+    shape_key_names = [blendshape_mapping['target'] for blendshape_mapping in compiled_mapping['blendshapes'] if blendshape_mapping['target'] != '']
+    head_object = Applicator.create_benchmark_head(scene, 'ApplicatorBenchmarkHead', benchmark_head_vertex_count, shape_key_names + compiled_mapping['matrix']['targets'])
+    scene.app_head_mesh_target = head_object.data
+    bpy.ops.applicator.create_rig()
+
+    results = []
+    for minutes in args.minutes:
+        csv_path, archive_path, frame_count = get_synthetic_capture_paths(statistics, args.work_dir, minutes, args.seed)
+        for path_name in args.paths:
+            capture_path = archive_path if path_name == 'archive' else csv_path
+            results.append(dict({'minutes': minutes}, **run_pipeline(scene, path_name, os.path.abspath(capture_path), frame_count, args)))
+            print_results(results[-1:])
+
+    #the re-apply parity, on the shortest capture
+    csv_path, archive_path, frame_count = get_synthetic_capture_paths(statistics, args.work_dir, min(args.minutes), args.seed)
+    parity_failures = check_reapply_parity(scene, os.path.abspath(csv_path), frame_count, args.fps, args.smoothing, True)
+    for smoothing_frames in Applicator.filter_kinds:
+        parity_failures.extend(check_reapply_parity(scene, os.path.abspath(csv_path), frame_count, args.fps, smoothing_frames, False))
+
+    scene.app_head_mesh_target = None
+    scene.app_rig_target = None
+    Applicator.remove_new_data(data_names)
+
+    failures = check_results(results, thresholds, baseline_results, thresholds['baseline_tolerance']) + parity_failures
+    with open(args.output, 'w') as results_file:
+        json.dump({
+            'blender_version': bpy.app.version_string,
+            'addon_version': '.'.join(str(x) for x in Applicator.bl_info['version']),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'fps': args.fps,
+            'smoothing': args.smoothing,
+            'seed': args.seed,
+            'samples': [os.path.basename(sample_path) for sample_path in args.samples],
+            'results': results,
+            'failures': failures
+        }, results_file, indent=2)
+
+    print('')
+    print_results(results)
+    print('')
+    print('\n'.join(failures) if len(failures) > 0 else 'All stages within the thresholds')
+    print('Results saved to ' + os.path.abspath(args.output))
+    if len(failures) > 0:
+        sys.exit(1)
+
+main()
@@ -0,0 +1,70 @@
+#########################################################################
+# Applicator for Blender: headless playback benchmark
+#
+# Times the playback of synthetic heads driven by a reference take, for
+# each output style (driver rig, baked shape keys, reduced keys), and
+# saves the results as JSON.
+#
+# Usage:
+# blender -b --factory-startup -P Benchmark/benchmark_playback.py -- [options]
+#
+# Options:
+# --capture PATH     the reference take (default: Sample/SampleTest01.csv)
+# --neutral PATH     the neutral file (default: Sample/SampleNeutral.csv)
+# --mapping PATH     the mapping file (default: Sample/SampleMappingFile.csv)
+# --fps FPS          the scene frame rate (default: 60)
+# --vertices N [N..] the head vertex counts (default: 5000 25000 100000)
+# --frames N         the most frames timed per run (default: 600)
+# --output PATH      the results file (default: benchmark_playback.json)
+#########################################################################
+import os
+import sys
+import argparse
+
+import bpy
+
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repo_path, 'Applicator'))
+import Applicator
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(description='Applicator playback benchmark')
+    parser.add_argument('--capture', default=os.path.join(repo_path, 'Sample', 'SampleTest01.csv'))
+    parser.add_argument('--neutral', default=os.path.join(repo_path, 'Sample', 'SampleNeutral.csv'))
+    parser.add_argument('--mapping', default=os.path.join(repo_path, 'Sample', 'SampleMappingFile.csv'))
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--vertices', type=int, nargs='+', default=list(Applicator.benchmark_vertex_counts))
+    parser.add_argument('--frames', type=int, default=Applicator.benchmark_frame_limit)
+    parser.add_argument('--output', default='benchmark_playback.json')
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    Applicator.register()
+
+    scene = bpy.context.scene
+    scene.render.fps = args.fps
+    scene.render.fps_base = 1.0
+
+    props = scene.ApplicatorProps
+    props.capture_file_path = os.path.abspath(args.capture)
+    props.neutral_file_path = os.path.abspath(args.neutral) if args.neutral else ''
+    props.mapping_file_path = os.path.abspath(args.mapping)
+
+    is_valid, messages = Applicator.ApplicatorApply.ValidateSettings(None, None, props)
+    messages = [message for message in messages if 'Target Rig' not in message]
+    if len(messages) > 0:
+        print('\n'.join(messages))
+        sys.exit(1)
+
+    processed = Applicator.get_processed_capture(props, args.fps)
+    results = Applicator.run_playback_benchmark(scene, processed, args.vertices, frame_limit=args.frames)
+    Applicator.write_benchmark_results(os.path.abspath(args.output), results, props.capture_file_path, args.fps)
+
+    for case in results:
+        print('{:>7} vertices  {:<8} {:8.1f} fps  {:7.2f} ms/frame  ({} keys)'.format(
+            case['vertex_count'], case['output_style'], case['playback_fps'], case['evaluation_ms']['mean'], case['key_count']))
+    print('Results saved to ' + os.path.abspath(args.output))
+
+main()